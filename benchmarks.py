@@ -0,0 +1,647 @@
+"""Замеры производительности движка и игры.
+
+Запуск:
+    python benchmarks.py                       # все замеры, вывод в консоль
+    python benchmarks.py --json new.json       # сохранить результаты
+    python benchmarks.py --compare old.json    # сравнить с прошлым запуском
+    python benchmarks.py --verify              # проверки правильности вместо замеров
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import combatsim
+import content
+import game
+import game2
+import replay
+import savegame
+import server
+from headless import NullStream, ScriptedInput
+from instantgamelib import (FrameBuffer, GameEngine, GameObject, NullRenderer,
+                            NumpyFrameBuffer, Player, TerminalRenderer, Wall)
+from pathfinding import UNREACHED, DistanceField
+from tilemap import Tilemap
+
+
+def timeit(func, repeat=200):
+    """Среднее время одного вызова func в секундах"""
+    func()  # Прогрев
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def per_sec(seconds):
+    return 1.0 / seconds if seconds else 0.0
+
+
+def make_objects(width, height, count):
+    objects = []
+    for i in range(count):
+        objects.append(GameObject(i * 7 % width, i * 13 % height, '█'))
+    return objects
+
+
+def bench_list_grid(width, height, objects):
+    """Старый путь: новый список списков на каждый кадр"""
+    def frame():
+        grid = [['.' for _ in range(width)] for _ in range(height)]
+        for obj in objects:
+            if obj.active and 0 <= obj.y < len(grid) and 0 <= obj.x < len(grid[0]):
+                grid[obj.y][obj.x] = obj.char
+    return timeit(frame)
+
+
+def bench_frame_buffer(buffer_class, width, height, objects):
+    """Кадр в FrameBuffer: очистка срезом и пакетная отрисовка"""
+    buffer = buffer_class(width, height)
+    code = buffer.code('█')
+    xs = [obj.x for obj in objects]
+    ys = [obj.y for obj in objects]
+    codes = [code] * len(objects)
+
+    def frame():
+        buffer.clear()
+        buffer.put_many(xs, ys, codes)
+    return timeit(frame)
+
+
+def bench_framebuffer(quick=False):
+    """Очистка и заполнение кадра, в микросекундах"""
+    results = {}
+    sizes = ((30, 15, 90), (200, 100, 2000))
+    if not quick:
+        sizes += ((1000, 500, 20000),)
+    for width, height, count in sizes:
+        objects = make_objects(width, height, count)
+        key = f"{width}x{height}/{count}"
+        results[f"{key}/list_us"] = bench_list_grid(width, height, objects) * 1e6
+        results[f"{key}/bytearray_us"] = bench_frame_buffer(
+            FrameBuffer, width, height, objects) * 1e6
+        if numpy is not None:
+            results[f"{key}/numpy_us"] = bench_frame_buffer(
+                NumpyFrameBuffer, width, height, objects) * 1e6
+    return results
+
+
+def allocated(func):
+    """Сколько байт памяти осталось занято после func()"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = func()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return after - before
+
+
+def bench_entities(quick=False, width=1000, height=500):
+    """Сцена из множества простых сущностей: объекты против ComponentStore"""
+    count = 10000 if quick else 100000
+
+    def objects_scene():
+        engine = GameEngine(width, height, renderer=TerminalRenderer(stream=NullStream()))
+        for i in range(count):
+            engine.add_object(GameObject(i * 7 % width, i * 13 % height, 'r'))
+        return engine
+
+    def store_scene(use_numpy=False):
+        engine = GameEngine(width, height, renderer=TerminalRenderer(stream=NullStream()),
+                            use_numpy=use_numpy)
+        for i in range(count):
+            engine.store.add(i * 7 % width, i * 13 % height, 'r')
+        return engine
+
+    scenes = [('objects', objects_scene), ('store', store_scene)]
+    if numpy is not None:
+        scenes.append(('store_numpy', lambda: store_scene(use_numpy=True)))
+    results = {}
+    for name, build in scenes:
+        engine = build()
+        engine.input_source = lambda: None
+        # Сравниваю только обновление и заполнение кадра, без вывода
+        def frame():
+            engine.update()
+            engine.clear()
+            engine.store.draw(engine.grid)
+            for obj in engine.objects:
+                obj.draw(engine.grid)
+        results[f"{count}/{name}/frame_ms"] = timeit(frame, repeat=10) * 1000
+        results[f"{count}/{name}/bytes_per_entity"] = allocated(build) / count
+    # С камерой 40x20 сущности берутся из корзин хранилища: кадр зависит от
+    # того, сколько их в окне, а не от всех
+    for n in (0, count // 10, count):
+        engine = GameEngine(width, height, renderer=TerminalRenderer(stream=NullStream()))
+        target = GameObject(width // 2, height // 2, '@')
+        engine.add_object(target)
+        for i in range(n):
+            engine.store.add(i * 7 % width, i * 13 % height, 'r')
+        engine.set_camera(target, 40, 20)
+        results[f"{n}/store/camera_frame_ms"] = timeit(engine.render, repeat=50) * 1000
+    return results
+
+
+def example_engine(width, height, keys):
+    """Сцена из примера instantgamelib: игрок и стены по периметру"""
+    engine = GameEngine(width, height,
+                        renderer=TerminalRenderer(stream=NullStream()),
+                        input_source=ScriptedInput(keys))
+    engine.add_object(Player(width // 2, height // 2))
+    for x in range(width):
+        engine.add_object(Wall(x, 0))
+        engine.add_object(Wall(x, height - 1))
+    for y in range(1, height - 1):
+        engine.add_object(Wall(0, y))
+        engine.add_object(Wall(width - 1, y))
+    return engine
+
+
+def bench_engine(quick=False):
+    """Тиков в секунду для GameEngine.update, update + render, с обзором и с камерой"""
+    ticks = 500 if quick else 5000
+    keys = ['w', None, 'a', None, 's', None, 'd', None] * (ticks // 8 + 1)
+    results = {}
+    for width, height in ((30, 15), (200, 60)):
+        engine = example_engine(width, height, keys)
+        results[f"{width}x{height}/update_tps"] = engine.run_headless(
+            ticks, render=False)['ticks_per_sec']
+        engine = example_engine(width, height, keys)
+        results[f"{width}x{height}/update_render_tps"] = engine.run_headless(
+            ticks)['ticks_per_sec']
+        engine = example_engine(width, height, keys)
+        engine.set_view(engine.objects[0], 8)
+        results[f"{width}x{height}/view_render_tps"] = engine.run_headless(
+            ticks)['ticks_per_sec']
+    # С камерой кадр - окно 40x20, сколько бы ни было поле
+    for width, height in ((200, 60), (2000, 600)):
+        engine = example_engine(width, height, keys)
+        engine.set_camera(engine.objects[0], 40, 20)
+        results[f"{width}x{height}/camera_render_tps"] = engine.run_headless(
+            ticks)['ticks_per_sec']
+    return results
+
+
+class Particle(GameObject):
+    """Короткоживущий объект: исчезает через life тиков"""
+    def __init__(self, x, y, life):
+        super().__init__(x, y, '*')
+        self.life = life
+
+    def reset(self, x, y, life):
+        # Из пула: объект уже вне игры, достаточно переписать поля
+        self._x, self._y, self.life, self.active = x, y, life, True
+
+    def update(self):
+        self.life -= 1
+        if self.life <= 0:
+            self.game.remove_object(self)
+
+
+def bench_churn(quick=False):
+    """Тиков в секунду, когда каждый тик рождаются и гибнут сотни частиц:
+    новые объекты (new) против пула GameEngine(pool_limit=...) (pool)"""
+    ticks = 200 if quick else 2000
+    results = {}
+    for name, pool_limit in (("new", 0), ("pool", 1024)):
+        engine = GameEngine(200, 60, renderer=NullRenderer(), input_source=lambda: None,
+                            pool_limit=pool_limit)
+        rng = random.Random(0)
+        start = time.perf_counter()
+        for _ in range(ticks):
+            for _ in range(500):
+                engine.spawn(Particle, rng.randrange(200), rng.randrange(60),
+                             rng.randrange(1, 20))
+            engine.update()
+        elapsed = time.perf_counter() - start
+        results[f"{name}/tps"] = ticks / elapsed
+        results[f"{name}/objects"] = len(engine.objects)
+    return results
+
+
+def bench_turns(quick=False):
+    """Ход врагов (мкс) и догоняющий расчет локации (мс) при тысячах врагов.
+
+    Рядом с игроком всегда NEAR врагов, остальные разбросаны по карте 1000x1000
+    и спят: цена хода должна зависеть от первых, а не от всех.
+    """
+    turns = 200 if quick else 2000
+    near = 20
+    results = {}
+    for count in (100, 1000, 10000):
+        g = game2.Game(input_func=ScriptedInput([]), output=NullStream())
+        g.game_map = game.generate_map(1000)
+        g.chase_field.set_map(g.game_map)
+        g.items = []
+        rng = random.Random(0)
+        g.player.x = g.player.y = 500
+        g.enemies = [game2.Entity("Волк", 30, 0, 5, 10, 500 + rng.randint(-4, 4),
+                                  500 + rng.randint(-4, 4)) for _ in range(near)]
+        g.enemies += [game2.Entity("Волк", 30, 0, 5, 10, rng.randrange(1000), rng.randrange(1000))
+                      for _ in range(count - near)]
+        for x, y in [(500, 500), (501, 500)] + [(enemy.x, enemy.y) for enemy in g.enemies]:
+            g.game_map.set(x, y, '.')
+        g.rebuild_indexes()
+        start_turns, start_recomputes = g.scheduler.turns, g.chase_field.recomputes
+
+        def turn():
+            # Игрок шагает туда-обратно: карта расстояний пересчитывается каждый ход
+            g.player.x = 1001 - g.player.x
+            g.move_enemies()
+            g.end_turn()
+        results[f"{count}/turn_us"] = timeit(turn, turns) * 1e6
+        enemy_turns = g.scheduler.turns - start_turns - (turns + 1)  # С прогревом
+        recomputes = g.chase_field.recomputes - start_recomputes
+        assert enemy_turns > 0 and recomputes >= turns, (enemy_turns, recomputes)
+        results[f"{count}/enemy_turns_per_turn"] = enemy_turns / turns
+        # Возвращение в локацию после долгого отсутствия: все шаги разом
+        results[f"{count}/catch_up_ms"] = timeit(lambda: g.catch_up(1000), 3) * 1000
+    return results
+
+
+def bench_render_map(quick=False):
+    """Кадров в секунду для Game.render_map во всех локациях"""
+    results = {}
+    repeat = 50 if quick else 500
+    g = game2.Game(input_func=ScriptedInput([]), output=NullStream())
+    for location in g.locations:
+        g.current_location = location
+        g.game_map = g.locations[location]["map"]
+        g.generate_map_items()
+        results[f"{location}/fps"] = per_sec(timeit(g.render_map, repeat))
+    # Большая карта: с камерой кадр не зависит от ее размера
+    for size in (100, 1000):
+        g.game_map = game.generate_map(size)
+        g.items, g.enemies = [], []
+        g.rebuild_indexes()
+        g.player.x = g.player.y = size // 2
+        results[f"generated{size}/camera_fps"] = per_sec(timeit(g.render_map, repeat))
+    return results
+
+
+def bench_generate_map(quick=False):
+    """Время game.generate_map на растущих размерах, в миллисекундах"""
+    sizes = (10, 100, 500) if quick else (10, 100, 500, 1000, 2000, 10000)
+    results = {}
+    for size in sizes:
+        repeat = max(1, 200000 // (size * size))
+        results[f"{size}/ms"] = timeit(lambda: game.generate_map(size), repeat) * 1000
+    return results
+
+
+def bench_spawn(quick=False):
+    """Раскладка по таблице спавна на большом лесу, в миллисекундах"""
+    size = 500 if quick else 2000
+    forest = Tilemap(size, size)
+    rng = random.Random(0)
+    for _ in range(size * size // 100):
+        forest.set(rng.randrange(size), rng.randrange(size), 'T')
+    spawner = game2.Spawner(game2.SPAWN_TABLE, seed=1)
+    spawned = spawner.spawn("forest", forest)
+    count = sum(len(objects) for objects in spawned.values())
+    return {
+        f"{size}x{size}/entities": count,
+        f"{size}x{size}/ms": timeit(lambda: spawner.spawn("forest", forest), 5) * 1000,
+    }
+
+
+def bench_combat(quick=False):
+    """Боев в секунду через Game.start_combat со сценарием 'атаковать'"""
+    fights = 200 if quick else 2000
+    g = game2.Game(input_func=ScriptedInput(iter(lambda: 'a', None)),
+                   output=NullStream())
+    results = {}
+    for name, hp, armor, damage in (("Крыса", 15, 2, 5), ("Волк", 30, 5, 10)):
+        def fight():
+            g.player.hp = g.player.max_hp
+            enemy = game2.Entity(name, hp, 0, armor, damage, 0, 0)
+            g.enemies.append(enemy)
+            g.start_combat(enemy)
+        results[f"{name}/fights_per_sec"] = per_sec(timeit(fight, fights))
+    return results
+
+
+def bench_combat_sim(quick=False):
+    """Боев в секунду в пакетном расчете combatsim"""
+    fights = 10000 if quick else 100000
+    results = {}
+    for use_numpy in (False, True):
+        if use_numpy and numpy is None:
+            continue
+        name = "numpy" if use_numpy else "python"
+        report = combatsim.balance(fights, use_numpy=use_numpy)
+        for enemy, summary in report.items():
+            results[f"{enemy}/{name}/fights_per_sec"] = summary['fights_per_sec']
+    return results
+
+
+def bench_replay(quick=False):
+    """Ходов в секунду при воспроизведении записанной сессии game2"""
+    turns = 500 if quick else 5000
+    rng = random.Random(0)
+    keys = [rng.choice('wasd') for _ in range(turns)]
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "session.rec")
+        g = game2.Game(input_func=ScriptedInput(keys + ['a'] * 100),
+                       output=NullStream(), seed=1)
+        g.record_input(path)
+        g.run()
+        g.input_log.close()
+        for render in (False, True):
+            report = replay.replay_game(path, render)
+            name = "render" if render else "logic"
+            results[f"{name}/turns_per_sec"] = report['ticks_per_sec']
+            results[f"{name}/mismatches"] = report['mismatches']
+    return results
+
+
+def bench_server(quick=False):
+    """Тик сервера и трафик при разном числе клиентов через loopback"""
+    seconds = 0.5 if quick else 2.0
+    results = {}
+    for clients in (1, 16, 64):
+        report = asyncio.run(server.benchmark(clients, tick_rate=20, seconds=seconds))
+        results[f"{clients}/tick_ms"] = report['avg_tick_ms']
+        results[f"{clients}/bytes_per_frame"] = (report['bytes_sent'] / report['frames_sent']
+                                                 if report['frames_sent'] else 0.0)
+        results[f"{clients}/client_fps"] = report['client_fps']
+    return results
+
+
+BENCHMARKS = {
+    'framebuffer': bench_framebuffer,
+    'entities': bench_entities,
+    'engine': bench_engine,
+    'churn': bench_churn,
+    'turns': bench_turns,
+    'render_map': bench_render_map,
+    'generate_map': bench_generate_map,
+    'spawn': bench_spawn,
+    'combat': bench_combat,
+    'combat_sim': bench_combat_sim,
+    'replay': bench_replay,
+    'server': bench_server,
+}
+
+
+def check_save(quick=False):
+    """Автосохранение (снимок и дельты) -> загрузка: то же состояние"""
+    problems = []
+    turns = 200 if quick else 2000
+    rng = random.Random(0)
+    keys = [rng.choice('wasd') for _ in range(turns)]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "game2.sav")
+        g = game2.Game(input_func=ScriptedInput(keys + ['a'] * 100),
+                       output=NullStream(), save_path=path, seed=1)
+        g.run(render=False)
+        with open(path, 'rb') as f:
+            kinds = {kind for kind, _, _, _ in savegame.decode_records(f.read())}
+        if kinds != {savegame.FULL, savegame.DELTA}:
+            problems.append(f"в файле нет снимка и дельт: {sorted(kinds)}")
+        loaded = game2.Game(input_func=ScriptedInput([]), output=NullStream(),
+                            save_path=path, seed=1)
+        if loaded.world_time != g.world_time:
+            problems.append(f"часы мира: {g.world_time} -> {loaded.world_time}")
+        if loaded.state_hash() != g.state_hash():
+            problems.append("state_hash после загрузки отличается")
+    return problems
+
+
+def check_content(quick=False):
+    """Кэш locations.bin дает те же локации, что и locations.json"""
+    import json
+    import shutil
+
+    problems = []
+    source = content.data_path(content.SOURCE)
+    with open(source, encoding='utf-8') as f:
+        expected = json.load(f)
+    with tempfile.TemporaryDirectory() as folder:
+        cache = os.path.join(folder, content.CACHE)
+        content.build_cache(source, cache)
+        records = content.load_records(source, cache)
+        if not content.stats['cache']:
+            problems.append("свежий кэш не прочитан")
+        if list(records) != list(expected):
+            problems.append(f"локации: {list(expected)} -> {list(records)}")
+        for name in expected:
+            if name not in records:
+                continue
+            want = content.decode_location(expected[name])
+            got = content.decode_location(records[name])
+            for key in ("name", "description", "exits"):
+                if got[key] != want[key]:
+                    problems.append(f"{name}: {key} отличается")
+            got_map, want_map = got["map"], want["map"]
+            if ((got_map.width, got_map.height) != (want_map.width, want_map.height)
+                    or any(got_map.row(y) != want_map.row(y) for y in range(want_map.height))):
+                problems.append(f"{name}: карта отличается")
+
+        # Как в exe: файлы распакованы заново (время изменения другое),
+        # кэш читается как есть, а в папку ничего не пишется
+        bundles = {"bundle": [content.SOURCE, content.CACHE], "no_cache": [content.SOURCE]}
+        frozen, content.FROZEN = content.FROZEN, True
+        try:
+            for bundle, files in bundles.items():
+                bundle = os.path.join(folder, bundle)
+                os.mkdir(bundle)
+                for name in files:
+                    shutil.copy(cache if name == content.CACHE else source, bundle)
+                content.load_records(os.path.join(bundle, content.SOURCE),
+                                     os.path.join(bundle, content.CACHE))
+                if content.stats['cache'] != (content.CACHE in files):
+                    problems.append(f"exe ({files}): кэш прочитан: {content.stats['cache']}")
+                if sorted(os.listdir(bundle)) != sorted(files):
+                    problems.append(f"exe: в папку распаковки записано {os.listdir(bundle)}")
+        finally:
+            content.FROZEN = frozen
+    return problems
+
+
+def check_distance_field(quick=False):
+    """Правка местности сбрасывает карту расстояний без invalidate()"""
+    problems = []
+    for max_distance in (None, 10):
+        game_map = Tilemap.from_rows(["......"] * 3)
+        field = DistanceField(game_map, max_distance=max_distance)
+        field.update((0, 0))
+        for y in range(game_map.height):
+            game_map.set(2, y, '#')  # Стена отрезает правую половину
+        if not field.update((0, 0)) or field.distance(5, 0) != UNREACHED:
+            problems.append(f"max_distance={max_distance}: карта не пересчитана")
+    return problems
+
+
+def catch_up_game(count=300, size=200):
+    """game2 с count врагами на карте size x size вокруг игрока в центре"""
+    g = game2.Game(input_func=ScriptedInput([]), output=NullStream(), seed=3)
+    g.game_map = game.generate_map(size)
+    g.items = []
+    rng = random.Random(0)
+    g.player.x = g.player.y = size // 2
+    g.game_map.set(g.player.x, g.player.y, '.')
+    cells = set()
+    while len(cells) < count:
+        x, y = rng.randrange(size), rng.randrange(size)
+        if g.game_map.get(x, y) != '#' and (x, y) != (g.player.x, g.player.y):
+            cells.add((x, y))
+    g.enemies = [game2.Entity("Волк", 30, 0, 5, 10, x, y) for x, y in sorted(cells)]
+    g.world_time = 1000
+    return g
+
+
+def check_catch_up(quick=False):
+    """Догоняющий расчет: детерминирован, ограничен, по кругам LOD"""
+    problems = []
+    turns = 40
+    g, again = catch_up_game(), catch_up_game()
+    before = [(enemy.x, enemy.y) for enemy in g.enemies]
+    steps = g.catch_up(turns)
+    again.catch_up(turns)
+    after = [(enemy.x, enemy.y) for enemy in g.enemies]
+    if steps != min(turns // g.coarse_every, g.catch_up_limit):
+        problems.append(f"шагов {steps}")
+    if after != [(enemy.x, enemy.y) for enemy in again.enemies]:
+        problems.append("два одинаковых расчета разошлись")
+    if after == before:
+        problems.append("никто не сдвинулся")
+    if len(set(after)) != len(after) or (g.player.x, g.player.y) in after:
+        problems.append("враги в одной клетке с другим врагом или игроком")
+    px, py, radius = g.player.x, g.player.y, g.lod_radius
+    for (x0, y0), (x, y) in zip(before, after):
+        far = abs(x0 - px) > radius or abs(y0 - py) > radius
+        if far and (x, y) != (x0, y0):
+            problems.append(f"враг за lod_radius сдвинулся: {(x0, y0)} -> {(x, y)}")
+        if abs(x - x0) + abs(y - y0) > steps or g.game_map.get(x, y) == '#':
+            problems.append(f"недопустимый шаг: {(x0, y0)} -> {(x, y)}")
+    # Долгое отсутствие стоит не больше catch_up_limit шагов
+    if catch_up_game().catch_up(10 ** 6) != g.catch_up_limit:
+        problems.append("catch_up_limit не соблюден")
+    return problems
+
+
+class OldStyleObject(GameObject):
+    """draw() в старом стиле - сетка как список строк"""
+    def draw(self, grid):
+        if self.active and 0 <= self.y < len(grid) and 0 <= self.x < len(grid[0]):
+            grid[self.y][self.x] = self.char
+
+
+def check_frame_rows(quick=False):
+    """draw() в стиле grid[y][x] = char рисует в кадр и в окно камеры"""
+    problems = []
+    for use_numpy in (False, True) if numpy is not None else (False,):
+        for camera in (False, True):
+            engine = GameEngine(60, 40, renderer=NullRenderer(), input_source=lambda: None,
+                                use_numpy=use_numpy)
+            player = GameObject(50, 30, '@')
+            engine.add_object(player)
+            engine.add_object(OldStyleObject(51, 30, 'X'))
+            if camera:
+                engine.set_camera(player, 20, 10)
+            engine.render()
+            frame = engine.view if camera else engine.grid
+            if frame[30][51] != 'X':
+                problems.append(f"numpy={use_numpy}, камера={camera}: символа нет в кадре")
+    return problems
+
+
+CHECKS = {
+    'save': check_save,
+    'content': check_content,
+    'distance_field': check_distance_field,
+    'catch_up': check_catch_up,
+    'frame_rows': check_frame_rows,
+}
+
+
+def verify(names=None, quick=False):
+    """Прогоняю проверки из CHECKS; возвращаю число найденных ошибок"""
+    failures = 0
+    for name, check in CHECKS.items():
+        if names and name not in names:
+            continue
+        problems = check(quick)
+        print(f"  {name}: {'ошибок нет' if not problems else 'ОШИБКИ'}")
+        for problem in problems:
+            print(f"    {problem}")
+        failures += len(problems)
+    return failures
+
+
+def run_all(names=None, quick=False):
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        for key, value in bench(quick).items():
+            results[f"{name}/{key}"] = value
+    return results
+
+
+def compare(results, baseline):
+    """Печатаю отношение новых результатов к сохраненным"""
+    for key, value in results.items():
+        old = baseline.get(key)
+        if old:
+            print(f"  {key}: {old:.2f} -> {value:.2f} (x{value / old:.2f})")
+        else:
+            print(f"  {key}: {value:.2f} (нет в базовом запуске)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности")
+    parser.add_argument('names', nargs='*', help="какие замеры запускать: "
+                        + ", ".join(BENCHMARKS))
+    parser.add_argument('--quick', action='store_true', help="короткие прогоны")
+    parser.add_argument('--json', help="сохранить результаты в JSON")
+    parser.add_argument('--compare', help="сравнить с результатами из JSON")
+    parser.add_argument('--verify', action='store_true',
+                        help="вместо замеров прогнать проверки: " + ", ".join(CHECKS))
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        failures = verify(args.names, args.quick)
+        print(f"Ошибок: {failures}")
+        return 1 if failures else 0
+
+    results = run_all(args.names, args.quick)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        print(f"Сравнение с {args.compare}:")
+        compare(results, baseline)
+    else:
+        for key, value in results.items():
+            print(f"  {key}: {value:.2f}")
+
+    if args.json:
+        report = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'quick': args.quick,
+            'results': results,
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
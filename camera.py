@@ -0,0 +1,60 @@
+class Camera:
+    """Окно обзора width x height на карте world_width x world_height.
+
+    Окно следует за целью, но сдвигается, только когда цель подходит к его
+    краю ближе чем на margin клеток: при ходьбе в середине окна кадр не
+    прокручивается и меняются лишь клетки вокруг цели. Окно не выходит за
+    края карты; если карта меньше окна, видна вся карта.
+    """
+    def __init__(self, width, height, world_width=None, world_height=None, margin=None):
+        self.width = width
+        self.height = height
+        # По умолчанию цель держится в средней половине окна
+        self.margin = margin if margin is not None else min(width, height) // 4
+        self.left = 0    # Левая верхняя клетка окна на карте
+        self.top = 0
+        self.right = 0   # Первый столбец правее окна
+        self.bottom = 0  # Первая строка ниже окна
+        self.world_width = self.world_height = None
+        if world_width is not None:
+            self.set_world(world_width, world_height)
+
+    def set_world(self, world_width, world_height):
+        """Меняю размер карты (например, при смене локации)"""
+        if (world_width, world_height) != (self.world_width, self.world_height):
+            self.world_width = world_width
+            self.world_height = world_height
+            self._place(self.left, self.top)
+
+    @staticmethod
+    def _clamp(start, size, world):
+        return max(0, min(start, world - size))
+
+    def _place(self, left, top):
+        self.left = self._clamp(left, self.width, self.world_width)
+        self.top = self._clamp(top, self.height, self.world_height)
+        self.right = min(self.left + self.width, self.world_width)
+        self.bottom = min(self.top + self.height, self.world_height)
+
+    def _follow_axis(self, start, pos, size):
+        margin = min(self.margin, (size - 1) // 2)
+        if pos < start + margin:
+            start = pos - margin
+        elif pos > start + size - 1 - margin:
+            start = pos - size + 1 + margin
+        return start
+
+    def follow(self, x, y):
+        """Сдвигаю окно так, чтобы (x, y) было не ближе margin к краю"""
+        left = self._follow_axis(self.left, x, self.width)
+        top = self._follow_axis(self.top, y, self.height)
+        if left != self.left or top != self.top:
+            self._place(left, top)
+        return self.left, self.top
+
+    def center(self, x, y):
+        """Ставлю (x, y) в середину окна (например, после телепорта)"""
+        self._place(x - self.width // 2, y - self.height // 2)
+
+    def contains(self, x, y):
+        return self.left <= x < self.right and self.top <= y < self.bottom
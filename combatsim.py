@@ -0,0 +1,344 @@
+"""Пакетный расчет боев для баланса.
+
+Бой считается по тем же правилам, что и в игре, но сразу для множества
+боев: на вход идут массивы (или числа) HP, брони и урона игрока и врага,
+число зелий и политика их использования. Правила game2 (Game.start_combat):
+игрок бьет или пьет зелье, затем живой враг бьет в ответ, урон -
+max(1, урон - броня // 2). Правила game (main в game.py): обе стороны бьют
+каждый раунд, урон - max(1, урон - броня), и смерть игрока проверяется
+раньше смерти врага. Бегство раненого NPC в game.py не моделируется.
+
+Начальное HP игрока и число зелий выбираются случайно (игрок приходит в бой
+уже раненым), поэтому результат - распределения: доля побед и число ходов
+до конца боя по каждому типу врагов из SPAWN_TABLE.
+
+С NumPy все бои идут одним массивом, и на каждом ходу обрабатываются только
+еще не закончившиеся. Без NumPy те же правила считаются циклом по боям.
+
+Запуск:
+    python combatsim.py --fights 1000000 --policy below_half --potions 0-3
+"""
+import argparse
+import contextlib
+import random
+import time
+from collections import Counter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Rules:
+    """Правила боя: делитель брони и бьет ли враг в ход своей смерти"""
+    def __init__(self, name, armor_divisor, strike_back):
+        self.name = name
+        self.armor_divisor = armor_divisor
+        self.strike_back = strike_back  # Враг бьет, даже если уже убит
+
+    def hit(self, damage, armor):
+        """Урон одного удара; работает и для чисел, и для массивов NumPy"""
+        dealt = damage - armor // self.armor_divisor
+        if numpy is not None and isinstance(dealt, numpy.ndarray):
+            return numpy.maximum(1, dealt)
+        return max(1, dealt)
+
+
+RULES = {
+    'game2': Rules('game2', 2, False),  # Entity.attack и Game.start_combat
+    'game': Rules('game', 1, True),     # attack и main из game.py
+}
+
+
+# Политики зелий: по HP игрока, его максимуму и удару врага решают, пить ли
+# зелье вместо атаки. Пишутся выражениями, которые работают и для чисел, и
+# для массивов NumPy
+def never(hp, max_hp, enemy_hit):
+    return hp < 0
+
+
+def below(fraction):
+    def policy(hp, max_hp, enemy_hit):
+        return hp <= max_hp * fraction
+    policy.__name__ = f"below_{fraction:g}"
+    return policy
+
+
+def lethal(hp, max_hp, enemy_hit):
+    """Пью, только если следующий удар врага убьет"""
+    return hp <= enemy_hit
+
+
+POLICIES = {
+    'never': never,
+    'below_half': below(0.5),
+    'below_third': below(1 / 3),
+    'lethal': lethal,
+}
+
+
+def fight(hp, max_hp, armor, damage, enemy_hp, enemy_armor, enemy_damage,
+          potions=0, potion_value=30, policy=never, rules=RULES['game2']):
+    """Один бой: (победа, ходов, выпито зелий)"""
+    player_hit = rules.hit(damage, enemy_armor)
+    enemy_hit = rules.hit(enemy_damage, armor)
+    used = 0
+    turn = 0
+    while True:
+        turn += 1
+        if potions > used and policy(hp, max_hp, enemy_hit):
+            hp = min(max_hp, hp + potion_value)
+            used += 1
+        else:
+            enemy_hp -= player_hit
+        if enemy_hp <= 0 and not rules.strike_back:
+            return True, turn, used
+        hp -= enemy_hit
+        if hp <= 0:
+            return False, turn, used
+        if enemy_hp <= 0:
+            return True, turn, used
+
+
+def simulate(hp, max_hp, armor, damage, enemy_hp, enemy_armor, enemy_damage,
+             potions=0, potion_value=30, policy=never, rules=RULES['game2'],
+             use_numpy=True):
+    """Множество боев сразу: (победы, ходы, выпито зелий) массивами.
+
+    Аргументы - числа или массивы одной длины. Результат совпадает с
+    fight() для каждого боя.
+    """
+    args = (hp, max_hp, armor, damage, enemy_hp, enemy_armor, enemy_damage, potions)
+    if use_numpy and numpy is not None:
+        return _simulate_numpy(args, potion_value, policy, rules)
+    count = max((len(arg) for arg in args if hasattr(arg, '__len__')), default=1)
+    columns = [arg if hasattr(arg, '__len__') else [arg] * count for arg in args]
+    won, turns, used = [], [], []
+    for row in zip(*columns):
+        result = fight(*row, potion_value=potion_value, policy=policy, rules=rules)
+        won.append(result[0])
+        turns.append(result[1])
+        used.append(result[2])
+    return won, turns, used
+
+
+def _simulate_numpy(args, potion_value, policy, rules):
+    (hp, max_hp, armor, damage, enemy_hp, enemy_armor, enemy_damage,
+     potions) = [array.copy() for array in numpy.broadcast_arrays(
+        *[numpy.asarray(arg, dtype=numpy.int64) for arg in args])]
+    player_hit = rules.hit(damage, enemy_armor)
+    enemy_hit = rules.hit(enemy_damage, armor)
+    count = hp.size
+    won = numpy.zeros(count, dtype=bool)
+    turns = numpy.zeros(count, dtype=numpy.int64)
+    used = numpy.zeros(count, dtype=numpy.int64)
+
+    # Номера еще идущих боев: каждый ход работаю только с ними
+    live = numpy.arange(count)
+    turn = 0
+    while live.size:
+        turn += 1
+        p_hp, p_max, e_hit = hp[live], max_hp[live], enemy_hit[live]
+        drink = (potions[live] > used[live]) & policy(p_hp, p_max, e_hit)
+        p_hp = numpy.where(drink, numpy.minimum(p_max, p_hp + potion_value), p_hp)
+        used[live] += drink
+        e_hp = enemy_hp[live] - numpy.where(drink, 0, player_hit[live])
+        killed = e_hp <= 0
+        if rules.strike_back:
+            p_hp -= e_hit
+        else:
+            p_hp -= numpy.where(killed, 0, e_hit)
+        died = p_hp <= 0
+        over = killed | died
+        won[live[killed & ~died]] = True
+        turns[live[over]] = turn
+        hp[live] = p_hp
+        enemy_hp[live] = e_hp
+        live = live[~over]
+    return won, turns, used
+
+
+def enemy_types():
+    """Типы врагов из SPAWN_TABLE: имя -> (HP, броня, урон)"""
+    from game2 import SPAWN_TABLE
+
+    types = {}
+    for rules in SPAWN_TABLE.values():
+        for rule in rules:
+            if rule.kind != "enemy":
+                continue
+            for factory in rule.factories:
+                enemy = factory(0, 0)
+                types[enemy.name] = (enemy.max_hp, enemy.armor, enemy.damage)
+    return types
+
+
+def summarize(won, turns, used):
+    """Сводка по результатам simulate()"""
+    count = len(turns)
+    if numpy is not None and isinstance(turns, numpy.ndarray):
+        wins = int(won.sum())
+        win_turns = dict(enumerate(numpy.bincount(turns[won]).tolist()))
+        loss_turns = dict(enumerate(numpy.bincount(turns[~won]).tolist()))
+        potions = float(used.mean()) if count else 0.0
+    else:
+        wins = sum(won)
+        win_turns = Counter(t for t, w in zip(turns, won) if w)
+        loss_turns = Counter(t for t, w in zip(turns, won) if not w)
+        potions = sum(used) / count if count else 0.0
+    return {
+        'fights': count,
+        'win_rate': wins / count if count else 0.0,
+        'potions_used': potions,
+        'turns_to_win': {t: n for t, n in sorted(win_turns.items()) if n},
+        'turns_to_lose': {t: n for t, n in sorted(loss_turns.items()) if n},
+    }
+
+
+def balance(fights=100000, seed=0, policy='below_half', rules='game2',
+            player=(100, 10, 20), hp_range=(1, 100), potions_range=(0, 3),
+            potion_value=30, use_numpy=True):
+    """Распределения исходов боя с каждым типом врагов.
+
+    player - (максимум HP, броня, урон) игрока. Начальное HP берется
+    равномерно из hp_range, число зелий - из potions_range (включительно).
+    """
+    policy_func = POLICIES[policy] if isinstance(policy, str) else policy
+    rules = RULES[rules] if isinstance(rules, str) else rules
+    max_hp, armor, damage = player
+    use_numpy = use_numpy and numpy is not None
+    report = {}
+    for offset, (name, (enemy_hp, enemy_armor, enemy_damage)) in enumerate(
+            sorted(enemy_types().items())):
+        if use_numpy:
+            rng = numpy.random.default_rng(seed + offset)
+            hp = rng.integers(hp_range[0], hp_range[1] + 1, fights)
+            potions = rng.integers(potions_range[0], potions_range[1] + 1, fights)
+        else:
+            rng = random.Random(seed + offset)
+            hp = [rng.randint(*hp_range) for _ in range(fights)]
+            potions = [rng.randint(*potions_range) for _ in range(fights)]
+        start = time.perf_counter()
+        result = simulate(hp, max_hp, armor, damage, enemy_hp, enemy_armor,
+                          enemy_damage, potions, potion_value, policy_func,
+                          rules, use_numpy)
+        elapsed = time.perf_counter() - start
+        report[name] = summarize(*result)
+        report[name]['fights_per_sec'] = fights / elapsed if elapsed else 0.0
+    return report
+
+
+def verify(fights=300, seed=0, policy='below_half'):
+    """Сверяю fight() с настоящим Game.start_combat и main из game.py.
+
+    Возвращает число расхождений (0 - правила совпадают).
+    """
+    from unittest import mock
+
+    import game
+    import game2
+    from headless import NullStream
+
+    policy_func = POLICIES[policy]
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(fights):
+        max_hp = rng.randint(20, 150)
+        hp, armor, damage = rng.randint(1, max_hp), rng.randint(0, 30), rng.randint(1, 40)
+        enemy_hp, enemy_armor, enemy_damage = (rng.randint(1, 80), rng.randint(0, 30),
+                                               rng.randint(1, 40))
+        potions = rng.randint(0, 3)
+
+        # game2: политика отвечает на вопросы боя вместо игрока
+        g = game2.Game(output=NullStream(), seed=0)
+        g.player = game2.Entity("Герой", max_hp, 0, armor, damage)
+        g.player.hp = hp
+        g.player.output = g.output
+        if potions:
+            g.player.inventory.add(game2.Item("Зелье здоровья", "heal", 30), potions)
+        g.load_sections = lambda sections: None  # Смерть не должна возвращать к чекпоинту
+        enemy = game2.Entity("Враг", enemy_hp, 0, enemy_armor, enemy_damage)
+        g.enemies.append(enemy)
+        enemy_hit = RULES['game2'].hit(enemy_damage, armor)
+        state = {'turns': 0}
+
+        def answer(prompt=''):
+            if prompt.startswith("Атаковать"):
+                state['turns'] += 1
+                if g.player.inventory and policy_func(g.player.hp, max_hp, enemy_hit):
+                    return 'i'
+                return 'a'
+            return '1' if prompt.startswith("Выберите") else ''
+        g.ask = answer  # Game.ask не передает приглашение в input_func
+        g.start_combat(enemy)
+        expected = fight(hp, max_hp, armor, damage, enemy_hp, enemy_armor,
+                         enemy_damage, potions, 30, policy_func, RULES['game2'])
+        actual = (not enemy.is_alive(), state['turns'],
+                  potions - g.player.inventory.count("heal"))
+        if actual != expected:
+            mismatches += 1
+
+        # game: настоящий main() на карте 5x5. Игрок и NPC стоят на одной
+        # клетке, и NPC не двигается (сверяются правила обмена ударами, а не
+        # погоня), игрок на каждый ход отвечает attack
+        player = game.Player(hp, 0, armor, damage)
+        npc = game.Enemy(enemy_hp, 0, enemy_armor, enemy_damage)
+        turns = [0]
+
+        def command(prompt=''):
+            if prompt.startswith("\nДействие"):
+                turns[0] += 1
+                return 'attack'
+            return '1'  # Стандартная карта
+        with contextlib.redirect_stdout(NullStream()), mock.patch.multiple(
+                game, create=True, input=command,
+                Player=lambda **stats: player, Enemy=lambda **stats: npc,
+                place_entities=lambda game_map, size: ((2, 2), (2, 2)),
+                npc_ai=lambda npc_pos, *args, **kwargs: npc_pos):
+            game.main()
+        expected = fight(hp, max_hp, armor, damage, enemy_hp, enemy_armor,
+                         enemy_damage, rules=RULES['game'])
+        if (player.hp > 0, turns[0], 0) != expected:
+            mismatches += 1
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный расчет боев для баланса")
+    parser.add_argument('--fights', type=int, default=100000, help="боев на тип врага")
+    parser.add_argument('--policy', default='below_half', choices=POLICIES,
+                        help="когда пить зелье")
+    parser.add_argument('--rules', default='game2', choices=RULES)
+    parser.add_argument('--potions', default='0-3', help="число зелий: N или MIN-MAX")
+    parser.add_argument('--hp', default='1-100', help="начальное HP: N или MIN-MAX")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-numpy', action='store_true', help="считать без NumPy")
+    parser.add_argument('--verify', action='store_true',
+                        help="сверить правила с кодом игры")
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        mismatches = verify(seed=args.seed, policy=args.policy)
+        print(f"Расхождений с кодом игры: {mismatches}")
+        return 1 if mismatches else 0
+
+    def parse_range(text):
+        low, _, high = text.partition('-')
+        return int(low), int(high or low)
+
+    report = balance(args.fights, args.seed, args.policy, args.rules,
+                     hp_range=parse_range(args.hp),
+                     potions_range=parse_range(args.potions),
+                     use_numpy=not args.no_numpy)
+    for name, summary in report.items():
+        print(f"{name}: побед {summary['win_rate']:.1%}, "
+              f"зелий {summary['potions_used']:.2f}, "
+              f"{summary['fights_per_sec']:.0f} боев/с")
+        print(f"  ходов до победы: {summary['turns_to_win']}")
+        print(f"  ходов до поражения: {summary['turns_to_lose']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
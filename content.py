@@ -0,0 +1,201 @@
+"""Описания локаций из файлов данных.
+
+Локации (название, описание, выходы, карта) лежат в locations.json. Рядом
+хранится скомпилированный кэш locations.bin: оглавление и по записи marshal
+на локацию с картой, уже упакованной в чанки Tilemap. Файл читается один
+раз на процесс, а локация разбирается при первом обращении к ней, поэтому
+на старте декодируется только деревня.
+
+Кэш пересобирается, когда меняется locations.json (размер или время
+изменения не совпадают с записанными в кэше). Пересобрать вручную:
+python content.py
+
+В собранном exe (game2.spec) оба файла лежат во временной папке
+распаковки, а кэш собирается заранее, при сборке. Там кэш только читается
+и не сверяется с locations.json: время изменения после распаковки другое,
+а писать в эту папку бесполезно - она своя на каждый запуск.
+"""
+import marshal
+import os
+import struct
+import sys
+import time
+import zlib
+
+from tilemap import Tilemap
+
+SOURCE = 'locations.json'
+CACHE = 'locations.bin'
+MAGIC = b'G2LC'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQqI')  # magic, версия, версия Python, размер и
+                                    # время изменения источника, оглавление
+
+FROZEN = getattr(sys, 'frozen', False)  # Запущены из exe PyInstaller
+
+stats = {'read': 0.0, 'decode': 0.0, 'decoded': 0, 'cache': None}
+_records = {}  # (источник, кэш) -> {имя локации: запись}
+
+
+def data_path(name):
+    """Путь к файлу данных рядом с игрой (в exe PyInstaller - во временной папке)"""
+    base = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base, name)
+
+
+def _python_tag():
+    return sys.version_info[0] * 100 + sys.version_info[1]
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def compile_location(location):
+    """Запись кэша из описания в JSON: карта упакована в чанки"""
+    game_map = Tilemap.from_rows(location["map"])
+    return marshal.dumps({
+        "name": location["name"],
+        "description": location["description"],
+        "exits": {name: tuple(pos) for name, pos in location["exits"].items()},
+        "size": (game_map.width, game_map.height),
+        "fill": game_map.palette[0],
+        "chunks": zlib.compress(game_map.pack_chunks()),
+    })
+
+
+def build_cache(source=None, cache=None):
+    """Компилирую locations.json в locations.bin; возвращаю размер кэша"""
+    import json  # json с re - около 15 мс импорта, а нужен он только без кэша
+
+    source = source or data_path(SOURCE)
+    cache = cache or data_path(CACHE)
+    with open(source, encoding='utf-8') as f:
+        locations = json.load(f)
+    body, index = [], {}
+    offset = 0
+    for name, location in locations.items():
+        record = compile_location(location)
+        index[name] = (offset, len(record))
+        body.append(record)
+        offset += len(record)
+    table = marshal.dumps(index)
+    size, mtime = _stamp(source)
+    data = HEADER.pack(MAGIC, VERSION, _python_tag(), size, mtime, len(table)) + table
+    data += b''.join(body)
+    temp = cache + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, cache)
+    return len(data)
+
+
+def _read_cache(cache, source):
+    """Записи из кэша или None, если кэша нет или он устарел"""
+    try:
+        with open(cache, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, python, size, mtime, table_size = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or python != _python_tag():
+        return None
+    if not FROZEN and os.path.exists(source) and _stamp(source) != (size, mtime):
+        return None
+    start = HEADER.size + table_size
+    index = marshal.loads(data[HEADER.size:start])
+    view = memoryview(data)
+    return {name: view[start + offset:start + offset + length]
+            for name, (offset, length) in index.items()}
+
+
+def load_records(source=None, cache=None):
+    """Сырые записи локаций (читаются с диска один раз на процесс)"""
+    source = source or data_path(SOURCE)
+    cache = cache or data_path(CACHE)
+    records = _records.get((source, cache))
+    if records is not None:
+        return records
+    start = time.perf_counter()
+    records = _read_cache(cache, source)
+    stats['cache'] = records is not None
+    if records is None:
+        import json
+
+        with open(source, encoding='utf-8') as f:
+            records = json.load(f)
+        if not FROZEN:
+            try:
+                build_cache(source, cache)
+            except OSError:
+                pass  # Папка только для чтения: обойдусь без кэша
+    _records[(source, cache)] = records
+    stats['read'] += time.perf_counter() - start
+    return records
+
+
+def decode_location(record):
+    """Локация для Game.locations из записи кэша или JSON"""
+    if isinstance(record, dict):
+        return {
+            "map": Tilemap.from_rows(record["map"]),
+            "name": record["name"],
+            "exits": {name: tuple(pos) for name, pos in record["exits"].items()},
+            "description": record["description"],
+        }
+    data = marshal.loads(record)
+    width, height = data["size"]
+    game_map = Tilemap(width, height, data["fill"])
+    game_map.load_chunks(zlib.decompress(data["chunks"]))
+    game_map.dirty.clear()
+    return {
+        "map": game_map,
+        "name": data["name"],
+        "exits": data["exits"],
+        "description": data["description"],
+    }
+
+
+class Locations:
+    """Локации по имени; каждая разбирается при первом обращении.
+
+    Ведет себя как словарь Game.locations: locations[name], name in
+    locations, перебор имен. Каждый экземпляр получает свои карты, так что
+    изменения карт одной игры не видны другим.
+    """
+    def __init__(self, records=None):
+        self.records = load_records() if records is None else records
+        self.decoded = {}
+
+    def __getitem__(self, name):
+        location = self.decoded.get(name)
+        if location is None:
+            start = time.perf_counter()
+            location = self.decoded[name] = decode_location(self.records[name])
+            stats['decode'] += time.perf_counter() - start
+            stats['decoded'] += 1
+        return location
+
+    def __contains__(self, name):
+        return name in self.records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def items(self):
+        for name in self.records:
+            yield name, self[name]
+
+    def loaded(self):
+        """Уже разобранные локации: (имя, локация)"""
+        return self.decoded.items()
+
+
+if __name__ == "__main__":
+    print(f"{data_path(CACHE)}: {build_cache()} байт")
@@ -0,0 +1,223 @@
+"""Массовый прогон игровых сессий game2 на всех ядрах.
+
+Каждая сессия - полная игра Game без терминала, где вместо игрока вводит
+команды политика: случайная (бот) или сценарий клавиш. Сессии нарезаются на
+пачки, пачки раздаются процессам пула, и каждый процесс возвращает уже
+сведенную статистику своей пачки. Результаты сливаются по мере готовности,
+поэтому в памяти главного процесса нет списка всех сессий.
+
+Запуск:
+    python fleet.py --sessions 10000 --turns 500
+    python fleet.py --sessions 1000 --script wwddssaa --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+import traceback
+
+from headless import NullStream
+
+MOVES = 'wasd'
+
+
+class RandomPolicy:
+    """Бот: бродит случайно, в бою бьет, при малом HP пьет зелье лечения.
+
+    Команды i, q и f не используются: они заканчивают game2.Game.run.
+    """
+    def __init__(self, seed, max_turns, heal_below=0.4):
+        self.rng = random.Random(seed)
+        self.max_turns = max_turns
+        self.heal_below = heal_below
+        self.game = None
+
+    def __call__(self, prompt=''):
+        game = self.game
+        prompt = game.last_prompt
+        player = game.player
+        if prompt.startswith("Атаковать"):
+            if player.hp < player.max_hp * self.heal_below and self._heal_slot() is not None:
+                return 'i'
+            return 'a'
+        if prompt.startswith("Выберите предмет"):
+            slot = self._heal_slot()
+            return 'отмена' if slot is None else str(slot + 1)
+        if prompt.startswith("Ваше действие"):
+            if game.turn >= self.max_turns:
+                raise EOFError("Сессия закончилась")
+            return self.rng.choice(MOVES)
+        return ''
+
+    def _heal_slot(self):
+        inventory = self.game.player.inventory
+        stack = inventory.best("heal")
+        return None if stack is None else inventory.slots.index(stack)
+
+
+class ScriptedPolicy:
+    """Сценарий клавиш по кругу; вопросы боя получают ответ 'a'"""
+    def __init__(self, keys, max_turns):
+        self.keys = keys
+        self.max_turns = max_turns
+        self.game = None
+
+    def __call__(self, prompt=''):
+        game = self.game
+        prompt = game.last_prompt
+        if prompt.startswith("Атаковать"):
+            return 'a'
+        if prompt.startswith("Ваше действие"):
+            if game.turn >= self.max_turns:
+                raise EOFError("Сценарий закончился")
+            return self.keys[game.turn % len(self.keys)]
+        return ''
+
+
+def make_policy(seed, max_turns, script=None):
+    if script:
+        return ScriptedPolicy(script, max_turns)
+    return RandomPolicy(seed, max_turns)
+
+
+def run_session(seed, max_turns, script=None, render=False):
+    """Одна сессия: словарь с ее итогами"""
+    from game2 import Game
+
+    policy = make_policy(seed, max_turns, script)
+    game = Game(input_func=policy, output=NullStream(), seed=seed)
+    policy.game = game
+    start = time.perf_counter()
+    game.run(render=render)
+    return {
+        'turns': game.turn,
+        'elapsed': time.perf_counter() - start,
+        'deaths': game.deaths,
+        'quests': game.quests_completed,
+    }
+
+
+class FleetStats:
+    """Сводная статистика сессий; пачки сливаются через merge()"""
+    def __init__(self):
+        self.sessions = 0
+        self.turns = 0
+        self.elapsed = 0.0      # Суммарное время сессий (без накладных пула)
+        self.deaths = 0
+        self.quests = 0
+        self.quest_counts = {}  # Квестов выполнено -> сессий
+        self.death_counts = {}  # Смертей -> сессий
+        self.slowest_turn = 0.0 # Худшее среднее время хода в сессии
+        self.failures = []      # (зерно, текст ошибки) упавших сессий
+
+    def add(self, result):
+        self.sessions += 1
+        self.turns += result['turns']
+        self.elapsed += result['elapsed']
+        self.deaths += result['deaths']
+        self.quests += result['quests']
+        self.quest_counts[result['quests']] = self.quest_counts.get(result['quests'], 0) + 1
+        self.death_counts[result['deaths']] = self.death_counts.get(result['deaths'], 0) + 1
+        if result['turns']:
+            self.slowest_turn = max(self.slowest_turn, result['elapsed'] / result['turns'])
+
+    def merge(self, other):
+        self.sessions += other.sessions
+        self.turns += other.turns
+        self.elapsed += other.elapsed
+        self.deaths += other.deaths
+        self.quests += other.quests
+        for counts, other_counts in ((self.quest_counts, other.quest_counts),
+                                     (self.death_counts, other.death_counts)):
+            for key, value in other_counts.items():
+                counts[key] = counts.get(key, 0) + value
+        self.slowest_turn = max(self.slowest_turn, other.slowest_turn)
+        self.failures.extend(other.failures)
+
+    def report(self):
+        return {
+            'sessions': self.sessions,
+            'failures': len(self.failures),
+            'turns': self.turns,
+            'deaths_per_session': self.deaths / self.sessions if self.sessions else 0.0,
+            'quests_per_session': self.quests / self.sessions if self.sessions else 0.0,
+            'quests_histogram': dict(sorted(self.quest_counts.items())),
+            'deaths_histogram': dict(sorted(self.death_counts.items())),
+            'turn_us': self.elapsed / self.turns * 1e6 if self.turns else 0.0,
+            'slowest_turn_us': self.slowest_turn * 1e6,
+        }
+
+
+def run_chunk(task):
+    """Пачка сессий в одном процессе: (зерна, ходов, сценарий, вывод)"""
+    seeds, max_turns, script, render = task
+    stats = FleetStats()
+    for seed in seeds:
+        try:
+            stats.add(run_session(seed, max_turns, script, render))
+        except Exception:
+            stats.failures.append((seed, traceback.format_exc()))
+    return stats
+
+
+def run_fleet(sessions, max_turns=500, script=None, render=False, workers=None,
+              chunk_size=None, seed=0, progress=None):
+    """Прогоняю sessions сессий пулом процессов, возвращаю FleetStats.
+
+    Зерно сессии - seed + ее номер, поэтому любую сессию, в том числе
+    упавшую, можно повторить отдельно через run_session(). progress(stats)
+    вызывается после слияния каждой пачки.
+    """
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        # Несколько пачек на процесс, чтобы медленные пачки не держали пул
+        chunk_size = max(1, min(100, sessions // (workers * 4) or 1))
+    tasks = [(range(seed + start, seed + min(start + chunk_size, sessions)),
+              max_turns, script, render)
+             for start in range(0, sessions, chunk_size)]
+    total = FleetStats()
+
+    def merge(results):
+        for stats in results:
+            total.merge(stats)
+            if progress:
+                progress(total)
+
+    if workers == 1:
+        merge(map(run_chunk, tasks))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            merge(pool.imap_unordered(run_chunk, tasks))
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Массовый прогон сессий game2")
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--turns', type=int, default=500, help="ходов на сессию")
+    parser.add_argument('--script', help="клавиши сценария вместо случайного бота")
+    parser.add_argument('--workers', type=int, help="процессов (по умолчанию все ядра)")
+    parser.add_argument('--chunk', type=int, help="сессий в пачке")
+    parser.add_argument('--seed', type=int, default=0, help="зерно первой сессии")
+    parser.add_argument('--render', action='store_true', help="строить кадры карты")
+    args = parser.parse_args(argv)
+
+    def progress(stats):
+        print(f"\r{stats.sessions}/{args.sessions} сессий", end='', flush=True)
+
+    start = time.perf_counter()
+    stats = run_fleet(args.sessions, args.turns, args.script, args.render,
+                      args.workers, args.chunk, args.seed, progress)
+    wall = time.perf_counter() - start
+    print()
+    for key, value in stats.report().items():
+        print(f"  {key}: {value}")
+    print(f"  wall_time: {wall:.2f} с, {stats.turns / wall:.0f} ходов/с")
+    for seed, error in stats.failures[:3]:
+        print(f"\nСессия {seed} упала:\n{error}")
+    return 1 if stats.failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,9 +1,23 @@
+from camera import Camera
+from pathfinding import DistanceField
+from scheduler import NORMAL_SPEED, TurnScheduler
+from textframe import TextFrame
+from tilemap import Tilemap
+
+# Дальше этого NPC игрока не чует: карта расстояний считается только в этом
+# радиусе, а не по всей карте на каждый ход NPC
+CHASE_RADIUS = 30
+
+
 class Character:
-    def __init__(self, hp, mp, arm, dmg):
+    def __init__(self, hp, mp, arm, dmg, speed=NORMAL_SPEED):
         self.hp = hp
         self.mp = mp
         self.arm = arm
         self.dmg = dmg
+        self.speed = speed     # Энергии за тик: 200 - два хода за ход обычного
+        self.energy = 0        # Накопленная энергия (для TurnScheduler)
+        self.energy_time = 0
 
 class Player(Character):
     def __init__(self, hp, mp, arm, dmg):
@@ -18,16 +32,14 @@ class Enemy(Character):
     pass
 
 def generate_map(size):
-    # Deterministic map generation without random module
-    game_map = []
-    for y in range(size):
-        row = []
-        for x in range(size):
-            if x == 0 or y == 0 or x == size-1 or y == size-1:
-                row.append('#')  # Border walls
-            else:
-                row.append('.')
-        game_map.append(row)
+    # Deterministic map generation without random module.
+    # Пол - заполнитель Tilemap, поэтому пишутся только стены по краям
+    game_map = Tilemap(size, size, fill='.')
+    for i in range(size):
+        game_map.set(i, 0, '#')         # Border walls
+        game_map.set(i, size - 1, '#')
+        game_map.set(0, i, '#')
+        game_map.set(size - 1, i, '#')
     return game_map
 
 def place_entities(game_map, size):
@@ -40,21 +52,33 @@ def place_entities(game_map, size):
 def generate_items(game_map, size):
     # Fixed item position in center
     center = size // 2
-    game_map[center][center] = '!'
+    game_map.set(center, center, '!')
     return [(center, center)]
 
-def render_map(game_map, pc_pos, npc_pos, items):
-    for y in range(len(game_map)):
-        for x in range(len(game_map[y])):
-            if (x, y) == pc_pos:
-                print('@', end=' ')
-            elif (x, y) == npc_pos:
-                print('E', end=' ')
-            elif (x, y) in items:
-                print('!', end=' ')
-            else:
-                print(game_map[y][x], end=' ')
-        print()
+_frame = TextFrame()
+
+def render_map(game_map, pc_pos, npc_pos, items, frame=None, camera=None):
+    # Без frame кадр из одной карты выводится сразу. С camera выводится
+    # только окно вокруг игрока, сколько бы ни была карта
+    own_frame = frame is None
+    if own_frame:
+        frame = _frame
+        frame.begin()
+    overlays = {}
+    for x, y in items:
+        overlays.setdefault(y, {})[x] = '!'
+    overlays.setdefault(npc_pos[1], {})[npc_pos[0]] = 'E'
+    overlays.setdefault(pc_pos[1], {})[pc_pos[0]] = '@'
+    if camera is None:
+        for y, row in enumerate(game_map):
+            frame.map_row(y, row, overlays.get(y))
+    else:
+        camera.set_world(game_map.width, game_map.height)
+        camera.follow(*pc_pos)
+        for y in range(camera.top, camera.bottom):
+            frame.map_row(y, game_map.row(y), overlays.get(y), camera.left, camera.right)
+    if own_frame:
+        frame.flush()
 
 def move(direction, position, game_map):
     x, y = position
@@ -64,8 +88,8 @@ def move(direction, position, game_map):
     elif direction == 'a': new_x -= 1
     elif direction == 'd': new_x += 1
 
-    if 0 <= new_x < len(game_map[0]) and 0 <= new_y < len(game_map):
-        if game_map[new_y][new_x] != '#':
+    if game_map.in_bounds(new_x, new_y):
+        if game_map.get(new_x, new_y) != '#':
             return (new_x, new_y)
     return (x, y)
 
@@ -75,7 +99,12 @@ def attack(attacker, defender):
     print(f"{type(attacker).__name__} наносит {damage} урона! "
           f"Осталось HP: {defender.hp}")
 
-def npc_ai(npc_pos, game_map):
+def npc_ai(npc_pos, game_map, field=None, flee=False):
+    # С картой расстояний NPC идет к игроку (или убегает от него)
+    if field is not None:
+        x, y = npc_pos
+        step = field.step_away(x, y) if flee else field.step_towards(x, y)
+        return step or npc_pos
     directions = ['d', 's', 'a', 'w']
     for direction in directions:
         new_pos = move(direction, npc_pos, game_map)
@@ -83,12 +112,19 @@ def npc_ai(npc_pos, game_map):
             return new_pos
     return npc_pos
 
-def show_debug(pc, npc, items_collected):
-    print("\n--- Debug информация ---")
-    print(f"PC: HP {pc.hp}, MP {pc.mp}, ARM {pc.arm}, DMG {pc.dmg}")
-    print(f"NPC: HP {npc.hp}, MP {npc.mp}, ARM {npc.arm}, DMG {npc.dmg}")
-    print(f"Инвентарь: {', '.join(pc.inventory)}")
-    print(f"Собрано предметов: {items_collected}")
+def show_debug(pc, npc, items_collected, frame=None):
+    lines = [
+        "\n--- Debug информация ---",
+        f"PC: HP {pc.hp}, MP {pc.mp}, ARM {pc.arm}, DMG {pc.dmg}",
+        f"NPC: HP {npc.hp}, MP {npc.mp}, ARM {npc.arm}, DMG {npc.dmg}",
+        f"Инвентарь: {', '.join(pc.inventory)}",
+        f"Собрано предметов: {items_collected}",
+    ]
+    if frame is None:
+        print("\n".join(lines))
+    else:
+        for line in lines:
+            frame.line(line)
 
 def main():
     print("Выберите тип карты:")
@@ -97,13 +133,13 @@ def main():
     choice = input("> ")
 
     if choice == '1':
-        game_map = [
+        game_map = Tilemap.from_rows([
             ['#', '#', '#', '#', '#'],
             ['#', '.', '.', '.', '#'],
             ['#', '.', '.', '.', '#'],
             ['#', '.', '.', '.', '#'],
             ['#', '#', '#', '#', '#']
-        ]
+        ])
         size = 5
     else:
         size = int(input("Введите размер карты: "))
@@ -115,10 +151,22 @@ def main():
 
     player = Player(hp=100, mp=50, arm=10, dmg=15)
     enemy = Enemy(hp=80, mp=30, arm=5, dmg=10)
+    field = DistanceField(game_map, max_distance=CHASE_RADIUS)
+    camera = Camera(30, 15, game_map.width, game_map.height)  # Окно карты на экране
+
+    # Очередь ходов по скорости: при равной скорости игрок и NPC ходят по очереди
+    scheduler = TurnScheduler()
+    scheduler.schedule(player)
+    scheduler.schedule(enemy)
+    scheduler.pop()  # Первым ходит игрок
 
+    frame = TextFrame()
     while player.hp > 0 and enemy.hp > 0:
-        render_map(game_map, pc_pos, npc_pos, items)
-        show_debug(player, enemy, items_collected)
+        # Карта и отладка собираются в один кадр и выводятся одной записью
+        frame.begin()
+        render_map(game_map, pc_pos, npc_pos, items, frame, camera)
+        show_debug(player, enemy, items_collected, frame)
+        frame.flush()
         
         action = input("\nДействие (wasd/attack): ").lower()
 
@@ -127,7 +175,7 @@ def main():
             if new_pos in items:
                 player.pickup("предмет")
                 items.remove(new_pos)
-                game_map[new_pos[1]][new_pos[0]] = '.'
+                game_map.set(new_pos[0], new_pos[1], '.')
                 items_collected += 1
             pc_pos = new_pos
 
@@ -136,13 +184,21 @@ def main():
                 attack(player, enemy)
             else:
                 print("Слишком далеко для атаки!")
+        scheduler.spend(player)
+
+        # NPC ходит, пока снова не настанет ход игрока. Убитый игроком NPC
+        # успевает ответить одним ходом
+        while scheduler.pop() is enemy:
+            # NPC movement: раненый NPC убегает, иначе преследует игрока
+            field.update(pc_pos)
+            npc_pos = npc_ai(npc_pos, game_map, field, flee=enemy.hp < 20)
+            if pc_pos == npc_pos:
+                attack(enemy, player)
+            scheduler.spend(enemy)
+            if player.hp <= 0 or enemy.hp <= 0:
+                break
 
-        # NPC movement
-        npc_pos = npc_ai(npc_pos, game_map)
-        if pc_pos == npc_pos:
-            attack(enemy, player)
-
-        # Check game over
+        # Check game over: если погибли оба, игрок проиграл
         if player.hp <= 0:
             print("Вы проиграли!")
             break
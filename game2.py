@@ -1,3 +1,43 @@
+import time
+
+STARTED = time.perf_counter()  # Начало импорта модулей игры (для --startup)
+
+import os
+import random
+import struct
+import sys
+import zlib
+
+from camera import Camera
+from content import Locations
+from inventory import Inventory
+from locationcache import LocationCache, pack_entities, unpack_entities
+from pathfinding import DistanceField
+from profiling import profiled
+from quests import QuestTracker, RewardRegistry
+from savegame import FULL, SaveFile, encode_record
+from scheduler import NORMAL_SPEED, TurnScheduler
+from spawning import SpawnRule, Spawner
+from spatial import SpatialIndex
+from textframe import TextFrame
+from visibility import FieldOfView, MapMemory
+
+IMPORTED = time.perf_counter()
+
+# Скорость по имени (остальные - NORMAL_SPEED): волк ходит 6 раз за 5 ходов игрока
+SPEEDS = {"Волк": 120}
+
+WANDER = ((0, -1), (0, 1), (-1, 0), (1, 0), (0, 0))  # Шаги блуждания (и стоять на месте)
+
+
+def wander_step(seed, tick, x, y):
+    # Шаг блуждания врага в (x, y) на тике tick. Зависит только от аргументов,
+    # поэтому совпадает в игре, при воспроизведении и при догоняющем расчете
+    h = (seed ^ tick * 0x9E3779B1 ^ x * 0x85EBCA6B ^ y * 0xC2B2AE35) & 0xffffffff
+    h = (h ^ (h >> 15)) * 0x2C1B3C6D & 0xffffffff
+    return WANDER[(h >> 16) % len(WANDER)]
+
+
 class Entity:
     def __init__(self, name, hp, mp, armor, damage, x=0, y=0):
         self.name = name
@@ -9,13 +49,21 @@ class Entity:
         self.damage = damage
         self.x = x
         self.y = y
-        self.inventory = []
+        self.inventory = Inventory()  # Стопки предметов с индексом по типам
         self.seed = (x + y) * 12345  # Простое начальное значение для генерации
+        self.index = None  # Пространственный индекс, в котором лежит сущность
+        self.output = None  # Куда писать сообщения (None - stdout)
+        self.flee_ratio = 0.25  # Доля HP, ниже которой враг убегает
+        self.speed = SPEEDS.get(name, NORMAL_SPEED)  # Энергии за тик
+        self.energy = 0         # Накопленная энергия (для TurnScheduler)
+        self.energy_time = 0    # Тик, по который энергия начислена
     
     def move(self, dx, dy, game_map):
         new_x, new_y = self.x + dx, self.y + dy
-        if 0 <= new_x < len(game_map[0]) and 0 <= new_y < len(game_map):
-            if game_map[new_y][new_x] != '#':
+        if game_map.in_bounds(new_x, new_y):
+            if game_map.get(new_x, new_y) != '#':
+                if self.index is not None:
+                    self.index.move(self, self.x, self.y, new_x, new_y)
                 self.x, self.y = new_x, new_y
                 return True
         return False
@@ -29,20 +77,33 @@ class Entity:
         return self.hp > 0
     
     def add_to_inventory(self, item):
-        self.inventory.append(item)
+        # False - в инвентаре нет места под новую стопку
+        return self.inventory.add(item)
     
     def use_item(self, item_index):
-        if 0 <= item_index < len(self.inventory):
-            item = self.inventory[item_index]
-            if item.type == "heal":
-                self.hp = min(self.max_hp, self.hp + item.value)
-                print(f"{self.name} использовал {item.name} и восстановил {item.value} HP!")
-            elif item.type == "mana":
-                self.mp = min(self.max_mp, self.mp + item.value)
-                print(f"{self.name} использовал {item.name} и восстановил {item.value} MP!")
-            self.inventory.pop(item_index)
-            return True
-        return False
+        stack = self.inventory.slot(item_index)
+        if stack is None:
+            return False
+        self._use_stack(stack)
+        return True
+    
+    def use_best(self, item_type):
+        # Лучший предмет типа (например, самое сильное зелье лечения)
+        stack = self.inventory.best(item_type)
+        if stack is None:
+            return False
+        self._use_stack(stack)
+        return True
+    
+    def _use_stack(self, stack):
+        item = stack.item
+        if item.type == "heal":
+            self.hp = min(self.max_hp, self.hp + item.value)
+            print(f"{self.name} использовал {item.name} и восстановил {item.value} HP!", file=self.output)
+        elif item.type == "mana":
+            self.mp = min(self.max_mp, self.mp + item.value)
+            print(f"{self.name} использовал {item.name} и восстановил {item.value} MP!", file=self.output)
+        self.inventory.take(stack)
     
     def simple_random(self):
         # Простейший генератор псевдослучайных чисел
@@ -66,210 +127,431 @@ class Quest:
         self.completed = completed
         self.progress = {k: 0 for k in self.target.keys()}
 
+# Что и где появляется в локациях: символ клетки, шанс, варианты с весами
+SPAWN_TABLE = {
+    "lake": [
+        SpawnRule("H", 1 / 3, "item", [
+            (1, lambda x, y: Item("Целебная трава", "herb", 1, x, y)),
+        ]),
+    ],
+    "forest": [
+        SpawnRule("T", 0.2, "item", [
+            (9, lambda x, y: Item("Волчья шкура", "pelt", 1, x, y)),
+            (1, lambda x, y: Item("Синий цветок", "blue_flower", 1, x, y)),
+        ]),
+        SpawnRule("T", 0.25, "enemy", [
+            (1, lambda x, y: Entity("Волк", 30, 0, 5, 10, x, y)),
+        ]),
+    ],
+    "basement": [
+        SpawnRule("R", 0.5, "enemy", [
+            (1, lambda x, y: Entity("Крыса", 15, 0, 2, 5, x, y)),
+        ]),
+    ],
+}
+
+# Какие события квестов дают подобранные предметы и убитые враги
+ITEM_EVENTS = {"herb": "herb", "blue_flower": "blue_flower"}
+KILL_EVENTS = {"Крыса": "rat", "Волк": "pelt"}
+
+# Награды за квесты по имени из Quest.reward
+REWARDS = RewardRegistry()
+
+@REWARDS.register("Зелье здоровья")
+def _reward_health_potion(game):
+    game.player.add_to_inventory(Item("Зелье здоровья", "heal", 30))
+
+@REWARDS.register("Синее зелье")
+def _reward_blue_potion(game):
+    game.player.add_to_inventory(Item("Синее зелье", "heal", 50))
+
+@REWARDS.register("Меч")
+def _reward_sword(game):
+    game.player.damage += 10
+    return "Ваш урон увеличен на 10!"
+
+@REWARDS.register("Кожаный доспех")
+def _reward_armor(game):
+    game.player.armor += 5
+    return "Ваша броня увеличена на 5!"
+
 class Game:
-    def __init__(self):
+    def __init__(self, input_func=None, output=None, seed=None, save_path=None):
+        # Источник ввода и поток вывода: по умолчанию консоль. Для запуска
+        # без терминала передайте, например, ScriptedInput и NullStream
+        self.input_func = input_func or input
+        self.output = output
+        self.profiler = None  # profiling.Profiler для замеров по фазам
+        # Зерно мира: без него берется случайное, но оно сохраняется в self.seed
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.spawner = Spawner(SPAWN_TABLE, self.seed)
+        # Предметы и враги покинутых локаций, чтобы не создавать их заново
+        self.location_cache = LocationCache(Item, Entity)
+        self.frame = TextFrame()  # Кадр, который выводится одной записью
         self.player = None
         self.enemies = []
         self.items = []
+        self.enemy_index = SpatialIndex()  # Враги по клеткам
+        self.item_index = SpatialIndex()   # Предметы на карте по клеткам
         self.quests = []
+        self.quest_tracker = QuestTracker()  # Цель -> активные квесты
         self.current_location = "village"
         self.locations = {}
         self.load_locations()
         self.game_map = self.locations[self.current_location]["map"]
+        self.aggro_radius = 6  # На каком расстоянии враги замечают игрока
+        # Расстояния до игрока: нужны только врагам в aggro_radius, поэтому
+        # обход ограничен и на большой карте не идет по всей карте каждый ход
+        self.chase_field = DistanceField(self.game_map, max_distance=3 * self.aggro_radius)
+        self.scheduler = TurnScheduler()  # Очередь ходов игрока и проснувшихся врагов
+        # Дальний круг: враги ближе lod_radius, но вне очереди ходов, бродят
+        # раз в coarse_every ходов; дальше - стоят до прихода игрока
+        self.lod_radius = 20
+        self.coarse_every = 4
+        self.catch_up_limit = 16  # Предел шагов блуждания при возвращении в локацию
+        self.world_time = 0  # Ходов в мире (сохраняется, в отличие от turn)
+        self.fov = FieldOfView(self.game_map)  # Что видно игроку (# и T закрывают обзор)
+        self.view_radius = 8   # Дальность обзора (None - видна вся карта)
+        self.memories = {}     # Локация -> MapMemory с уже виденными клетками
+        self.camera = Camera(40, 20)  # Окно карты на экране (None - вся карта)
         self.debug_mode = False
-        self.setup_game()
+        self.turn = 0  # Номер текущего хода
+        self.input_log = None  # replay.InputRecorder или replay.Replay
+        self.last_prompt = ''  # Последний вопрос игроку (для ботов)
+        self.deaths = 0
+        self.quests_completed = 0
+        # Секции состояния на входе в локацию: сюда игра возвращается при смерти
+        self.checkpoint = None
+        # Файл сохранения: автосохранение после каждого хода, загрузка при запуске
+        self.save_file = SaveFile(save_path) if save_path else None
+        if not self.load_game():
+            self.setup_game()
     
     def load_locations(self):
-        village_map = [
-            ["#", "#", "#", "#", "#", "#", "#", "#", "#", "#"],
-            ["#", ".", ".", ".", ".", ".", ".", ".", ".", "#"],
-            ["#", ".", "H", ".", "#", "#", "#", ".", ".", "#"],
-            ["#", ".", ".", ".", "#", "W", "#", ".", ".", "#"],
-            ["#", ".", "#", "#", "#", ".", "#", "#", ".", "#"],
-            ["#", ".", "#", "L", ".", ".", ".", "#", ".", "#"],
-            ["#", ".", "#", "#", "#", ".", "#", "#", ".", "#"],
-            ["#", ".", ".", ".", ".", ".", ".", ".", ".", "#"],
-            ["#", "F", ".", "C", ".", ".", ".", "G", ".", "#"],
-            ["#", "#", "#", "#", "#", "#", "#", "#", "#", "#"]
-        ]
-        
-        forest_map = [
-            ["#", "#", "#", "#", "#", "#", "#", "#", "#", "#"],
-            ["#", ".", ".", ".", ".", ".", ".", "T", ".", "#"],
-            ["#", ".", "T", ".", "#", "#", "#", ".", ".", "#"],
-            ["#", ".", ".", ".", "#", "T", "#", ".", "T", "#"],
-            ["#", ".", "#", "#", "#", ".", "#", "#", ".", "#"],
-            ["#", ".", "#", "T", ".", ".", "T", "#", ".", "#"],
-            ["#", ".", "#", "#", "#", ".", "#", "#", ".", "#"],
-            ["#", ".", ".", ".", ".", ".", ".", ".", ".", "#"],
-            ["#", ".", "T", ".", ".", ".", "T", ".", ".", "#"],
-            ["#", "#", "#", "#", "#", "#", "#", "#", "#", "#"]
-        ]
-        
-        lake_map = [
-            ["#", "#", "#", "#", "#", "#", "#", "#", "#", "#"],
-            ["#", "~", "~", "~", "~", "~", "~", "~", "~", "#"],
-            ["#", "~", "H", "~", "~", "~", "~", "~", "~", "#"],
-            ["#", "~", "~", "~", "~", "~", "~", "~", "~", "#"],
-            ["#", "~", "~", "~", "~", "~", "~", "~", "~", "#"],
-            ["#", "~", "~", "~", "~", "~", "~", "~", "~", "#"],
-            ["#", "~", "~", "~", "~", "~", "~", "~", "~", "#"],
-            ["#", "~", "~", "~", "~", "~", "~", "~", "~", "#"],
-            ["#", "~", "~", "~", "~", "~", "~", "~", "~", "#"],
-            ["#", "#", "#", "#", "#", "#", "#", "#", "#", "#"]
-        ]
-        
-        basement_map = [
-            ["#", "#", "#", "#", "#", "#", "#", "#", "#", "#"],
-            ["#", ".", ".", ".", ".", ".", ".", ".", ".", "#"],
-            ["#", ".", "R", ".", "R", ".", "R", ".", ".", "#"],
-            ["#", ".", ".", ".", ".", ".", ".", ".", ".", "#"],
-            ["#", ".", "R", ".", "R", ".", "R", ".", ".", "#"],
-            ["#", ".", ".", ".", ".", ".", ".", ".", ".", "#"],
-            ["#", ".", "R", ".", "R", ".", "R", ".", ".", "#"],
-            ["#", ".", ".", ".", ".", ".", ".", ".", ".", "#"],
-            ["#", ".", ".", ".", ".", ".", ".", ".", ".", "#"],
-            ["#", "#", "#", "#", "#", "#", "#", "#", "#", "#"]
-        ]
-        
-        self.locations = {
-            "village": {
-                "map": village_map,
-                "name": "Деревня",
-                "exits": {"forest": (5, 8), "lake": (1, 8), "basement": (3, 5)},
-                "description": "Тихая деревня, где вы начали своё приключение."
-            },
-            "forest": {
-                "map": forest_map,
-                "name": "Лес",
-                "exits": {"village": (5, 1)},
-                "description": "Густой лес, полный опасностей и ценных ресурсов."
-            },
-            "lake": {
-                "map": lake_map,
-                "name": "Озеро",
-                "exits": {"village": (1, 1)},
-                "description": "Спокойное озеро с целебными травами по берегам."
-            },
-            "basement": {
-                "map": basement_map,
-                "name": "Подвал",
-                "exits": {"village": (3, 5)},
-                "description": "Тёмный и сырой подвал, кишащий крысами."
-            }
-        }
+        # Описания локаций из locations.json (через кэш content); карта
+        # локации разбирается при первом обращении к ней
+        self.locations = Locations()
+    
+    def say(self, *args, **kwargs):
+        print(*args, file=self.output, **kwargs)
+    
+    def ask(self, prompt=''):
+        self.last_prompt = prompt
+        if self.output is not None:
+            # input() пишет приглашение в консоль, поэтому вывожу его сам
+            self.output.write(prompt)
+            key = self.input_func()
+        else:
+            key = self.input_func(prompt)
+        if self.input_log is not None:
+            self.input_log.key(self.turn, key)
+        return key
     
     def setup_game(self):
+        self.location_cache.clear()
         self.player = Entity("Герой", 100, 50, 10, 20, 1, 1)
+        self.player.output = self.output
         
         health_potion = Item("Зелье здоровья", "heal", 30)
         mana_potion = Item("Зелье маны", "mana", 20)
         self.player.add_to_inventory(health_potion)
         self.player.add_to_inventory(mana_potion)
         
-        self.quests = [
+        self.quests = self.create_quests()
+        self.quest_tracker.reset(self.quests)
+        self.memories.clear()
+        self.world_time = 0
+        
+        self.generate_map_items()
+        self.checkpoint = self.save_sections()
+    
+    def create_quests(self):
+        return [
             Quest("Сбор трав", "Соберите 5 целебных трав у озера", {"herb": 5}, {"Зелье здоровья": 2}),
             Quest("Крысы в подвале", "Убейте 10 крыс в подвале", {"rat": 10}, {"Меч": 1}),
             Quest("Сбор шкур", "Соберите 3 волчьи шкуры в лесу", {"pelt": 3}, {"Кожаный доспех": 1}),
             Quest("Секретный цветок", "Найдите редкий синий цветок в лесу", {"blue_flower": 1}, {"Синее зелье": 1})
         ]
+    
+    def save_sections(self):
+        # Состояние игры по секциям для SaveFile: неизменившиеся секции
+        # не попадут в дельту
+        sections = {
+            "meta": struct.pack('<I', self.seed) + self.current_location.encode('utf-8'),
+            "player": pack_entities([], [self.player]),
+            "stacks": self.player.inventory.pack(),
+        }
+        quests = []
+        for quest in self.quests:
+            progress = [quest.progress[target] for target in quest.target]
+            quests.append(struct.pack(f'<BH{len(progress)}I', quest.completed, len(progress), *progress))
+        sections["quests"] = b''.join(quests)
         
-        self.generate_map_items()
+        sections["loc:" + self.current_location] = pack_entities(self.items, self.enemies)
+        for name, (items, enemies) in self.location_cache.live.items():
+            sections["loc:" + name] = pack_entities(items, enemies)
+        for name, data in self.location_cache.packed.items():
+            sections["loc:" + name] = data
+        # Время мира и когда игрок покинул каждую локацию (для догоняющего расчета)
+        clock = [struct.pack('<I', self.world_time)]
+        for name, left in self.location_cache.left.items():
+            encoded = name.encode('utf-8')
+            clock.append(struct.pack('<IB', left, len(encoded)) + encoded)
+        sections["clock"] = b''.join(clock)
+        for name, location in self.locations.loaded():
+            if location["map"].dirty:
+                sections["map:" + name] = location["map"].pack_dirty()
+        return sections
     
-    def generate_map_items(self):
-        self.items = []
+    def load_sections(self, sections):
+        (self.seed,) = struct.unpack_from('<I', sections["meta"])
+        self.spawner.seed = self.seed
+        self.current_location = sections["meta"][4:].decode('utf-8')
         
-        if self.current_location == "lake":
-            for y in range(len(self.game_map)):
-                for x in range(len(self.game_map[y])):
-                    if self.game_map[y][x] == "H":
-                        # Используем простой детерминированный "случайный" выбор
-                        val = (x * y + x + y) % 3
-                        if val == 0:  # ~33% chance
-                            self.items.append(Item("Целебная трава", "herb", 1, x, y))
+        # Карты заново из описания локаций, поверх - измененные чанки
+        self.load_locations()
+        for name in self.locations:
+            if "map:" + name in sections:
+                self.locations[name]["map"].load_chunks(sections["map:" + name])
+        self.game_map = self.locations[self.current_location]["map"]
+        self.chase_field.set_map(self.game_map)
+        self.memories.clear()
         
-        elif self.current_location == "forest":
-            for y in range(len(self.game_map)):
-                for x in range(len(self.game_map[y])):
-                    if self.game_map[y][x] == "T":
-                        val = (x * y + x + y) % 5
-                        if val == 0:  # ~20% chance
-                            rare_val = (x + y) % 10
-                            if rare_val == 0:  # 10% chance from previous 20%
-                                self.items.append(Item("Синий цветок", "blue_flower", 1, x, y))
-                            else:
-                                self.items.append(Item("Волчья шкура", "pelt", 1, x, y))
+        _, (self.player,) = unpack_entities(sections["player"], Item, Entity)
+        self.player.output = self.output
+        if "stacks" in sections:
+            self.player.inventory = Inventory.unpack(sections["stacks"], Item)
+        else:
+            # Сохранения до стопок: инвентарь списком предметов
+            items, _ = unpack_entities(sections["inventory"], Item, Entity)
+            for item in items:
+                self.player.add_to_inventory(item)
         
-        self.enemies = []
-        if self.current_location == "basement":
-            for y in range(len(self.game_map)):
-                for x in range(len(self.game_map[y])):
-                    if self.game_map[y][x] == "R":
-                        val = (x * y + x + y) % 2
-                        if val == 0:  # 50% chance
-                            self.enemies.append(Entity("Крыса", 15, 0, 2, 5, x, y))
-        elif self.current_location == "forest":
-            for y in range(len(self.game_map)):
-                for x in range(len(self.game_map[y])):
-                    if self.game_map[y][x] == "T":
-                        val = (x * y + x + y) % 4
-                        if val == 0:  # ~25% chance
-                            self.enemies.append(Entity("Волк", 30, 0, 5, 10, x, y))
+        self.quests = self.create_quests()
+        data, offset = sections["quests"], 0
+        for quest in self.quests:
+            completed, count = struct.unpack_from('<BH', data, offset)
+            offset += 3
+            progress = struct.unpack_from(f'<{count}I', data, offset)
+            offset += 4 * count
+            quest.completed = bool(completed)
+            for target, value in zip(quest.target, progress):
+                quest.progress[target] = value
+        self.quest_tracker.reset(self.quests)
+        
+        # Остальные локации остаются упакованными до первого визита
+        self.location_cache.clear()
+        current = sections.get("loc:" + self.current_location)
+        for name, data in sections.items():
+            if name.startswith("loc:") and name != "loc:" + self.current_location:
+                self.location_cache.packed[name[4:]] = data
+        # Сохранения без часов: время начинается заново, догонять нечего
+        data = sections.get("clock", struct.pack('<I', 0))
+        (self.world_time,) = struct.unpack_from('<I', data)
+        offset = 4
+        while offset < len(data):
+            left, size = struct.unpack_from('<IB', data, offset)
+            offset += 5
+            self.location_cache.left[data[offset:offset + size].decode('utf-8')] = left
+            offset += size
+        if current is None:
+            self.generate_map_items()
+        else:
+            self.items, self.enemies = unpack_entities(current, Item, Entity)
+            self.rebuild_indexes()
+        self.checkpoint = sections
+    
+    def save_game(self, full=False):
+        """Сохраняю игру; без full дописывается только изменившееся"""
+        if self.save_file is None:
+            return 0
+        return self.save_file.write(self.save_sections(), full)
+    
+    def load_game(self):
+        if self.save_file is None or not self.save_file.exists():
+            return False
+        try:
+            sections = self.save_file.read()
+        except ValueError:
+            return False  # Пустой или испорченный файл: начинаю новую игру
+        self.load_sections(sections)
+        return True
+    
+    def state_hash(self):
+        """crc32 состояния игры (для сверки при воспроизведении ввода)"""
+        crc = 0
+        for name, data in sorted(self.save_sections().items()):
+            crc = zlib.crc32(data, zlib.crc32(name.encode('utf-8'), crc))
+        return crc
+    
+    def record_input(self, path, checkpoint_every=10):
+        """Пишу дальнейший ввод в журнал path (воспроизведение - replay.py).
+        
+        В журнал попадает снимок текущего состояния, поэтому запись лучше
+        начинать до первого хода.
+        """
+        from replay import SAVE_EXISTED, SAVES, InputRecorder
+        
+        flags = 0
+        if self.save_file is not None:
+            flags |= SAVES
+            if self.save_file.exists():
+                flags |= SAVE_EXISTED
+        # Снимок становится и точкой возврата при смерти - как при воспроизведении
+        self.checkpoint = self.save_sections()
+        snapshot = encode_record(FULL, 0, self.checkpoint)
+        self.input_log = InputRecorder(path, snapshot, flags, checkpoint_every)
+        return self.input_log
+    
+    @profiled('generate_map_items')
+    def generate_map_items(self):
+        # Предметы и враги раскладываются по таблице SPAWN_TABLE потоком
+        # случайных чисел локации: одно зерно - одна и та же раскладка
+        spawned = self.spawner.spawn(self.current_location, self.game_map)
+        self.items = spawned.get("item", [])
+        self.enemies = spawned.get("enemy", [])
+        
+        self.rebuild_indexes()
+    
+    def rebuild_indexes(self):
+        self.reset_turns()
+        self.enemy_index.clear()
+        for enemy in self.enemies:
+            self.enemy_index.add(enemy)
+            enemy.index = self.enemy_index
+        self.item_index.clear()
+        for item in self.items:
+            if item.x is not None:
+                self.item_index.add(item)
+    
+    def reset_turns(self):
+        # Новая очередь ходов: в ней только игрок, и сейчас его ход. Враги
+        # встают в очередь, когда замечают игрока
+        self.scheduler.clear()
+        self.scheduler.schedule(self.player)
+        self.scheduler.pop()
     
     def change_location(self, new_location):
         if new_location in self.locations:
             exit_pos = self.locations[self.current_location]["exits"].get(new_location)
             if exit_pos and (self.player.x, self.player.y) == exit_pos:
+                self.location_cache.store(self.current_location, self.items, self.enemies,
+                                          self.world_time)
                 self.current_location = new_location
                 self.game_map = self.locations[new_location]["map"]
+                self.chase_field.set_map(self.game_map)
                 self.player.x, self.player.y = self.locations[new_location]["exits"].get(self.current_location, (1, 1))
-                self.generate_map_items()
-                print(f"Вы перешли в локацию: {self.locations[new_location]['name']}")
-                print(self.locations[new_location]["description"])
+                state = self.location_cache.load(new_location)
+                left = self.location_cache.left.pop(new_location, None)
+                if state is None:
+                    self.generate_map_items()
+                else:
+                    self.items, self.enemies = state
+                    if left is not None:
+                        self.catch_up(self.world_time - left)
+                    self.rebuild_indexes()
+                self.checkpoint = self.save_sections()
+                self.say(f"Вы перешли в локацию: {self.locations[new_location]['name']}")
+                self.say(self.locations[new_location]["description"])
                 return True
         return False
     
+    def visible_cells(self):
+        """Номера клеток (y * ширина + x), видимых игроком; None - видно всё.
+
+        Заодно запоминаю увиденное в MapMemory текущей локации.
+        """
+        if self.view_radius is None:
+            return None
+        if self.fov.game_map is not self.game_map:
+            self.fov.set_map(self.game_map)  # Сменилась локация
+        cells = self.fov.visible(self.player.x, self.player.y, self.view_radius)
+        memory = self.memories.get(self.current_location)
+        if memory is None or memory.game_map is not self.game_map:
+            memory = self.memories[self.current_location] = MapMemory(self.game_map)
+        memory.reveal(cells)
+        return cells
+    
+    @staticmethod
+    def entities_in(entities, index, left, top, right, bottom):
+        """Сущности в прямоугольнике карты: из индекса или перебором списка,
+        смотря что короче - список или клетки прямоугольника
+        """
+        if len(entities) < (right - left) * (bottom - top):
+            return [entity for entity in entities if entity.x is not None
+                    and left <= entity.x < right and top <= entity.y < bottom]
+        return index.in_rect(left, top, right, bottom)
+    
     def clear_screen(self):
-        print("\n" * 50)
+        self.say("\n" * 50)
     
+    @profiled('render_map')
     def render_map(self):
-        self.clear_screen()
+        frame = self.frame
+        frame.begin("\n" * 50)
         
-        print(f"Локация: {self.locations[self.current_location]['name']}")
-        print(f"HP: {self.player.hp}/{self.player.max_hp} | MP: {self.player.mp}/{self.player.max_mp}")
-        print(f"Броня: {self.player.armor} | Урон: {self.player.damage}")
-        print("Управление: WASD - движение, I - инвентарь, Q - квесты, F - взаимодействие")
-        print()
+        frame.line(f"Локация: {self.locations[self.current_location]['name']}")
+        frame.line(f"HP: {self.player.hp}/{self.player.max_hp} | MP: {self.player.mp}/{self.player.max_mp}")
+        frame.line(f"Броня: {self.player.armor} | Урон: {self.player.damage}")
+        frame.line("Управление: WASD - движение, I - инвентарь, Q - квесты, F - взаимодействие")
+        frame.line()
         
-        for y in range(len(self.game_map)):
-            for x in range(len(self.game_map[y])):
-                if self.player.x == x and self.player.y == y:
-                    print("@", end=" ")
-                else:
-                    enemy_here = None
-                    for enemy in self.enemies:
-                        if enemy.x == x and enemy.y == y:
-                            enemy_here = enemy
-                            break
-                    
-                    item_here = None
-                    for item in self.items:
-                        if hasattr(item, 'x') and item.x == x and item.y == y:
-                            item_here = item
-                            break
-                    
-                    if enemy_here:
-                        print("E", end=" ")
-                    elif item_here:
-                        print("*", end=" ")
-                    else:
-                        print(self.game_map[y][x], end=" ")
-            print()
+        # Окно карты: камера или вся карта, если она помещается в окно
+        camera = self.camera
+        game_map = self.game_map
+        if camera is not None and game_map.width <= camera.width and game_map.height <= camera.height:
+            camera = None
+        if camera is None:
+            left, top, right, bottom = 0, 0, game_map.width, game_map.height
+        else:
+            camera.set_world(game_map.width, game_map.height)
+            camera.follow(self.player.x, self.player.y)
+            left, top, right, bottom = camera.left, camera.top, camera.right, camera.bottom
+        
+        # Без обзора рисую сущности в окне, с обзором - только видимые, а
+        # карта - запомненная (невиданные клетки пустые)
+        visible = self.visible_cells()
+        if visible is None:
+            rows = game_map
+        else:
+            radius = self.view_radius
+            left = max(left, self.player.x - radius)
+            top = max(top, self.player.y - radius)
+            right = min(right, self.player.x + radius + 1)
+            bottom = min(bottom, self.player.y + radius + 1)
+            rows = self.memories[self.current_location].tiles
+        width = game_map.width
+        
+        # Собираю символы сущностей по строкам: предметы, поверх них враги,
+        # поверх всех игрок. Строки без сущностей берутся из кэша кадра
+        overlays = {}
+        for item in self.entities_in(self.items, self.item_index, left, top, right, bottom):
+            if visible is None or item.y * width + item.x in visible:
+                overlays.setdefault(item.y, {})[item.x] = "*"
+        for enemy in self.entities_in(self.enemies, self.enemy_index, left, top, right, bottom):
+            if visible is None or enemy.y * width + enemy.x in visible:
+                overlays.setdefault(enemy.y, {})[enemy.x] = "E"
+        overlays.setdefault(self.player.y, {})[self.player.x] = "@"
+        
+        if camera is None:
+            for y, row in enumerate(rows):
+                frame.map_row(y, row, overlays.get(y))
+        else:
+            # Только строки и столбцы окна камеры: кадр не растет с картой
+            start, stop = camera.left, camera.right
+            for y in range(camera.top, camera.bottom):
+                frame.map_row(y, rows.row(y), overlays.get(y), start, stop)
         
         if hasattr(self, 'message'):
-            print(self.message)
+            frame.line(self.message)
             delattr(self, 'message')
+        
+        if self.profiler is not None and self.profiler.overlay:
+            frame.line("\n".join(self.profiler.overlay_lines()))
+        
+        frame.flush(self.output)
     
+    @profiled('process_input')
     def process_input(self, command):
         moved = False
         
@@ -292,75 +574,183 @@ class Game:
             return False
         
         if moved:
-            self.check_for_combat()
+            if self.check_for_combat():
+                return True  # Игрок погиб: ход прерван, враги не ходят
             self.check_for_items()
-            self.check_location_change()
+            if not self.check_location_change():
+                self.move_enemies()
+                self.check_for_combat()
         
         return True
     
     def check_for_combat(self):
-        for enemy in self.enemies[:]:
-            if self.player.x == enemy.x and self.player.y == enemy.y:
-                self.start_combat(enemy)
-                break
+        # True - игрок погиб в бою и ход прерван
+        enemy = self.enemy_index.first_at(self.player.x, self.player.y)
+        if enemy:
+            return self.start_combat(enemy)
+        return False
     
     def start_combat(self, enemy):
-        print(f"Бой с {enemy.name}!")
+        # True - игрок погиб, игра вернулась к точке входа в локацию
+        self.say(f"Бой с {enemy.name}!")
         while self.player.is_alive() and enemy.is_alive():
-            print(f"Ваше HP: {self.player.hp}/{self.player.max_hp} | HP {enemy.name}: {enemy.hp}/{enemy.max_hp}")
-            action = input("Атаковать (A) или Использовать предмет (I)? ").lower()
+            self.say(f"Ваше HP: {self.player.hp}/{self.player.max_hp} | HP {enemy.name}: {enemy.hp}/{enemy.max_hp}")
+            action = self.ask("Атаковать (A) или Использовать предмет (I)? ").lower()
             
             if action == 'a':
                 damage = self.player.attack(enemy)
-                print(f"Вы нанесли {damage} урона {enemy.name}!")
+                self.say(f"Вы нанесли {damage} урона {enemy.name}!")
             elif action == 'i':
                 self.show_inventory(combat=True)
-                item_choice = input("Выберите предмет для использования (номер или 'отмена'): ")
+                item_choice = self.ask("Выберите предмет для использования (номер или 'отмена'): ")
                 if item_choice.lower() != 'отмена':
                     try:
                         item_index = int(item_choice) - 1
                         if not self.player.use_item(item_index):
-                            print("Неверный выбор предмета!")
+                            self.say("Неверный выбор предмета!")
                             continue
                     except ValueError:
-                        print("Неверный ввод!")
+                        self.say("Неверный ввод!")
                         continue
             
             if not enemy.is_alive():
-                print(f"Вы победили {enemy.name}!")
-                if enemy.name == "Крыса":
-                    self.update_quest_progress("rat")
-                elif enemy.name == "Волк":
-                    self.update_quest_progress("pelt")
+                self.say(f"Вы победили {enemy.name}!")
+                target = KILL_EVENTS.get(enemy.name)
+                if target:
+                    self.update_quest_progress(target)
                 self.enemies.remove(enemy)
+                self.enemy_index.remove(enemy)
+                self.scheduler.unschedule(enemy)
+                enemy.index = None
                 break
             
             damage = enemy.attack(self.player)
-            print(f"{enemy.name} нанес вам {damage} урона!")
+            self.say(f"{enemy.name} нанес вам {damage} урона!")
             
             if not self.player.is_alive():
-                print("Вы погибли...")
-                input("Нажмите Enter, чтобы продолжить...")
-                self.setup_game()
-                return
+                self.say("Вы погибли...")
+                self.deaths += 1
+                self.ask("Нажмите Enter, чтобы продолжить...")
+                # Не автосохранение последнего хода: в нем враг может стоять
+                # рядом с игроком, и смерть повторялась бы без конца
+                self.load_sections(self.checkpoint)
+                self.message = "Вы вернулись ко входу в локацию"
+                return True
+        return False
     
     def check_for_items(self):
-        for item in self.items[:]:
-            if hasattr(item, 'x') and item.x == self.player.x and item.y == self.player.y:
-                self.player.add_to_inventory(item)
-                self.items.remove(item)
-                self.message = f"Вы подобрали: {item.name}"
-                if item.type == "herb":
-                    self.update_quest_progress("herb")
-                elif item.type == "blue_flower":
-                    self.update_quest_progress("blue_flower")
-                break
+        item = self.item_index.first_at(self.player.x, self.player.y)
+        if item:
+            if not self.player.add_to_inventory(item):
+                self.message = f"Инвентарь полон, {item.name} остается на земле"
+                return
+            self.item_index.remove(item)
+            self.items.remove(item)
+            self.message = f"Вы подобрали: {item.name}"
+            target = ITEM_EVENTS.get(item.type)
+            if target:
+                self.update_quest_progress(target)
     
     def check_location_change(self):
         for location, pos in self.locations[self.current_location]["exits"].items():
             if (self.player.x, self.player.y) == pos:
-                self.change_location(location)
+                return self.change_location(location)
+        return False
+    
+    def move_enemies(self):
+        # Ход игрока закончен: до его следующего хода действуют враги из
+        # очереди TurnScheduler, быстрые - чаще. Враг рядом с игроком и в
+        # поле зрения просыпается, а отставший или потерявший игрока из виду
+        # засыпает и больше ничего не стоит. Одна карта расстояний на всех:
+        # враг делает шаг к игроку, а раненый - от него
+        player, scheduler = self.player, self.scheduler
+        px, py = player.x, player.y
+        visible = self.visible_cells()
+        width = self.game_map.width
+        radius2 = self.aggro_radius * self.aggro_radius
+        for enemy in self.enemy_index.within(px, py, self.aggro_radius):
+            if visible is None or enemy.y * width + enemy.x in visible:
+                scheduler.schedule(enemy)
+        scheduler.spend(player)
+        
+        field = self.chase_field
+        occupied = lambda x, y: self.enemy_index.first_at(x, y) is not None
+        while True:
+            enemy = scheduler.pop()
+            if enemy is player or enemy is None:
                 break
+            dx, dy = enemy.x - px, enemy.y - py
+            if dx * dx + dy * dy > radius2 or (
+                    visible is not None and enemy.y * width + enemy.x not in visible):
+                continue  # Игрок далеко или не виден: враг засыпает
+            field.update((px, py))
+            if enemy.hp < enemy.max_hp * enemy.flee_ratio:
+                step = field.step_away(enemy.x, enemy.y, occupied)
+            else:
+                step = field.step_towards(enemy.x, enemy.y, occupied)
+            if step:
+                enemy.move(step[0] - enemy.x, step[1] - enemy.y, self.game_map)
+            scheduler.spend(enemy)
+        
+        self.coarse_update()
+    
+    def wander(self, enemy, tick):
+        # Шаг блуждания, если клетка не занята врагом или игроком
+        dx, dy = wander_step(self.seed, tick, enemy.x, enemy.y)
+        if dx or dy:
+            x, y = enemy.x + dx, enemy.y + dy
+            if (x, y) != (self.player.x, self.player.y) and self.enemy_index.first_at(x, y) is None:
+                enemy.move(dx, dy, self.game_map)
+    
+    def coarse_update(self):
+        # Дальний круг: спящие враги не дальше lod_radius по каждой оси делают
+        # шаг блуждания. Квадрат вокруг игрока делится на coarse_every полос,
+        # за ход обходится одна - каждый враг бродит раз в coarse_every ходов,
+        # а работа ровно делится между ходами. Враги дальше не стоят ничего
+        tick, scheduler = self.world_time, self.scheduler
+        x, y, radius = self.player.x, self.player.y, self.lod_radius
+        strip = -(-(2 * radius + 1) // self.coarse_every)
+        top = y - radius + tick % self.coarse_every * strip
+        bottom = min(top + strip, y + radius + 1)
+        for enemy in self.entities_in(self.enemies, self.enemy_index, x - radius, top,
+                                      x + radius + 1, bottom):
+            if enemy not in scheduler:
+                self.wander(enemy, tick)
+    
+    @profiled('catch_up')
+    def catch_up(self, turns):
+        # Игрок вернулся в локацию через turns ходов: пока его не было, враги
+        # жили по тем же кругам, что и при нем, считая от точки входа. Гнаться
+        # не за кем, поэтому и ближний круг, как дальний, бродит раз в
+        # coarse_every ходов, а враги дальше lod_radius по любой оси стоят на
+        # месте. Все пропущенные шаги считаются разом при входе, но не больше
+        # catch_up_limit на врага: за долгое отсутствие враги просто
+        # разбредаются. Считаю по координатам без индекса - после расчета
+        # индексы все равно строятся заново
+        steps = min(turns // self.coarse_every, self.catch_up_limit)
+        start = self.world_time - steps * self.coarse_every
+        game_map, seed = self.game_map, self.seed
+        get, width, height = game_map.get, game_map.width, game_map.height
+        px, py, radius = self.player.x, self.player.y, self.lod_radius
+        occupied = {(enemy.x, enemy.y) for enemy in self.enemies}
+        occupied.add((px, py))
+        near = [enemy for enemy in self.enemies
+                if abs(enemy.x - px) <= radius and abs(enemy.y - py) <= radius]
+        for step in range(steps):
+            tick = start + step * self.coarse_every
+            for enemy in near:
+                x, y = enemy.x, enemy.y
+                if abs(x - px) > radius or abs(y - py) > radius:
+                    continue  # Ушел за дальний круг и заснул
+                dx, dy = wander_step(seed, tick, x, y)
+                x += dx
+                y += dy
+                if ((dx or dy) and 0 <= x < width and 0 <= y < height
+                        and (x, y) not in occupied and get(x, y) != '#'):
+                    occupied.discard((enemy.x, enemy.y))
+                    occupied.add((x, y))
+                    enemy.x, enemy.y = x, y
+        return steps
     
     def interact(self):
         directions = [(0, -1), (0, 1), (-1, 0), (1, 0)]
@@ -368,12 +758,13 @@ class Game:
         
         for dx, dy in directions:
             nx, ny = self.player.x + dx, self.player.y + dy
-            if 0 <= nx < len(self.game_map[0]) and 0 <= ny < len(self.game_map):
-                if self.game_map[ny][nx] == "C":
+            if self.game_map.in_bounds(nx, ny):
+                tile = self.game_map.get(nx, ny)
+                if tile == "C":
                     self.open_chest()
                     interacted = True
                     break
-                elif self.game_map[ny][nx] == "G":
+                elif tile == "G":
                     self.talk_to_elder()
                     interacted = True
                     break
@@ -393,59 +784,103 @@ class Game:
         self.message = f"Вы нашли в сундуке: {reward.name}!"
     
     def talk_to_elder(self):
-        print("Старейшина: 'Приветствую тебя, герой! Как продвигаются твои задания?'")
+        self.say("Старейшина: 'Приветствую тебя, герой! Как продвигаются твои задания?'")
         self.show_quests()
     
     def show_inventory(self, combat=False):
-        print("\n--- ИНВЕНТАРЬ ---")
+        self.say("\n--- ИНВЕНТАРЬ ---")
         if not self.player.inventory:
-            print("Инвентарь пуст")
+            self.say("Инвентарь пуст")
         else:
-            for i, item in enumerate(self.player.inventory, 1):
-                print(f"{i}. {item.name} ({item.type})")
+            for i, stack in enumerate(self.player.inventory, 1):
+                item = stack.item
+                count = f" x{stack.count}" if stack.count > 1 else ""
+                self.say(f"{i}. {item.name} ({item.type}){count}")
         
         if not combat:
-            input("\nНажмите Enter, чтобы продолжить...")
+            self.ask("\nНажмите Enter, чтобы продолжить...")
     
     def show_quests(self):
-        print("\n--- КВЕСТЫ ---")
+        self.say("\n--- КВЕСТЫ ---")
         for quest in self.quests:
-            print(f"\n{quest.name}: {quest.description}")
-            print("Прогресс:")
+            self.say(f"\n{quest.name}: {quest.description}")
+            self.say("Прогресс:")
             for target, count in quest.target.items():
-                print(f"- {target}: {quest.progress[target]}/{count}")
+                self.say(f"- {target}: {quest.progress[target]}/{count}")
             if quest.completed:
-                print("(Завершено)")
+                self.say("(Завершено)")
         
-        input("\nНажмите Enter, чтобы продолжить...")
+        self.ask("\nНажмите Enter, чтобы продолжить...")
     
-    def update_quest_progress(self, target_type):
-        for quest in self.quests:
-            if not quest.completed and target_type in quest.target:
-                quest.progress[target_type] += 1
-                if quest.progress[target_type] >= quest.target[target_type]:
-                    quest.completed = True
-                    self.message = f"Квест '{quest.name}' завершен! Получена награда."
-                    for reward, count in quest.reward.items():
-                        for _ in range(count):
-                            if reward == "Зелье здоровья":
-                                self.player.add_to_inventory(Item(reward, "heal", 30))
-                            elif reward == "Меч":
-                                self.player.damage += 10
-                                self.message += f"\nВаш урон увеличен на 10!"
-                            elif reward == "Кожаный доспех":
-                                self.player.armor += 5
-                                self.message += f"\nВаша броня увеличена на 5!"
-                            elif reward == "Синее зелье":
-                                self.player.add_to_inventory(Item(reward, "heal", 50))
-    
-    def run(self):
+    def update_quest_progress(self, target_type, amount=1):
+        # Событие получают только квесты, подписанные на эту цель
+        for quest in self.quest_tracker.emit(target_type, amount):
+            self.quests_completed += 1
+            self.message = f"Квест '{quest.name}' завершен! Получена награда."
+            for reward, count in quest.reward.items():
+                for text in REWARDS.grant(reward, self, count):
+                    self.message += "\n" + text
+    
+    def end_turn(self):
+        self.turn += 1
+        self.world_time += 1
+        if self.input_log is not None:
+            self.input_log.end_tick(self.turn, self.state_hash)
+    
+    def run(self, render=True):
+        # render=False - без вывода карты (воспроизведение на полной скорости)
         running = True
-        while running:
-            self.render_map()
-            command = input("Ваше действие: ")
-            running = self.process_input(command)
+        try:
+            while running:
+                if render:
+                    self.render_map()
+                command = self.ask("Ваше действие: ")
+                running = self.process_input(command)
+                self.end_turn()
+                # Сохраняю после хода, чтобы часы мира в файле совпадали с игрой
+                self.save_game()
+        except EOFError:
+            # Ввод закончился (конец файла или сценария)
+            pass
+        if self.input_log is not None:
+            self.input_log.end_tick(self.turn, self.state_hash, final=True)
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Текстовая RPG")
+    parser.add_argument('--record', help="писать ввод в журнал для replay.py")
+    parser.add_argument('--startup', action='store_true',
+                        help="показать, на что уходит время запуска, и выйти")
+    args = parser.parse_args()
+    created = time.perf_counter()
+    # В exe __file__ лежит во временной папке распаковки: сохраняю рядом с exe
+    if getattr(sys, 'frozen', False):
+        game_dir = os.path.dirname(os.path.abspath(sys.executable))
+    else:
+        game_dir = os.path.dirname(os.path.abspath(__file__))
+    game = Game(save_path=os.path.join(game_dir, "game2.sav"))
+    if args.startup:
+        import content
+        
+        ready = time.perf_counter()
+        game.render_map()
+        rendered = time.perf_counter()
+        stats = content.stats
+        data = stats['read'] + stats['decode']
+        source = "кэш" if stats['cache'] else "JSON"
+        print(f"Импорт модулей:  {(IMPORTED - STARTED) * 1000:7.1f} мс")
+        print(f"Разбор команды:  {(created - IMPORTED) * 1000:7.1f} мс")
+        print(f"Данные локаций:  {data * 1000:7.1f} мс ({source}, "
+              f"разобрано локаций: {stats['decoded']})")
+        print(f"Создание игры:   {(ready - created - data) * 1000:7.1f} мс")
+        print(f"Первый кадр:     {(rendered - ready) * 1000:7.1f} мс")
+        print(f"Всего:           {(rendered - STARTED) * 1000:7.1f} мс")
+        raise SystemExit
+    if args.record:
+        game.record_input(args.record)
+    try:
+        game.run()
+    finally:
+        if args.record:
+            game.input_log.close()
\ No newline at end of file
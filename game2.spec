@@ -0,0 +1,33 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Сборка game2 в один exe: pyinstaller game2.spec
+#
+# Кэш локаций locations.bin компилируется здесь, при сборке, тем же Python,
+# что попадет в exe. В exe кладутся и кэш, и locations.json; при запуске
+# кэш только читается (см. content.py), а сохранение game2.sav пишется
+# рядом с exe, а не во временную папку распаковки.
+import os
+import sys
+
+sys.path.insert(0, SPECPATH)
+import content
+
+print(f"{content.CACHE}: {content.build_cache()} байт")
+
+a = Analysis(
+    [os.path.join(SPECPATH, 'game2.py')],
+    pathex=[SPECPATH],
+    datas=[
+        (os.path.join(SPECPATH, content.SOURCE), '.'),
+        (os.path.join(SPECPATH, content.CACHE), '.'),
+    ],
+)
+pyz = PYZ(a.pure)
+exe = EXE(
+    pyz,
+    a.scripts,
+    a.binaries,
+    a.datas,
+    [],
+    name='game2',
+    console=True,
+)
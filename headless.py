@@ -0,0 +1,27 @@
+class ScriptedInput:
+    """Источник ввода из заранее заданной последовательности.
+
+    Вызывается вместо input() или чтения клавиатуры: каждый вызов возвращает
+    следующую клавишу (None - "ничего не нажато"). Когда сценарий
+    закончился, бросает EOFError, как input() в конце файла.
+    """
+    def __init__(self, keys):
+        self.keys = iter(keys)
+        self.consumed = 0  # Сколько клавиш уже отдано
+
+    def __call__(self, prompt=''):
+        try:
+            key = next(self.keys)
+        except StopIteration:
+            raise EOFError("Сценарий ввода закончился") from None
+        self.consumed += 1
+        return key
+
+
+class NullStream:
+    """Поток вывода, который всё выбрасывает"""
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
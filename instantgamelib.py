@@ -1,49 +1,833 @@
+import os
+import sys
+import time
+import zlib
+from array import array
+from itertools import compress
+
+from camera import Camera
+from spatial import SpatialIndex
+from visibility import FieldOfView
+
+
 class GameObject:
     """Базовый класс для игровых объектов"""
+    static = False  # Неподвижный объект без логики: запекается в фон кадра
+
     def __init__(self, x=0, y=0, char='#'):
-        self.x = x          # Позиция по горизонтали
-        self.y = y          # Позиция по вертикали
+        self._index = None  # Индекс позиций движка (ставится в add_object)
+        self._slot = -1     # Место в GameEngine.objects (-1 - не в игре)
+        self._removing = False  # Стоит в очереди на удаление
+        self._pooled = False    # Создан через spawn() и вернется в пул
+        self._x = x         # Позиция по горизонтали
+        self._y = y         # Позиция по вертикали
         self.char = char    # Символ для отображения
         self.active = True # Активен ли объект
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, value):
+        if self._index is not None and value != self._x:
+            self._index.move(self, self._x, self._y, value, self._y)
+        self._x = value
+
+    @property
+    def y(self):
+        return self._y
+
+    @y.setter
+    def y(self, value):
+        if self._index is not None and value != self._y:
+            self._index.move(self, self._x, self._y, self._x, value)
+        self._y = value
     
     def update(self):
         """Логика обновления объекта (переопределите в дочерних классах)"""
         pass
+
+    def reset(self, *args, **kwargs):
+        """Подготовка объекта из пула к повторному использованию.
+
+        По умолчанию - повторный __init__ с аргументами spawn(); классы с
+        тяжелыми полями могут переопределить и переиспользовать их.
+        """
+        self.__init__(*args, **kwargs)
     
     def draw(self, grid):
-        """Отрисовка объекта в игровой сетке"""
-        if self.active and 0 <= self.y < len(grid) and 0 <= self.x < len(grid[0]):
-            grid[self.y][self.x] = self.char
+        """Отрисовка объекта в игровой сетке (FrameBuffer).
+
+        Старый вид draw() тоже работает: len(grid), len(grid[0]) и
+        grid[y][x] = char - строки кадра пишут через put().
+        """
+        if self.active:
+            grid.put(self._x, self._y, self.char)
+
+
+class FrameRow:
+    """Строка кадра для draw() в старом стиле: grid[y][x] = char идет в put()"""
+    __slots__ = ('frame', 'y', 'width')
+
+    def __init__(self, frame, y, width):
+        self.frame = frame
+        self.y = y
+        self.width = width
+
+    def __len__(self):
+        return self.width
+
+    def __getitem__(self, x):
+        if x < 0:
+            x += self.width
+        if not 0 <= x < self.width:
+            raise IndexError(x)
+        return self.frame.get(x, self.y)
+
+    def __setitem__(self, x, char):
+        if x < 0:
+            x += self.width
+        self.frame.put(x, self.y, char)
+
+
+class FrameBuffer:
+    """Кадр игрового поля в одном bytearray.
+
+    На клетку приходится один байт - номер символа в палитре (до 256
+    символов). Фон хранится отдельно и переиспользуется: очистка кадра - это
+    одно копирование среза, без создания новых списков.
+    """
+    def __init__(self, width, height, fill='.'):
+        self.width = width
+        self.height = height
+        self.palette = []  # Номер -> символ
+        self.codes = {}    # Символ -> номер
+        fill_code = self.code(fill)
+        self.cells = bytearray([fill_code]) * (width * height)       # Текущий кадр
+        self.background = bytearray([fill_code]) * (width * height)  # Фоновый слой
+
+    def code(self, char):
+        """Номер символа в палитре (добавляю символ при первом обращении)"""
+        code = self.codes.get(char)
+        if code is None:
+            if len(self.palette) >= 256:
+                raise ValueError("В палитре кадра не больше 256 символов")
+            code = len(self.palette)
+            self.palette.append(char)
+            self.codes[char] = code
+        return code
+
+    def clear(self):
+        """Очищаю кадр до фонового слоя"""
+        self.cells[:] = self.background
+
+    def set_background(self, x, y, char):
+        """Меняю клетку фонового слоя"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.background[y * self.width + x] = self.code(char)
+
+    def put(self, x, y, char):
+        """Рисую символ в клетке, если она внутри поля"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.cells[y * self.width + x] = self.code(char)
+
+    def put_many(self, xs, ys, codes):
+        """Рисую пачку клеток: xs, ys - координаты, codes - номера символов"""
+        width, height, cells = self.width, self.height, self.cells
+        for x, y, code in zip(xs, ys, codes):
+            if 0 <= x < width and 0 <= y < height:
+                cells[y * width + x] = code
+
+    def get(self, x, y):
+        return self.palette[self.cells[y * self.width + x]]
+
+    def row(self, y):
+        """Строка кадра как список символов"""
+        palette = self.palette
+        start = y * self.width
+        return [palette[c] for c in self.cells[start:start + self.width]]
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.height
+        if not 0 <= y < self.height:
+            raise IndexError(y)
+        return FrameRow(self, y, self.width)
+
+
+numpy = None  # Импортируется при первом use_numpy=True: это долго
+
+
+def _load_numpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            return None
+        numpy = module
+    return numpy
+
+
+class NumpyFrameBuffer(FrameBuffer):
+    """Тот же кадр, но в массиве NumPy: пачки рисуются векторно"""
+    def __init__(self, width, height, fill='.'):
+        if _load_numpy() is None:
+            raise RuntimeError("Для NumpyFrameBuffer нужен пакет numpy")
+        super().__init__(width, height, fill)
+        self.cells = numpy.frombuffer(self.cells, dtype=numpy.uint8).copy()
+        self.background = numpy.frombuffer(self.background, dtype=numpy.uint8).copy()
+
+    def clear(self):
+        numpy.copyto(self.cells, self.background)
+
+    def put_many(self, xs, ys, codes):
+        xs = numpy.asarray(xs, dtype=numpy.intp)
+        ys = numpy.asarray(ys, dtype=numpy.intp)
+        codes = numpy.asarray(codes, dtype=numpy.uint8)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        if codes.ndim:
+            codes = codes[inside]
+        self.cells[ys[inside] * self.width + xs[inside]] = codes
+
+
+class Viewport(FrameBuffer):
+    """Кадр окна камеры над кадром мира.
+
+    Палитра общая с кадром мира, а put(), put_many(), get() и grid[y][x]
+    принимают координаты мира и отбрасывают клетки вне окна: объекты рисуют
+    себя в окно так же, как в полный кадр. Рендерер получает кадр размером
+    с окно.
+    """
+    def __init__(self, world, camera):
+        self.world = world
+        self.camera = camera
+        self.width = camera.width
+        self.height = camera.height
+        self.palette = world.palette
+        self.codes = world.codes
+        self.cells = bytearray(self.width * self.height)
+        self.background = self.cells
+
+    def fill(self, source):
+        """Копирую окно из кадра мира source (фон или запомненный кадр)"""
+        camera, world_width, width = self.camera, self.world.width, self.width
+        source, cells = memoryview(source), self.cells
+        left = camera.left
+        for row, y in enumerate(range(camera.top, camera.bottom)):
+            start = y * world_width + left
+            cells[row * width:(row + 1) * width] = source[start:start + width]
+
+    def clear(self):
+        self.fill(self.world.background)
+
+    def set_background(self, x, y, char):
+        self.world.set_background(x, y, char)
+
+    def put(self, x, y, char):
+        super().put(x - self.camera.left, y - self.camera.top, char)
+
+    def get(self, x, y):
+        # Вне окна кадр не рисуется: отдаю фон мира
+        wx, wy = x - self.camera.left, y - self.camera.top
+        if 0 <= wx < self.width and 0 <= wy < self.height:
+            return self.palette[self.cells[wy * self.width + wx]]
+        return self.palette[self.world.background[y * self.world.width + x]]
+
+    def __len__(self):
+        return self.world.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.world.height
+        if not 0 <= y < self.world.height:
+            raise IndexError(y)
+        return FrameRow(self, y, self.world.width)
+
+    def put_many(self, xs, ys, codes):
+        left, top = self.camera.left, self.camera.top
+        width, height, cells = self.width, self.height, self.cells
+        for x, y, code in zip(xs, ys, codes):
+            x -= left
+            y -= top
+            if 0 <= x < width and 0 <= y < height:
+                cells[y * width + x] = code
+
+
+class ComponentStore:
+    """Хранилище простых объектов в параллельных массивах.
+
+    Вместо отдельного GameObject на каждую сущность хранятся только x, y,
+    номер символа и флаг активности - около 10 байт на сущность, плюс место
+    в корзине bucket x bucket клеток (еще около 8 байт). Корзины нужны камере и полю зрения:
+    они рисуют только сущности рядом с окном, не перебирая все хранилище.
+    Сущность задается номером слота; освободившиеся слоты используются
+    повторно, поэтому номера остаются стабильными. Логика пишется системами -
+    функциями, которые обрабатывают весь массив за один вызов; система,
+    которая пишет xs и ys напрямую, а не через move(), вызывает reindex().
+    С use_numpy полный кадр рисуется одним векторным присваиванием NumPy.
+    """
+    def __init__(self, frame, bucket=16, use_numpy=False):
+        self.frame = frame        # Кадр, палитру которого используем
+        self.use_numpy = use_numpy and _load_numpy() is not None
+        self.xs = array('i')      # Позиции по горизонтали
+        self.ys = array('i')      # Позиции по вертикали
+        self.codes = bytearray()  # Номера символов в палитре кадра
+        self.active = bytearray() # 1 - сущность жива, 0 - слот свободен
+        self.free = []            # Свободные слоты
+        self.count = 0            # Живых сущностей
+        self.bucket = bucket      # Размер корзины в клетках
+        self.buckets = {}         # (bx, by) -> array слотов живых сущностей
+        self.places = array('i')  # Слот -> его место в массиве корзины
+
+    def add(self, x, y, char):
+        """Добавляю сущность, возвращаю номер ее слота"""
+        code = self.frame.code(char)
+        self.count += 1
+        if self.free:
+            slot = self.free.pop()
+            self.xs[slot] = x
+            self.ys[slot] = y
+            self.codes[slot] = code
+            self.active[slot] = 1
+        else:
+            slot = len(self.xs)
+            self.xs.append(x)
+            self.ys.append(y)
+            self.codes.append(code)
+            self.active.append(1)
+            self.places.append(0)
+        self._bucket_add(slot, x, y)
+        return slot
+
+    def _bucket_add(self, slot, x, y):
+        b = self.bucket
+        bucket = self.buckets.get((x // b, y // b))
+        if bucket is None:
+            bucket = self.buckets[(x // b, y // b)] = array('i')
+        self.places[slot] = len(bucket)
+        bucket.append(slot)
+
+    def _bucket_remove(self, slot):
+        # Обмен с последним слотом корзины: O(1), порядок не важен
+        b = self.bucket
+        bucket = self.buckets[(self.xs[slot] // b, self.ys[slot] // b)]
+        place = self.places[slot]
+        last = bucket.pop()
+        if last != slot:
+            bucket[place] = last
+            self.places[last] = place
+
+    def remove(self, slot):
+        """Освобождаю слот сущности"""
+        if self.active[slot]:
+            self.active[slot] = 0
+            self.free.append(slot)
+            self.count -= 1
+            self._bucket_remove(slot)
+
+    def move(self, slot, x, y):
+        b = self.bucket
+        if self.active[slot] and (self.xs[slot] // b != x // b or self.ys[slot] // b != y // b):
+            self._bucket_remove(slot)
+            self._bucket_add(slot, x, y)
+        self.xs[slot] = x
+        self.ys[slot] = y
+
+    def reindex(self):
+        """Раскладываю сущности по корзинам заново (после записи в xs, ys)"""
+        self.buckets = {}
+        for slot, (x, y, alive) in enumerate(zip(self.xs, self.ys, self.active)):
+            if alive:
+                self._bucket_add(slot, x, y)
+
+    def draw(self, frame, visible=None, rect=None):
+        """Рисую живые сущности, возвращаю сколько нарисовано.
+
+        rect - (left, top, right, bottom) в клетках мира: рисуются только
+        сущности в нем, и берутся они из корзин, так что цена зависит от
+        размера окна, а не от числа сущностей. visible - маска кадра мира
+        (1 - клетка видна): сущности в невидимых клетках пропускаются.
+        """
+        if not self.count:
+            return 0
+        if rect is not None or visible is not None:
+            if rect is None:
+                rect = (0, 0, self.frame.width, self.frame.height)
+            return self._draw_rect(frame, rect, visible)
+        if self.use_numpy and not isinstance(frame, Viewport):
+            self._draw_numpy(frame)
+        elif self.free:
+            alive = self.active
+            frame.put_many(compress(self.xs, alive), compress(self.ys, alive),
+                           compress(self.codes, alive))
+        else:
+            frame.put_many(self.xs, self.ys, self.codes)
+        return self.count
+
+    def _draw_numpy(self, frame):
+        # Массивы читаются напрямую, без копирования, и пишутся в кадр одним
+        # присваиванием по номерам клеток - и в bytearray, и в массив NumPy
+        width, height = frame.width, frame.height
+        xs = numpy.frombuffer(self.xs, dtype=numpy.int32)
+        ys = numpy.frombuffer(self.ys, dtype=numpy.int32)
+        codes = numpy.frombuffer(self.codes, dtype=numpy.uint8)
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        if self.free:
+            inside &= numpy.frombuffer(self.active, dtype=numpy.bool_)
+        cells = frame.cells
+        if not isinstance(cells, numpy.ndarray):
+            cells = numpy.frombuffer(cells, dtype=numpy.uint8)
+        cells[ys[inside] * width + xs[inside]] = codes[inside]
+
+    def _draw_rect(self, frame, rect, visible):
+        # Координаты и маска - по клеткам мира; рисую в порядке слотов, как
+        # при полной отрисовке, чтобы на одной клетке побеждала та же сущность
+        width, height = self.frame.width, self.frame.height
+        left, top, right, bottom = rect
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, width), min(bottom, height)
+        if right <= left or bottom <= top:
+            return 0
+        b, buckets = self.bucket, self.buckets
+        slots = []
+        for by in range(top // b, (bottom - 1) // b + 1):
+            for bx in range(left // b, (right - 1) // b + 1):
+                bucket = buckets.get((bx, by))
+                if bucket:
+                    slots.extend(bucket)
+        slots.sort()
+        all_xs, all_ys, all_codes = self.xs, self.ys, self.codes
+        xs, ys, codes = [], [], []
+        for slot in slots:
+            x, y = all_xs[slot], all_ys[slot]
+            if (left <= x < right and top <= y < bottom
+                    and (visible is None or visible[y * width + x])):
+                xs.append(x)
+                ys.append(y)
+                codes.append(all_codes[slot])
+        frame.put_many(xs, ys, codes)
+        return len(codes)
+
+    def __len__(self):
+        return self.count
+
+
+class TerminalRenderer:
+    """Вывод кадров в терминал с двойной буферизацией.
+
+    Хранит копию предыдущего кадра и выводит только изменившиеся клетки
+    одной ANSI-последовательностью за кадр. Если изменилось слишком много
+    клеток (или терминал не понимает ANSI), кадр перерисовывается целиком.
+    """
+    HOME_AND_CLEAR = '\x1b[H\x1b[2J'
+
+    def __init__(self, stream=None, ansi=True, full_redraw_ratio=0.5):
+        self.stream = stream or sys.stdout  # Куда пишем кадры
+        self.ansi = ansi                    # Можно ли двигать курсор
+        self.full_redraw_ratio = full_redraw_ratio  # Доля изменений для полной перерисовки
+        self.prev = None                    # Байты предыдущего кадра
+        self.prev_size = None               # Размер предыдущего кадра
+        self.last_frame_bytes = 0           # Байт записано за последний кадр
+        self.total_bytes = 0                # Байт записано всего
+        self.frames = 0                     # Сколько кадров выведено
+        self.full_redraws = 0               # Сколько из них целиком
+        if ansi and os.name == 'nt':
+            os.system('')  # Включаю обработку ANSI в консоли Windows
+
+    def invalidate(self):
+        """Следующий кадр будет нарисован целиком"""
+        self.prev = None
+
+    def _full_frame(self, frame, cells):
+        palette, width = frame.palette, frame.width
+        body = '\n'.join(
+            ' '.join([palette[c] for c in cells[y * width:(y + 1) * width]])
+            for y in range(frame.height))
+        if self.ansi:
+            return self.HOME_AND_CLEAR + body + '\n'
+        return '\n' * 30 + body + '\n'
+
+    def _diff_frame(self, frame, cells):
+        """Собираю перемещения курсора и символы только для изменившихся клеток"""
+        palette, width = frame.palette, frame.width
+        prev = memoryview(self.prev)
+        parts = []
+        changed = 0
+        for y in range(frame.height):
+            row_start = y * width
+            row_end = row_start + width
+            if cells[row_start:row_end] == prev[row_start:row_end]:
+                continue
+            i = row_start
+            while i < row_end:
+                if cells[i] == prev[i]:
+                    i += 1
+                    continue
+                # Подряд идущие изменения выводим одним куском
+                start = i
+                while i < row_end and cells[i] != prev[i]:
+                    i += 1
+                changed += i - start
+                parts.append(f'\x1b[{y + 1};{(start - row_start) * 2 + 1}H')
+                parts.append(' '.join([palette[c] for c in cells[start:i]]))
+        if not parts:
+            return '', 0
+        # Возвращаю курсор под поле, чтобы вывод не налезал на сетку
+        parts.append(f'\x1b[{frame.height + 1};1H')
+        return ''.join(parts), changed
+
+    def present(self, frame):
+        """Вывожу кадр (FrameBuffer) и запоминаю его как предыдущий"""
+        cells = memoryview(frame.cells).cast('B')
+        size = (frame.width, frame.height)
+        full = not self.ansi or self.prev is None or self.prev_size != size
+        if not full:
+            out, changed = self._diff_frame(frame, cells)
+            if changed > len(cells) * self.full_redraw_ratio:
+                full = True
+        if full:
+            out = self._full_frame(frame, cells)
+            self.full_redraws += 1
+
+        if out:
+            self.stream.write(out)
+            self.stream.flush()
+        self.last_frame_bytes = len(out.encode('utf-8'))
+        self.total_bytes += self.last_frame_bytes
+        self.frames += 1
+        if self.prev is None or self.prev_size != size:
+            self.prev = bytearray(cells)
+            self.prev_size = size
+        else:
+            self.prev[:] = cells
+        return self.last_frame_bytes
+
+    def write_overlay(self, lines):
+        """Вывожу строки под игровым полем (например, сводку профилировщика)"""
+        if not self.ansi or self.prev_size is None:
+            out = '\n'.join(lines) + '\n'
+        else:
+            top = self.prev_size[1] + 2
+            out = ''.join(f'\x1b[{top + i};1H{line}\x1b[K'
+                          for i, line in enumerate(lines))
+        self.stream.write(out)
+        self.stream.flush()
+        size = len(out.encode('utf-8'))
+        self.last_frame_bytes += size
+        self.total_bytes += size
+
+
+class NullRenderer:
+    """Рендерер для запуска без терминала: кадры только считаются"""
+    def __init__(self):
+        self.frames = 0
+        self.last_frame_bytes = 0
+        self.total_bytes = 0
+
+    def invalidate(self):
+        pass
+
+    def present(self, frame):
+        self.frames += 1
+        return 0
+
+    def write_overlay(self, lines):
+        pass
+
+
+class LoopStats:
+    """Статистика игрового цикла: целевое и фактическое время тика"""
+    def __init__(self, tick_rate, render_rate):
+        self.target_tick = 1.0 / tick_rate      # Целевой интервал тика, с
+        self.target_frame = 1.0 / render_rate   # Целевой интервал кадра, с
+        self.ticks = 0             # Выполнено тиков
+        self.frames = 0            # Выведено кадров
+        self.dropped_ticks = 0     # Тиков пропущено из-за отставания
+        self.update_time = 0.0     # Суммарное время в update()
+        self.render_time = 0.0     # Суммарное время в render()
+        self.sleep_time = 0.0      # Суммарное время сна
+        self.started = None        # Время запуска цикла
+        self.last_tick_start = None
+        self.tick_interval = 0.0   # Сумма интервалов между тиками
+        self.max_tick_interval = 0.0
+
+    def record_tick(self, start, duration):
+        if self.last_tick_start is not None:
+            interval = start - self.last_tick_start
+            self.tick_interval += interval
+            if interval > self.max_tick_interval:
+                self.max_tick_interval = interval
+        self.last_tick_start = start
+        self.update_time += duration
+        self.ticks += 1
+
+    def record_frame(self, duration):
+        self.render_time += duration
+        self.frames += 1
+
+    def report(self):
+        """Сводка: фактические значения против целевых"""
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        intervals = self.ticks - 1
+        return {
+            'elapsed': elapsed,
+            'ticks': self.ticks,
+            'frames': self.frames,
+            'dropped_ticks': self.dropped_ticks,
+            'target_tick': self.target_tick,
+            'actual_tick': self.tick_interval / intervals if intervals > 0 else 0.0,
+            'max_tick': self.max_tick_interval,
+            'avg_update': self.update_time / self.ticks if self.ticks else 0.0,
+            'avg_render': self.render_time / self.frames if self.frames else 0.0,
+            'target_frame': self.target_frame,
+            'actual_fps': self.frames / elapsed if elapsed else 0.0,
+            'busy': (self.update_time + self.render_time) / elapsed if elapsed else 0.0,
+        }
 
 
 class GameEngine:
     """Основной игровой движок"""
-    def __init__(self, width=20, height=10):
+    def __init__(self, width=20, height=10, renderer=None,
+                 tick_rate=20, render_rate=30, max_catchup=5, use_numpy=False,
+                 input_source=None, pool_limit=0):
         self.width = width    # Ширина игрового поля
         self.height = height  # Высота игрового поля
-        self.grid = []        # Игровая сетка
+        self.grid = None      # Игровая сетка (FrameBuffer)
+        self.use_numpy = use_numpy  # Хранить кадр в массиве NumPy
         self.objects = []     # Список игровых объектов
         self.running = False  # Флаг работы игры
         self.last_key = None  # Последняя нажатая клавиша
+        self.input_source = input_source  # Свой источник клавиш вместо клавиатуры
+        self.profiler = None  # profiling.Profiler для замеров по фазам
+        self.renderer = renderer or TerminalRenderer()  # Вывод кадров
+        self.index = SpatialIndex()  # Поиск объектов по позиции
+        self.tick_rate = tick_rate      # Тиков симуляции в секунду
+        self.render_rate = render_rate  # Кадров в секунду
+        self.max_catchup = max_catchup  # Максимум тиков подряд при отставании
+        self.stats = None               # LoopStats последнего запуска
+        self.systems = []     # Функции пакетного обновления, system(engine)
+        self.static_count = 0 # Сколько объектов запечено в фон
+        self.tick = 0         # Номер текущего тика
+        self.input_log = None # replay.InputRecorder или replay.Replay
+        self.pools = {}       # Класс -> удаленные объекты для spawn()
+        self.pool_limit = pool_limit  # Сколько объектов класса держать в пуле (0 - без пула)
+        self._removed = []    # Объекты, удаленные за текущий тик
+        self.fov = None       # FieldOfView, если включен обзор (set_view)
+        self.viewer = None    # Чьими глазами рисуется поле
+        self.view_radius = None
+        self.camera = None    # Camera, если выводится только окно (set_camera)
+        self.camera_target = None  # За кем следует камера
+        self.view = None      # Viewport - кадр окна камеры
         self._init_grid()     # Инициализация сетки
     
     def _init_grid(self):
         """Создаю пустую игровую сетку"""
-        self.grid = [['.' for _ in range(self.width)] for _ in range(self.height)]
+        buffer_class = NumpyFrameBuffer if self.use_numpy else FrameBuffer
+        self.grid = buffer_class(self.width, self.height)
+        # Простые сущности в массивах
+        self.store = ComponentStore(self.grid, use_numpy=self.use_numpy)
+        # Переиспользуемые списки для пакетной отрисовки
+        self._batch_x, self._batch_y, self._batch_codes = [], [], []
     
     def add_object(self, obj):
         """Добавляет объект в игру"""
+        if obj.static:
+            # Статичный объект не обновляется и не хранится: он сразу
+            # становится частью фона и рисуется вместе с очисткой кадра
+            self.add_static(obj.x, obj.y, obj.char)
+            return
         obj.game = self  # Даем объекту ссылку на игру
-        self.objects.append(obj)
-        return 
-        if obj in self.objects:
-            self.objects.remove(obj)
+        if obj._removing:
+            # Удален в этом же тике и еще стоит в списке: просто возвращаю
+            obj._removing = False
+            obj.active = True
+        else:
+            obj._slot = len(self.objects)
+            self.objects.append(obj)
+        self.index.add(obj)
+        obj._index = self.index
+
+    def remove_object(self, obj):
+        """Убираю объект из игры.
+
+        Объект сразу становится неактивным и пропадает из индекса позиций, а
+        из списка objects уходит в конце тика: список не меняется, пока его
+        обходит update(). Удаление из списка - обмен с последним элементом,
+        O(1), поэтому порядок объектов после удаления не сохраняется.
+        """
+        if obj._removing or obj._slot < 0:
+            return
+        obj._removing = True
+        obj.active = False
+        if obj._index is not None:
+            obj._index.remove(obj)
+            obj._index = None
+        self._removed.append(obj)
+
+    def _apply_removals(self):
+        """Удаляю из objects всё, что убрано за тик"""
+        objects, pools = self.objects, self.pools
+        for obj in self._removed:
+            if not obj._removing:
+                continue  # Добавлен обратно до конца тика
+            obj._removing = False
+            slot = obj._slot
+            last = objects.pop()
+            if last is not obj:
+                objects[slot] = last
+                last._slot = slot
+            obj._slot = -1
+            if obj._pooled:
+                pool = pools.setdefault(type(obj), [])
+                if len(pool) < self.pool_limit:
+                    pool.append(obj)
+        self._removed.clear()
+
+    def spawn(self, cls, *args, **kwargs):
+        """Создаю объект cls(*args, **kwargs) и добавляю в игру.
+
+        С pool_limit > 0 удаленные объекты, созданные через spawn(),
+        копятся в пуле класса и переиспользуются через reset(*args, **kwargs)
+        вместо создания новых. По умолчанию пул выключен: в CPython новый
+        объект обычно не дороже подготовки старого (см. bench_churn).
+        """
+        pool = self.pools.get(cls)
+        if pool:
+            obj = pool.pop()
+            obj.reset(*args, **kwargs)
+        else:
+            obj = cls(*args, **kwargs)
+        obj._pooled = self.pool_limit > 0
+        self.add_object(obj)
+        return obj
     
+    def add_static(self, x, y, char):
+        """Запекаю неподвижный символ в фон кадра"""
+        self.grid.set_background(x, y, char)
+        self.static_count += 1
+        if self.fov is not None and 0 <= x < self.width and 0 <= y < self.height:
+            # Фон - это местность: посчитанные поля зрения устарели
+            self.fov.invalidate()
+            i = y * self.width + x
+            if self._seen[i]:
+                self._remembered[i] = self.grid.background[i]
+
+    def set_view(self, viewer, radius, opaque='█#T', unseen=' '):
+        """Рисую поле глазами viewer: обзор radius, символы фона opaque его закрывают.
+
+        Видимые клетки показываются как обычно, уже виденные - только фоном,
+        без объектов, невиданные - символом unseen. Объекты для кадра берутся
+        из индекса позиций в радиусе обзора, а не перебором всех.
+        viewer=None выключает обзор.
+        """
+        self.viewer = viewer
+        self.view_radius = radius
+        if viewer is None:
+            self.fov = None
+            return
+        grid = self.grid
+        size = self.width * self.height
+        self.fov = FieldOfView(self, opaque, get=self.static_at)
+        self._seen = bytearray(size)             # 1 - клетку уже видели
+        self._visible_mask = bytearray(size)     # 1 - клетка видна сейчас
+        self._visible = frozenset()
+        self._remembered = grid.background.copy()  # Кадр без объектов для clear()
+        self._remembered[:] = bytearray([grid.code(unseen)]) * size
+
+    def set_camera(self, target, width, height, margin=None):
+        """Вывожу только окно width x height, которое следует за target.
+
+        Кадр для рендерера - размером с окно, фон копируется только в
+        пределах окна, а объекты для отрисовки берутся из индекса позиций
+        по прямоугольнику окна, так что цена кадра не зависит от размера
+        мира. target=None выключает камеру.
+        """
+        self.camera_target = target
+        if target is None:
+            self.camera = self.view = None
+        else:
+            self.camera = Camera(min(width, self.width), min(height, self.height),
+                                 self.width, self.height, margin)
+            self.camera.center(target._x, target._y)
+            self.view = Viewport(self.grid, self.camera)
+        self.renderer.invalidate()
+
+    def _update_view(self):
+        """Пересчитываю видимые клетки; работа - только по изменившимся"""
+        viewer = self.viewer
+        visible = self.fov.visible(viewer._x, viewer._y, self.view_radius)
+        if visible is self._visible:
+            return
+        mask, seen = self._visible_mask, self._seen
+        remembered, background = self._remembered, self.grid.background
+        for i in self._visible - visible:
+            mask[i] = 0
+        for i in visible - self._visible:
+            mask[i] = 1
+            if not seen[i]:
+                seen[i] = 1
+                remembered[i] = background[i]
+        self._visible = visible
+
+    def static_at(self, x, y):
+        """Символ фона в клетке (x, y)"""
+        grid = self.grid
+        return grid.palette[grid.background[y * grid.width + x]]
+
+    def add_system(self, system):
+        """Добавляю функцию system(engine), которая вызывается каждый тик"""
+        self.systems.append(system)
+
+    def objects_at(self, x, y):
+        """Объекты в клетке (x, y)"""
+        return self.index.at(x, y)
+
+    def objects_within(self, x, y, radius):
+        """Объекты на расстоянии не больше radius от (x, y)"""
+        return self.index.within(x, y, radius)
+
     def clear(self):
         """Очищаю игровую сетку"""
-        self._init_grid()
+        if self.fov is None:
+            source = self.grid.background
+        else:
+            self._update_view()
+            source = self._remembered
+        if self.camera is None:
+            self.grid.cells[:] = source
+            return
+        target = self.camera_target
+        self.camera.follow(target._x, target._y)
+        self.view.fill(source)
+
+    @property
+    def frame(self):
+        """Кадр, который уходит рендереру: окно камеры или всё поле"""
+        return self.grid if self.view is None else self.view
+
+    def _flush_batch(self):
+        if self._batch_codes:
+            self.grid.put_many(self._batch_x, self._batch_y, self._batch_codes)
+            self._batch_x.clear()
+            self._batch_y.clear()
+            self._batch_codes.clear()
     
     def _get_input(self):
+        """Получаю клавишу из input_source или клавиатуры и пишу ее в журнал"""
+        if self.input_source is not None:
+            key = self.input_source()
+        else:
+            key = self._read_keyboard()
+        if key and self.input_log is not None:
+            self.input_log.key(self.tick, key)
+        return key
+
+    def _read_keyboard(self):
         """Получаю ввод с клавиатуры (только для Windows)"""
         import msvcrt
         if msvcrt.kbhit():
@@ -52,43 +836,273 @@ class GameEngine:
             except:
                 return None
         return None
+
+    def _end_tick(self):
+        self.tick += 1
+        if self.input_log is not None:
+            self.input_log.end_tick(self.tick, self.state_hash)
+
+    def state_hash(self):
+        """crc32 состояния мира (для сверки при воспроизведении ввода)"""
+        store = self.store
+        crc = zlib.crc32(self.grid.background)
+        for part in (store.xs, store.ys, store.codes, store.active):
+            crc = zlib.crc32(part, crc)
+        objects = ';'.join(f'{type(obj).__name__},{obj._x},{obj._y},{obj.char},{obj.active:d}'
+                           for obj in self.objects)
+        return zlib.crc32(objects.encode('utf-8'), crc)
     
     def update(self):
         """Обновляю состояние игры"""
+        profiler = self.profiler
+        if profiler is not None:
+            self._update_profiled(profiler)
+            self._end_tick()
+            return
+
         key = self._get_input()
         if key:
-            self.last_key = key
-            if key == 'q':
-                self.running = False
+            self._handle_key(key)
         
         # Обновляем все активные объекты
-        for obj in self.objects[:]:
+        # Удаления откладываются до конца тика, поэтому список можно обходить
+        # без копии; объекты, добавленные за тик, начнут обновляться со следующего
+        objects = self.objects
+        for i in range(len(objects)):
+            obj = objects[i]
             if obj.active:
                 obj.update()
-            else:
+            elif not obj._removing:
                 self.remove_object(obj)
+
+        # Системы обрабатывают сущности хранилища пачками
+        for system in self.systems:
+            system(self)
+        if self._removed:
+            self._apply_removals()
+        self._end_tick()
+
+    def _handle_key(self, key):
+        self.last_key = key
+        if key == 'q':
+            self.running = False
+        elif key == 'p' and self.profiler is not None:
+            self.profiler.overlay = not self.profiler.overlay
+
+    def _update_profiled(self, profiler):
+        """То же, что update(), но с замером времени каждой фазы"""
+        clock = time.perf_counter
+        start = clock()
+        key = self._get_input()
+        if key:
+            self._handle_key(key)
+        after_input = clock()
+        profiler.record('update.input', after_input - start)
+
+        # Время update() копится по классам и пишется один раз за тик
+        per_class = {}
+        objects = self.objects
+        for i in range(len(objects)):
+            obj = objects[i]
+            if obj.active:
+                obj_start = clock()
+                obj.update()
+                name = type(obj).__name__
+                per_class[name] = per_class.get(name, 0.0) + clock() - obj_start
+            elif not obj._removing:
+                self.remove_object(obj)
+        after_objects = clock()
+        for name, seconds in per_class.items():
+            profiler.record(f'update.{name}', seconds)
+        profiler.record('update.objects', after_objects - after_input)
+
+        for system in self.systems:
+            system_start = clock()
+            system(self)
+            profiler.record(f'system.{getattr(system, "__name__", "system")}',
+                            clock() - system_start)
+        after_systems = clock()
+        profiler.record('update.systems', after_systems - after_objects)
+        if self._removed:
+            profiler.count('objects_removed', len(self._removed))
+            self._apply_removals()
+        end = clock()
+        profiler.record('update.removals', end - after_systems)
+        profiler.record('update', end - start)
     
     def render(self):
         """Отрисовываю игровое поле"""
+        profiler = self.profiler
+        if profiler is not None:
+            self._render_profiled(profiler)
+            return
+
         self.clear()
+        self._draw_objects()
         
-        # Рисуем все объекты
+        # Выводим только изменения относительно прошлого кадра
+        self.renderer.present(self.frame)
+
+    def _render_profiled(self, profiler):
+        """То же, что render(), но с замером времени каждой фазы"""
+        clock = time.perf_counter
+        start = clock()
+        self.clear()
+        after_clear = clock()
+        drawn = self._draw_objects()
+        after_draw = clock()
+        self.renderer.present(self.frame)
+        end = clock()
+        if profiler.overlay:
+            self.renderer.write_overlay(profiler.overlay_lines())
+        profiler.record('render.clear', after_clear - start)
+        profiler.record('render.draw', after_draw - after_clear)
+        profiler.record('render.present', end - after_draw)
+        profiler.record('render', end - start)
+        profiler.count('objects_drawn', drawn)
+        profiler.count('bytes_written', self.renderer.last_frame_bytes)
+
+    def _draw_objects(self):
+        """Рисую сущности и объекты в кадр, возвращаю число нарисованных"""
+        # Сначала сущности хранилища одной пачкой (статичные уже в фоне)
+        grid = self.grid
+        if self.fov is not None or self.camera is not None:
+            return self._draw_culled()
+        self.store.draw(grid)
+        drawn = len(self.store)
+
+        # Затем объекты. Объекты со стандартным draw() собираются в пачку,
+        # перед объектом со своим draw() пачка сбрасывается, чтобы не менять
+        # порядок отрисовки
+        code = grid.code
+        default_draw = GameObject.draw
+        xs, ys, codes = self._batch_x, self._batch_y, self._batch_codes
         for obj in self.objects:
-            obj.draw(self.grid)
-        
-        # Очищаем консоль (имитация)
-        print("\n" * 30)
-        
-        # Рисую сетку
-        for row in self.grid:
-            print(' '.join(row))
+            if type(obj).draw is default_draw:
+                if obj.active:
+                    xs.append(obj._x)
+                    ys.append(obj._y)
+                    codes.append(code(obj.char))
+                    drawn += 1
+            else:
+                self._flush_batch()
+                obj.draw(grid)
+                drawn += obj.active
+        self._flush_batch()
+        return drawn
+
+    def _draw_culled(self):
+        """Рисую только объекты в окне камеры и в видимых клетках.
+
+        Сущности хранилища берутся из его корзин, объекты - из индекса
+        позиций по прямоугольнику окна (или перебором, если объектов меньше,
+        чем клеток в нем) и рисуются в порядке списка objects.
+        """
+        frame = self.frame
+        left, top, right, bottom = 0, 0, self.width, self.height
+        camera = self.camera
+        if camera is not None:
+            left, top, right, bottom = camera.left, camera.top, camera.right, camera.bottom
+        mask = None
+        if self.fov is not None:
+            mask = self._visible_mask
+            viewer, radius = self.viewer, self.view_radius
+            left = max(left, viewer._x - radius)
+            top = max(top, viewer._y - radius)
+            right = min(right, viewer._x + radius + 1)
+            bottom = min(bottom, viewer._y + radius + 1)
+        drawn = self.store.draw(frame, mask, (left, top, right, bottom))
+        if right <= left or bottom <= top:
+            return drawn
+        if len(self.objects) < (right - left) * (bottom - top):
+            candidates = [obj for obj in self.objects
+                          if left <= obj._x < right and top <= obj._y < bottom]
+        else:
+            candidates = sorted(self.index.in_rect(left, top, right, bottom),
+                                key=lambda obj: obj._slot)
+        width = self.width
+        drawn_objects = 0
+        for obj in candidates:
+            if obj.active and (mask is None or mask[obj._y * width + obj._x]):
+                obj.draw(frame)
+                drawn_objects += 1
+        return drawn + drawn_objects
     
     def run(self):
-        """Запускает игровой цикл"""
+        """Запускает игровой цикл с фиксированным шагом симуляции.
+
+        update() вызывается tick_rate раз в секунду независимо от скорости
+        машины, render() - не чаще render_rate раз в секунду. Между ними цикл
+        спит, а не крутится вхолостую. Если симуляция отстала, пропущенные
+        тики догоняются, но не больше max_catchup за раз.
+        """
+        clock = time.perf_counter
+        tick_dt = 1.0 / self.tick_rate
+        frame_dt = 1.0 / self.render_rate
+        stats = self.stats = LoopStats(self.tick_rate, self.render_rate)
+
         self.running = True
+        stats.started = next_tick = next_frame = clock()
         while self.running:
-            self.update()
-            self.render()
+            now = clock()
+            steps = 0
+            while self.running and now >= next_tick and steps < self.max_catchup:
+                start = clock()
+                self.update()
+                stats.record_tick(start, clock() - start)
+                next_tick += tick_dt
+                steps += 1
+                now = clock()
+            if now >= next_tick:
+                # Слишком сильно отстали: пропускаю тики, а не копим долг
+                behind = int((now - next_tick) / tick_dt) + 1
+                stats.dropped_ticks += behind
+                next_tick += behind * tick_dt
+
+            if self.running and now >= next_frame:
+                start = clock()
+                self.render()
+                stats.record_frame(clock() - start)
+                next_frame += frame_dt
+                if next_frame < start:
+                    next_frame = start + frame_dt
+
+            delay = min(next_tick, next_frame) - clock()
+            if delay > 0:
+                time.sleep(delay)
+                stats.sleep_time += delay
+        if self.input_log is not None:
+            self.input_log.end_tick(self.tick, self.state_hash, final=True)
+        return stats.report()
+
+    def run_headless(self, max_ticks=None, render=True):
+        """Гоняю симуляцию без пауз и без клавиатуры.
+
+        Клавиши берутся из input_source, запуск заканчивается по 'q', после
+        max_ticks тиков или когда источник ввода бросит EOFError.
+        Возвращает число тиков и скорость в тиках в секунду.
+        """
+        clock = time.perf_counter
+        ticks = 0
+        self.running = True
+        start = clock()
+        while self.running and (max_ticks is None or ticks < max_ticks):
+            try:
+                self.update()
+            except EOFError:
+                break
+            if render:
+                self.render()
+            ticks += 1
+        self.running = False
+        if self.input_log is not None:
+            self.input_log.end_tick(self.tick, self.state_hash, final=True)
+        elapsed = clock() - start
+        return {
+            'ticks': ticks,
+            'elapsed': elapsed,
+            'ticks_per_sec': ticks / elapsed if elapsed else 0.0,
+        }
 
 
 # Пример использования библиотеки
@@ -100,20 +1114,24 @@ class Player(GameObject):
     
     def update(self):
         if hasattr(self, 'game') and self.game.last_key:
-            key = self.game.last_key
-            if key == 'w': self.y -= self.speed
-            elif key == 's': self.y += self.speed
-            elif key == 'a': self.x -= self.speed
-            elif key == 'd': self.x += self.speed
-            # Границы
-            if self.x < 0: self.x = 0
-            elif self.x >= self.game.width: self.x = self.game.width - 1
-            if self.y < 0: self.y = 0
-            elif self.y >= self.game.height: self.y = self.game.height - 1
+            self.step(self.game.last_key)
+
+    def step(self, key):
+        """Шаг по клавише WASD в пределах поля"""
+        if key == 'w': self.y -= self.speed
+        elif key == 's': self.y += self.speed
+        elif key == 'a': self.x -= self.speed
+        elif key == 'd': self.x += self.speed
+        # Границы
+        if self.x < 0: self.x = 0
+        elif self.x >= self.game.width: self.x = self.game.width - 1
+        if self.y < 0: self.y = 0
+        elif self.y >= self.game.height: self.y = self.game.height - 1
 
 
 class Wall(GameObject):
     "Стена"
+    static = True
     def __init__(self, x, y):
         super().__init__(x, y, '█')
 
@@ -142,4 +1160,7 @@ if __name__ == "__main__":
     print("Нажмите Q для выхода")
     
     # Запускаем игру
-    game.run()
+    stats = game.run()
+    print(f"Тик: {stats['actual_tick'] * 1000:.1f} мс "
+          f"(цель {stats['target_tick'] * 1000:.1f} мс), "
+          f"пропущено тиков: {stats['dropped_ticks']}")
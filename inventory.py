@@ -0,0 +1,119 @@
+import bisect
+import struct
+
+STACK_RECORD = struct.Struct('<HHiI')  # имя, тип, значение, количество
+HEADER = struct.Struct('<HII')         # строк, размер таблицы строк, стопок
+
+
+class Stack:
+    """Стопка одинаковых предметов: один объект предмета и их число"""
+    __slots__ = ('item', 'count')
+
+    def __init__(self, item, count):
+        self.item = item
+        self.count = count
+
+
+def stack_key(item):
+    return (item.name, item.type, item.value)
+
+
+class Inventory:
+    """Инвентарь из стопок одинаковых предметов.
+
+    Одинаковые предметы (имя, тип и значение совпадают) лежат в одной
+    стопке-слоте, поэтому тысяча зелий занимает один слот. Слоты идут в
+    порядке первого подбора, номер слота - номер в меню. Для каждого типа
+    стопки хранятся по возрастанию значения: лучший предмет типа - последний
+    в списке, его поиск не зависит от размера инвентаря. capacity -
+    ограничение числа слотов (None - без ограничения).
+    """
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.slots = []     # Стопки в порядке первого подбора
+        self.stacks = {}    # (имя, тип, значение) -> стопка
+        self.by_type = {}   # Тип -> стопки по возрастанию значения
+        self.counts = {}    # Тип -> сколько предметов этого типа
+        self.total = 0      # Всего предметов
+
+    def add(self, item, count=1):
+        """Кладу count предметов; False, если для новой стопки нет слота"""
+        key = stack_key(item)
+        stack = self.stacks.get(key)
+        if stack is None:
+            if self.capacity is not None and len(self.slots) >= self.capacity:
+                return False
+            stack = self.stacks[key] = Stack(item, 0)
+            self.slots.append(stack)
+            stacks = self.by_type.setdefault(item.type, [])
+            values = [s.item.value for s in stacks]
+            stacks.insert(bisect.bisect_right(values, item.value), stack)
+        stack.count += count
+        self.counts[item.type] = self.counts.get(item.type, 0) + count
+        self.total += count
+        return True
+
+    def take(self, stack, count=1):
+        """Забираю count предметов из стопки, возвращаю предмет"""
+        item = stack.item
+        count = min(count, stack.count)
+        stack.count -= count
+        self.counts[item.type] -= count
+        self.total -= count
+        if not stack.count:
+            del self.stacks[stack_key(item)]
+            self.slots.remove(stack)
+            self.by_type[item.type].remove(stack)
+            if not self.by_type[item.type]:
+                del self.by_type[item.type]
+                del self.counts[item.type]
+        return item
+
+    def slot(self, index):
+        """Стопка в слоте index (с нуля) или None"""
+        if 0 <= index < len(self.slots):
+            return self.slots[index]
+        return None
+
+    def best(self, item_type):
+        """Стопка предметов типа item_type с наибольшим значением или None"""
+        stacks = self.by_type.get(item_type)
+        return stacks[-1] if stacks else None
+
+    def count(self, item_type):
+        return self.counts.get(item_type, 0)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def pack(self):
+        """Инвентарь в байтах: таблица строк и запись на каждую стопку"""
+        strings = {}
+
+        def string_id(text):
+            index = strings.get(text)
+            if index is None:
+                index = strings[text] = len(strings)
+            return index
+
+        body = [STACK_RECORD.pack(string_id(stack.item.name), string_id(stack.item.type),
+                                  stack.item.value, stack.count)
+                for stack in self.slots]
+        table = '\0'.join(strings).encode('utf-8')
+        return HEADER.pack(len(strings), len(table), len(body)) + table + b''.join(body)
+
+    @classmethod
+    def unpack(cls, data, item_class, capacity=None):
+        string_count, table_size, stack_count = HEADER.unpack_from(data, 0)
+        offset = HEADER.size
+        strings = data[offset:offset + table_size].decode('utf-8').split('\0')
+        offset += table_size
+        inventory = cls()
+        for name, item_type, value, count in STACK_RECORD.iter_unpack(
+                data[offset:offset + stack_count * STACK_RECORD.size]):
+            inventory.add(item_class(strings[name], strings[item_type], value), count)
+        inventory.capacity = capacity  # Сохраненное не отбрасываю
+        return inventory
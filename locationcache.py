@@ -0,0 +1,134 @@
+import struct
+from collections import OrderedDict
+
+ITEM_RECORD = struct.Struct('<HHiii')          # имя, тип, значение, x, y
+ENEMY_RECORD = struct.Struct('<Hiiiiiiiif')    # имя, hp, max_hp, mp, max_mp,
+                                                # броня, урон, x, y, flee_ratio
+COUNTS = struct.Struct('<HII')                  # строк, предметов, врагов
+NO_POS = -0x80000000                            # Координата предмета не на карте
+
+
+def pack_entities(items, enemies):
+    """Упаковываю предметы и врагов локации в компактные байты.
+
+    Строки (имена, типы) хранятся один раз в таблице, записи ссылаются на
+    них номерами, числа лежат в struct-записях фиксированного размера.
+    """
+    strings = {}
+
+    def string_id(text):
+        index = strings.get(text)
+        if index is None:
+            index = strings[text] = len(strings)
+        return index
+
+    body = []
+    for item in items:
+        body.append(ITEM_RECORD.pack(string_id(item.name), string_id(item.type),
+                                     item.value,
+                                     NO_POS if item.x is None else item.x,
+                                     NO_POS if item.y is None else item.y))
+    for enemy in enemies:
+        body.append(ENEMY_RECORD.pack(string_id(enemy.name), enemy.hp, enemy.max_hp,
+                                      enemy.mp, enemy.max_mp, enemy.armor,
+                                      enemy.damage, enemy.x, enemy.y,
+                                      enemy.flee_ratio))
+    table = '\0'.join(strings).encode('utf-8')
+    header = COUNTS.pack(len(strings), len(items), len(enemies))
+    return header + struct.pack('<I', len(table)) + table + b''.join(body)
+
+
+def unpack_entities(data, item_class, entity_class):
+    """Обратно из байтов pack_entities: (предметы, враги)"""
+    string_count, item_count, enemy_count = COUNTS.unpack_from(data, 0)
+    offset = COUNTS.size
+    (table_size,) = struct.unpack_from('<I', data, offset)
+    offset += 4
+    strings = data[offset:offset + table_size].decode('utf-8').split('\0')
+    offset += table_size
+    if not string_count:
+        strings = []
+
+    items = []
+    for name, item_type, value, x, y in ITEM_RECORD.iter_unpack(
+            data[offset:offset + item_count * ITEM_RECORD.size]):
+        if x == NO_POS:
+            x = y = None
+        items.append(item_class(strings[name], strings[item_type], value, x, y))
+    offset += item_count * ITEM_RECORD.size
+
+    enemies = []
+    for (name, hp, max_hp, mp, max_mp, armor, damage, x, y,
+         flee_ratio) in ENEMY_RECORD.iter_unpack(
+            data[offset:offset + enemy_count * ENEMY_RECORD.size]):
+        enemy = entity_class(strings[name], max_hp, max_mp, armor, damage, x, y)
+        enemy.hp = hp
+        enemy.mp = mp
+        enemy.flee_ratio = flee_ratio
+        enemies.append(enemy)
+    return items, enemies
+
+
+class LocationCache:
+    """Состояние посещенных локаций: предметы и враги между визитами.
+
+    Последние capacity локаций хранятся живыми объектами, более старые
+    вытесняются (LRU) в компактные байты и распаковываются при возвращении.
+    В left запоминается, когда игрок ушел из локации.
+    """
+    def __init__(self, item_class, entity_class, capacity=2):
+        self.item_class = item_class
+        self.entity_class = entity_class
+        self.capacity = capacity   # Сколько локаций держать живыми
+        self.live = OrderedDict()  # Локация -> (предметы, враги)
+        self.packed = {}           # Локация -> байты
+        self.left = {}             # Локация -> время ухода из нее
+        self.hits = 0              # Нашли живое состояние
+        self.restores = 0          # Распаковали вытесненное
+        self.misses = 0            # Состояния не было
+        self.evictions = 0         # Сколько раз вытесняли
+
+    def store(self, location, items, enemies, time=None):
+        """Запоминаю состояние локации при уходе из нее (в момент time)"""
+        self.packed.pop(location, None)
+        if time is not None:
+            self.left[location] = time
+        self.live[location] = (items, enemies)
+        self.live.move_to_end(location)
+        while len(self.live) > self.capacity:
+            old, (old_items, old_enemies) = self.live.popitem(last=False)
+            self.packed[old] = pack_entities(old_items, old_enemies)
+            self.evictions += 1
+
+    def load(self, location):
+        """Состояние локации (предметы, враги) или None, если ее еще не было.
+
+        Состояние забирается из кэша: при уходе его нужно снова сохранить
+        через store().
+        """
+        state = self.live.pop(location, None)
+        if state is not None:
+            self.hits += 1
+            return state
+        data = self.packed.pop(location, None)
+        if data is not None:
+            self.restores += 1
+            return unpack_entities(data, self.item_class, self.entity_class)
+        self.misses += 1
+        return None
+
+    def clear(self):
+        self.live.clear()
+        self.packed.clear()
+        self.left.clear()
+
+    def stats(self):
+        return {
+            'live': len(self.live),
+            'packed': len(self.packed),
+            'packed_bytes': sum(len(data) for data in self.packed.values()),
+            'hits': self.hits,
+            'restores': self.restores,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
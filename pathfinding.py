@@ -0,0 +1,129 @@
+from array import array
+from collections import deque
+
+UNREACHED = 0x7fffffff  # Расстояние до недостижимых клеток
+
+# Соседи клетки: как у движения игрока, без диагоналей
+DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+class DistanceField:
+    """Карта расстояний до цели ("Dijkstra map").
+
+    Одна карта считается обходом в ширину от цели (обычно от игрока) и
+    используется всеми врагами локации: чтобы догнать цель, врагу достаточно
+    шагнуть в соседнюю клетку с меньшим расстоянием, чтобы убежать - с
+    большим. Пересчет нужен только когда цель сдвинулась или поменялась
+    местность, а не для каждого врага. Изменения Tilemap замечаются по ее
+    version, для других карт вызовите invalidate().
+    """
+    def __init__(self, game_map, blocking='#', max_distance=None):
+        # game_map - Tilemap или любой объект с width, height и get(x, y)
+        self.blocking = set(blocking)     # Непроходимые символы
+        self.max_distance = max_distance  # Дальше не считаем (None - вся карта)
+        self.goal = None                  # Откуда посчитана карта
+        self.recomputes = 0               # Сколько раз карта пересчитывалась
+        self.set_map(game_map)
+
+    def set_map(self, game_map):
+        """Меняю карту (например, при смене локации)"""
+        self.game_map = game_map
+        self.width = game_map.width
+        self.height = game_map.height
+        self.dist = array('i', [UNREACHED]) * (self.width * self.height)
+        self._unreached = array('i', self.dist)  # Шаблон для быстрого сброса
+        self._touched = []  # Клетки, посчитанные ограниченным обходом
+        self.version = getattr(game_map, 'version', None)
+        self.invalidate()
+
+    def invalidate(self):
+        """Местность поменялась: следующий update() пересчитает карту"""
+        self.goal = None
+
+    def passable(self, x, y):
+        return (0 <= x < self.width and 0 <= y < self.height
+                and self.game_map.get(x, y) not in self.blocking)
+
+    def update(self, goal):
+        """Пересчитываю карту от goal, если цель сдвинулась. True - был пересчет"""
+        version = getattr(self.game_map, 'version', None)
+        if version != self.version:
+            self.version = version
+            self.goal = None  # Карту правили: старые расстояния неверны
+        if goal == self.goal:
+            return False
+        self.goal = goal
+        self.recomputes += 1
+
+        width, blocking = self.width, self.blocking
+        get = self.game_map.get
+        dist = self.dist
+        touched = self._touched
+        if self.max_distance is None:
+            dist[:] = self._unreached
+        else:
+            # Ограниченный обход задевает малую часть большой карты:
+            # сбрасываю только ее, а не всю карту
+            for i in touched:
+                dist[i] = UNREACHED
+            touched.clear()
+        gx, gy = goal
+        if not (0 <= gx < width and 0 <= gy < self.height):
+            return True
+        limit = UNREACHED if self.max_distance is None else self.max_distance
+        track = self.max_distance is not None
+
+        dist[gy * width + gx] = 0
+        if track:
+            touched.append(gy * width + gx)
+        queue = deque([(gx, gy)])
+        while queue:
+            x, y = queue.popleft()
+            d = dist[y * width + x] + 1
+            if d > limit:
+                continue
+            for dx, dy in DIRECTIONS:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < self.height):
+                    continue
+                i = ny * width + nx
+                if dist[i] > d and get(nx, ny) not in blocking:
+                    if track and dist[i] == UNREACHED:
+                        touched.append(i)
+                    dist[i] = d
+                    queue.append((nx, ny))
+        return True
+
+    def distance(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.dist[y * self.width + x]
+        return UNREACHED
+
+    def _best_step(self, x, y, towards, occupied=None):
+        """Соседняя клетка с наименьшим (или наибольшим) расстоянием"""
+        best = None
+        best_dist = self.distance(x, y)
+        if best_dist == UNREACHED:
+            return None
+        for dx, dy in DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            d = self.distance(nx, ny)
+            if d == UNREACHED:
+                continue
+            if occupied is not None and occupied(nx, ny):
+                continue
+            if (d < best_dist) if towards else (d > best_dist):
+                best, best_dist = (nx, ny), d
+        return best
+
+    def step_towards(self, x, y, occupied=None):
+        """Следующая клетка на пути к цели или None, если шагать некуда.
+
+        occupied(x, y) - необязательная проверка занятых клеток (например,
+        другими врагами).
+        """
+        return self._best_step(x, y, True, occupied)
+
+    def step_away(self, x, y, occupied=None):
+        """Клетка, где расстояние до цели больше, или None"""
+        return self._best_step(x, y, False, occupied)
@@ -0,0 +1,115 @@
+import functools
+import time
+from collections import deque
+
+
+class RollingHistogram:
+    """Скользящее окно последних замеров одной фазы"""
+    def __init__(self, window=300):
+        self.samples = deque(maxlen=window)  # Последние значения
+        self.total = 0                        # Замеров за всё время
+
+    def add(self, value):
+        self.samples.append(value)
+        self.total += 1
+
+    def summary(self):
+        """Среднее, перцентили и максимум по окну"""
+        if not self.samples:
+            return {'count': 0}
+        ordered = sorted(self.samples)
+        n = len(ordered)
+        return {
+            'count': n,
+            'total': self.total,
+            'mean': sum(ordered) / n,
+            'p50': ordered[n // 2],
+            'p95': ordered[min(n - 1, n * 95 // 100)],
+            'max': ordered[-1],
+        }
+
+    def buckets(self, scale=1e6):
+        """Гистограмма по степеням двойки (по умолчанию в микросекундах)"""
+        counts = {}
+        for value in self.samples:
+            bucket = 1
+            scaled = value * scale
+            while bucket < scaled:
+                bucket *= 2
+            counts[bucket] = counts.get(bucket, 0) + 1
+        return dict(sorted(counts.items()))
+
+
+class Profiler:
+    """Сбор времени по фазам кадра.
+
+    Движок и игра держат атрибут profiler = None; пока он не задан,
+    замеры не выполняются. Время хранится в секундах, счетчики - как есть.
+    """
+    def __init__(self, window=300):
+        self.window = window
+        self.timings = {}   # Фаза -> RollingHistogram времени
+        self.counters = {}  # Счетчик -> RollingHistogram значений
+        self.overlay = False  # Показывать сводку поверх игры
+
+    def record(self, phase, seconds):
+        histogram = self.timings.get(phase)
+        if histogram is None:
+            histogram = self.timings[phase] = RollingHistogram(self.window)
+        histogram.add(seconds)
+
+    def count(self, name, value):
+        histogram = self.counters.get(name)
+        if histogram is None:
+            histogram = self.counters[name] = RollingHistogram(self.window)
+        histogram.add(value)
+
+    def reset(self):
+        self.timings.clear()
+        self.counters.clear()
+
+    def dump(self):
+        """Текущая сводка в виде словаря"""
+        return {
+            'timings': {phase: dict(h.summary(), histogram_us=h.buckets())
+                        for phase, h in self.timings.items()},
+            'counters': {name: h.summary() for name, h in self.counters.items()},
+        }
+
+    def dump_json(self, path):
+        import json
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.dump(), f, ensure_ascii=False, indent=2)
+
+    def overlay_lines(self, limit=8):
+        """Короткая сводка для вывода поверх игры: самые дорогие фазы"""
+        rows = []
+        for phase, histogram in self.timings.items():
+            summary = histogram.summary()
+            if summary['count']:
+                rows.append((summary['mean'], phase, summary))
+        rows.sort(reverse=True)
+        lines = [f"{phase}: {s['mean'] * 1000:.3f} мс (p95 {s['p95'] * 1000:.3f}, max {s['max'] * 1000:.3f})"
+                 for _, phase, s in rows[:limit]]
+        for name, histogram in self.counters.items():
+            summary = histogram.summary()
+            if summary['count']:
+                lines.append(f"{name}: {summary['mean']:.1f} (max {summary['max']})")
+        return lines
+
+
+def profiled(phase):
+    """Декоратор метода: пишет время вызова в self.profiler, если он задан"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            profiler = self.profiler
+            if profiler is None:
+                return func(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                profiler.record(phase, time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,95 @@
+class QuestTracker:
+    """Шина событий квестов.
+
+    Квест подписан на каждую свою еще не выполненную цель: событие цели
+    обходит только подписанные на нее квесты, а не все. Выполненная цель
+    отписывается, квест завершается, когда выполнены все его цели.
+    Квесты - объекты с полями target (цель -> сколько нужно), progress
+    (цель -> сколько сделано) и completed.
+    """
+    def __init__(self, quests=()):
+        self.subscribers = {}  # Цель -> {квест: None} в порядке подписки
+        self.remaining = {}    # Квест -> сколько целей еще не выполнено
+        self.reset(quests)
+
+    def reset(self, quests):
+        """Подписываю квесты заново (новая игра или загрузка)"""
+        self.subscribers.clear()
+        self.remaining.clear()
+        for quest in quests:
+            self.add(quest)
+
+    def add(self, quest):
+        if quest.completed:
+            return
+        left = 0
+        for target, count in quest.target.items():
+            if quest.progress[target] < count:
+                self.subscribers.setdefault(target, {})[quest] = None
+                left += 1
+        if left:
+            self.remaining[quest] = left
+        else:
+            quest.completed = True
+
+    def remove(self, quest):
+        for target in quest.target:
+            subscribers = self.subscribers.get(target)
+            if subscribers is not None:
+                subscribers.pop(quest, None)
+                if not subscribers:
+                    del self.subscribers[target]
+        self.remaining.pop(quest, None)
+
+    def emit(self, target, amount=1):
+        """Событие цели target; возвращаю список завершившихся квестов"""
+        subscribers = self.subscribers.get(target)
+        if not subscribers:
+            return []
+        completed = []
+        done = []
+        for quest in subscribers:
+            quest.progress[target] += amount
+            if quest.progress[target] >= quest.target[target]:
+                done.append(quest)
+        for quest in done:
+            del subscribers[quest]
+            self.remaining[quest] -= 1
+            if not self.remaining[quest]:
+                del self.remaining[quest]
+                quest.completed = True
+                completed.append(quest)
+        if not subscribers:
+            del self.subscribers[target]
+        return completed
+
+    def active(self):
+        """Незавершенные квесты"""
+        return list(self.remaining)
+
+
+class RewardRegistry:
+    """Награды по имени: обработчик handler(game) выдает награду и
+    возвращает сообщение для игрока или None.
+    """
+    def __init__(self):
+        self.handlers = {}
+
+    def register(self, name):
+        """Декоратор: @rewards.register("Меч")"""
+        def decorator(handler):
+            self.handlers[name] = handler
+            return handler
+        return decorator
+
+    def grant(self, name, game, count=1):
+        """Выдаю награду count раз, возвращаю сообщения обработчика"""
+        handler = self.handlers.get(name)
+        if handler is None:
+            raise KeyError(f"Неизвестная награда: {name}")
+        messages = []
+        for _ in range(count):
+            message = handler(game)
+            if message:
+                messages.append(message)
+        return messages
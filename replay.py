@@ -0,0 +1,281 @@
+"""Запись ввода и быстрое воспроизведение.
+
+Журнал ввода хранит каждую клавишу с номером тика (для game2 - номером
+хода), а через каждые checkpoint_every тиков - контрольную сумму состояния.
+Воспроизведение подает те же клавиши в игру без терминала и без пауз и
+сверяет суммы: первое расхождение показывает, с какого тика игра ведет себя
+иначе, чем при записи.
+
+Формат: заголовок, снимок начального состояния (запись savegame, может быть
+пустым), затем события. Событие - приращение тика (varint) и байт-метка:
+меньше 0xFF - длина клавиши в utf-8, за которой идет сама клавиша; 0xFF -
+контрольная точка, за ней crc32 состояния.
+
+Запуск:
+    python game2.py --record session.rec   # играть и писать ввод
+    python replay.py session.rec           # воспроизвести и сверить
+"""
+import argparse
+import os
+import struct
+import tempfile
+import time
+
+from headless import NullStream
+from savegame import decode_records
+
+MAGIC = b'G2IN'
+VERSION = 1
+HEADER = struct.Struct('<4sHBI')  # magic, версия, флаги, размер снимка
+CHECKPOINT = 0xFF
+HASH = struct.Struct('<I')
+
+SAVES = 1        # Игра писала файл сохранения
+SAVE_EXISTED = 2  # Сохранение уже было при начале записи
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class InputRecorder:
+    """Пишу ввод и контрольные точки в журнал.
+
+    Игра вызывает key() для каждой полученной клавиши и end_tick() в конце
+    каждого тика. Запись буферизуется и сбрасывается на диск в контрольных
+    точках и при close().
+    """
+    def __init__(self, path, snapshot=b'', flags=0, checkpoint_every=10):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, flags, len(snapshot)))
+        self.file.write(snapshot)
+        self.buffer = bytearray()
+        self.last_tick = 0  # Тик последнего события
+        self.last_checkpoint = None
+        self.keys = 0
+        self.checkpoints = 0
+
+    def key(self, tick, key):
+        raw = key.encode('utf-8')
+        if len(raw) >= CHECKPOINT:
+            raw = raw[:CHECKPOINT - 1]
+        write_varint(self.buffer, tick - self.last_tick)
+        self.last_tick = tick
+        self.buffer.append(len(raw))
+        self.buffer += raw
+        self.keys += 1
+
+    def end_tick(self, tick, state_hash, final=False):
+        """Конец тика: каждые checkpoint_every тиков пишу сумму состояния.
+
+        final=True - конец игры: сумма пишется в любом случае, чтобы
+        расхождение после последней точки тоже было видно. Ввод мог
+        кончиться посреди хода, поэтому итоговая сумма заменяет записанную
+        на этом тике раньше.
+        """
+        if tick == self.last_checkpoint and not final:
+            return
+        if final or self.checkpoint_every and tick % self.checkpoint_every == 0:
+            self.last_checkpoint = tick
+            write_varint(self.buffer, tick - self.last_tick)
+            self.last_tick = tick
+            self.buffer.append(CHECKPOINT)
+            self.buffer += HASH.pack(state_hash())
+            self.checkpoints += 1
+            self.flush()
+
+    def flush(self):
+        if self.file is not None and self.buffer:
+            self.file.write(self.buffer)
+            self.file.flush()
+            self.buffer.clear()
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+class InputLog:
+    """Прочитанный журнал ввода"""
+    def __init__(self, flags, snapshot, events, checkpoints):
+        self.flags = flags
+        self.snapshot = snapshot        # Секции начального состояния или {}
+        self.events = events            # [(тик, клавиша)] по порядку
+        self.checkpoints = checkpoints  # Тик -> crc32 состояния
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:len(MAGIC)] != MAGIC or len(data) < HEADER.size:
+            raise ValueError(f"{path}: это не журнал ввода")
+        magic, version, flags, snapshot_size = HEADER.unpack_from(data, 0)
+        if version != VERSION:
+            raise ValueError(f"Версия журнала {version} не поддерживается")
+        offset = HEADER.size
+        snapshot = {}
+        if snapshot_size:
+            for _, _, snapshot, _ in decode_records(data[offset:offset + snapshot_size]):
+                break
+        offset += snapshot_size
+
+        events, checkpoints = [], {}
+        tick = 0
+        try:
+            while offset < len(data):
+                delta, offset = read_varint(data, offset)
+                tick += delta
+                tag = data[offset]
+                offset += 1
+                if tag == CHECKPOINT:
+                    (checkpoints[tick],) = HASH.unpack_from(data, offset)
+                    offset += HASH.size
+                else:
+                    if offset + tag > len(data):
+                        break
+                    events.append((tick, data[offset:offset + tag].decode('utf-8')))
+                    offset += tag
+        except (IndexError, struct.error):
+            pass  # Журнал оборван (игра упала до сброса буфера)
+        return cls(flags, snapshot, events, checkpoints)
+
+    @property
+    def ticks(self):
+        """Сколько тиков покрывает журнал"""
+        ticks = [tick + 1 for tick, _ in self.events[-1:]] + list(self.checkpoints)
+        return max(ticks, default=0)
+
+
+class Replay:
+    """Источник ввода из журнала и сверка контрольных точек.
+
+    Для пошаговой игры вызывается как input(): клавиши отдаются по порядку.
+    Для движка с тиками at(tick) отдает клавишу этого тика или None.
+    Когда клавиши кончились, бросает EOFError.
+    """
+    def __init__(self, log):
+        self.log = log
+        self.position = 0  # Следующее событие
+        self.checked = 0
+        self.last_checked = None
+        self.final_tick = max(log.checkpoints, default=None)  # Тик итоговой суммы
+        self.mismatches = []  # [(тик, ожидалось, получено)]
+
+    def __call__(self, prompt=''):
+        events = self.log.events
+        if self.position >= len(events):
+            raise EOFError("Журнал ввода закончился")
+        self.position += 1
+        return events[self.position - 1][1]
+
+    def at(self, tick):
+        events = self.log.events
+        if self.position >= len(events):
+            if tick >= self.log.ticks:
+                raise EOFError("Журнал ввода закончился")
+            return None
+        event_tick, key = events[self.position]
+        if event_tick != tick:
+            return None
+        self.position += 1
+        return key
+
+    def key(self, tick, key):
+        pass
+
+    def end_tick(self, tick, state_hash, final=False):
+        expected = self.log.checkpoints.get(tick)
+        if (not final and tick == self.final_tick
+                and self.position < len(self.log.events)):
+            return  # Итоговая сумма: сверяю, когда кончатся клавиши
+        if expected is not None and tick != self.last_checked:
+            self.last_checked = tick
+            self.checked += 1
+            actual = state_hash()
+            if actual != expected:
+                self.mismatches.append((tick, expected, actual))
+
+    def report(self, ticks, elapsed):
+        return {
+            'ticks': ticks,
+            'keys': self.position,
+            'checkpoints': self.checked,
+            'mismatches': len(self.mismatches),
+            'first_mismatch': self.mismatches[0][0] if self.mismatches else None,
+            'elapsed': elapsed,
+            'ticks_per_sec': ticks / elapsed if elapsed else 0.0,
+        }
+
+
+def replay_game(path, render=False):
+    """Воспроизвожу журнал game2 без терминала, возвращаю сводку.
+
+    render=False пропускает вывод карты: остается только логика игры.
+    """
+    from game2 import Game
+
+    log = InputLog.read(path)
+    replay = Replay(log)
+    with tempfile.TemporaryDirectory() as folder:
+        save_path = os.path.join(folder, "replay.sav") if log.flags & SAVES else None
+        game = Game(input_func=replay, output=NullStream(), seed=0, save_path=save_path)
+        if log.snapshot:
+            game.load_sections(log.snapshot)
+        if log.flags & SAVE_EXISTED:
+            game.save_game(full=True)
+        game.input_log = replay
+        start = time.perf_counter()
+        game.run(render=render)
+        elapsed = time.perf_counter() - start
+    return replay.report(game.turn, elapsed)
+
+
+def replay_engine(path, engine, render=False):
+    """Воспроизвожу журнал GameEngine на заново собранной сцене engine.
+
+    Сцена должна быть построена так же, как при записи: в журнале движка
+    нет снимка состояния, только клавиши и контрольные суммы.
+    """
+    log = InputLog.read(path)
+    replay = Replay(log)
+    engine.input_source = lambda: replay.at(engine.tick)
+    engine.input_log = replay
+    result = engine.run_headless(log.ticks, render=render)
+    return replay.report(result['ticks'], result['elapsed'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Воспроизведение журнала ввода game2")
+    parser.add_argument('path', help="файл журнала")
+    parser.add_argument('--render', action='store_true', help="строить кадры карты")
+    args = parser.parse_args(argv)
+
+    report = replay_game(args.path, args.render)
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+    if report['mismatches']:
+        print(f"Состояние разошлось с записью на ходу {report['first_mismatch']}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,147 @@
+"""Файл сохранения: журнал записей со снимками и изменениями.
+
+Состояние игры делится на именованные секции (игрок, инвентарь, квесты,
+локации, карты), каждая - уже упакованные байты. Полный снимок
+перезаписывает файл всеми секциями, а дельта дописывает в конец только
+секции, изменившиеся с прошлой записи. При загрузке записи читаются по
+порядку, и более поздние секции заменяют ранние. Недописанная запись в
+конце файла (например, при сбое во время автосохранения) пропускается.
+"""
+import os
+import struct
+import zlib
+
+MAGIC = b'G2SV'
+VERSION = 1
+FULL, DELTA = 0, 1
+RECORD = struct.Struct('<4sHBII')  # magic, версия, вид, номер записи, секций
+TRAILER = struct.Struct('<I')       # crc32 записи
+
+
+def encode_record(kind, seq, sections):
+    parts = [RECORD.pack(MAGIC, VERSION, kind, seq, len(sections))]
+    for name, data in sections.items():
+        raw_name = name.encode('utf-8')
+        parts.append(struct.pack('<H', len(raw_name)))
+        parts.append(raw_name)
+        parts.append(struct.pack('<I', len(data)))
+        parts.append(data)
+    body = b''.join(parts)
+    return body + TRAILER.pack(zlib.crc32(body))
+
+
+def decode_records(data):
+    """Перебираю (вид, номер, секции, конец записи) целых записей файла"""
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        start = offset
+        magic, version, kind, seq, count = RECORD.unpack_from(data, offset)
+        if magic != MAGIC:
+            if start:
+                return  # Мусор после последней целой записи
+            raise ValueError("Это не файл сохранения")
+        if version != VERSION:
+            raise ValueError(f"Версия сохранения {version} не поддерживается")
+        offset += RECORD.size
+        sections = {}
+        try:
+            for _ in range(count):
+                (name_size,) = struct.unpack_from('<H', data, offset)
+                offset += 2
+                name = data[offset:offset + name_size].decode('utf-8')
+                offset += name_size
+                (size,) = struct.unpack_from('<I', data, offset)
+                offset += 4
+                if offset + size > len(data):
+                    return
+                sections[name] = data[offset:offset + size]
+                offset += size
+            (crc,) = TRAILER.unpack_from(data, offset)
+        except struct.error:
+            return  # Запись оборвана
+        if crc != zlib.crc32(data[start:offset]):
+            return
+        offset += TRAILER.size
+        yield kind, seq, sections, offset
+
+
+class SaveFile:
+    """Сохранение в одном файле: полные снимки и дописываемые дельты"""
+    def __init__(self, path, compact_every=50):
+        self.path = path
+        self.compact_every = compact_every  # Через сколько дельт писать снимок
+        self.checksums = {}  # Секция -> crc32 последней записанной версии
+        self.seq = 0         # Номер последней записи
+        self.deltas = 0      # Дельт с последнего полного снимка
+        self.last_write_bytes = 0
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def write(self, sections, full=False):
+        """Записываю секции. Без full пишется дельта, если это возможно.
+
+        Возвращает число записанных байт (0 - ничего не изменилось).
+        """
+        if (full or not self.checksums or self.deltas >= self.compact_every
+                or not self.exists()):
+            return self._write_full(sections)
+        checksums = {name: zlib.crc32(data) for name, data in sections.items()}
+        changed = {name: sections[name] for name, crc in checksums.items()
+                   if self.checksums.get(name) != crc}
+        if not changed:
+            self.last_write_bytes = 0
+            return 0
+        self.seq += 1
+        record = encode_record(DELTA, self.seq, changed)
+        with open(self.path, 'ab') as f:
+            f.write(record)
+        self.checksums.update(checksums)
+        self.deltas += 1
+        self.last_write_bytes = len(record)
+        return len(record)
+
+    def _write_full(self, sections):
+        self.seq += 1
+        record = encode_record(FULL, self.seq, sections)
+        # Пишу во временный файл и подменяю, чтобы не потерять старый снимок
+        temp = self.path + '.tmp'
+        with open(temp, 'wb') as f:
+            f.write(record)
+        os.replace(temp, self.path)
+        self.checksums = {name: zlib.crc32(data) for name, data in sections.items()}
+        self.deltas = 0
+        self.last_write_bytes = len(record)
+        return len(record)
+
+    def read(self):
+        """Собираю секции из снимка и всех дельт после него.
+
+        ValueError - в файле нет ни одного целого снимка (пустой или
+        испорченный файл); такой файл не трогаю.
+        """
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        sections = None
+        deltas = 0
+        good_end = 0
+        for kind, seq, record, end in decode_records(data):
+            if kind == FULL:
+                sections = dict(record)
+                deltas = 0
+            elif sections is None:
+                break  # Дельта без снимка: применять ее не к чему
+            else:
+                sections.update(record)
+                deltas += 1
+            self.seq = seq
+            good_end = end
+        if sections is None:
+            raise ValueError("В сохранении нет целого снимка")
+        self.deltas = deltas
+        if good_end < len(data):
+            # Отрезаю оборванный хвост, чтобы новые дельты читались
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_end)
+        self.checksums = {name: zlib.crc32(section) for name, section in sections.items()}
+        return sections
@@ -0,0 +1,87 @@
+import heapq
+import itertools
+
+ACTION_COST = 100  # Энергии на одно действие
+NORMAL_SPEED = 100 # Скорость, при которой актер ходит каждый тик
+
+
+class TurnScheduler:
+    """Очередь ходов по энергии.
+
+    Каждый тик актер копит speed энергии и действует, когда накопил
+    ACTION_COST: быстрый актер ходит чаще медленного. Энергия не
+    начисляется потиково - для актера сразу считается тик его следующего
+    хода, и он лежит в куче до этого тика. Поэтому цена хода зависит от
+    числа актеров, которые действуют, а не от числа всех актеров; актеры
+    вне очереди (спящие) не стоят ничего и сохраняют накопленную энергию.
+
+    У актера должны быть поля speed, energy и energy_time (тик, по который
+    энергия уже начислена).
+    """
+    def __init__(self):
+        self.time = 0      # Текущий тик
+        self.heap = []     # [тик хода, порядок, актер или None]
+        self.entries = {}  # Актер -> его запись в куче
+        self.turns = 0     # Сколько ходов выдано
+        self._order = itertools.count()  # При равном тике - кто раньше встал
+
+    def __contains__(self, actor):
+        return actor in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def schedule(self, actor):
+        """Ставлю актера в очередь (будит спящего); энергию копит с текущего тика"""
+        if actor in self.entries:
+            return
+        actor.energy_time = self.time
+        self._push(actor)
+
+    def _push(self, actor):
+        need = ACTION_COST - actor.energy
+        due = actor.energy_time
+        if need > 0:
+            due += -(-need // actor.speed)  # Округление вверх
+        entry = [due, next(self._order), actor]
+        self.entries[actor] = entry
+        heapq.heappush(self.heap, entry)
+
+    def unschedule(self, actor):
+        """Убираю актера из очереди (уснул, погиб, ушел из локации)"""
+        entry = self.entries.pop(actor, None)
+        if entry is not None:
+            entry[2] = None  # Запись выбросится, когда дойдет до верха кучи
+
+    def pop(self, until=None):
+        """Следующий актер, чей ход не позже тика until (None - любой).
+
+        Актер покидает очередь: после действия верните его через spend(),
+        или не возвращайте, если он уснул. None - таких актеров нет.
+        """
+        heap = self.heap
+        while heap:
+            due, _, actor = heap[0]
+            if actor is None:
+                heapq.heappop(heap)
+                continue
+            if until is not None and due > until:
+                return None
+            heapq.heappop(heap)
+            del self.entries[actor]
+            actor.energy += actor.speed * (due - actor.energy_time)
+            actor.energy_time = due
+            if due > self.time:
+                self.time = due
+            self.turns += 1
+            return actor
+        return None
+
+    def spend(self, actor, cost=ACTION_COST):
+        """Актер потратил cost энергии на действие и снова ждет своего хода"""
+        actor.energy -= cost
+        self._push(actor)
+
+    def clear(self):
+        self.heap.clear()
+        self.entries.clear()
@@ -0,0 +1,450 @@
+"""Сетевая игра: один мир GameEngine и много клиентов по TCP.
+
+Клиент шлет нажатия клавиш и подтверждает полученные кадры. Сервер
+отвечает только клетками, которые изменились с последнего подтвержденного
+кадра клиента: кадры хранятся в короткой истории, и разница к кадру,
+который клиент уже видел, считается один раз на всех клиентов с этим
+кадром. Кадры клиенту отправляются не чаще max_fps и не уходят, пока он
+не разобрал уже отправленное, - пропуск кадра ничего не теряет, следующий
+кадр будет разницей от того же подтвержденного.
+
+Сообщение - заголовок (тип, длина) и данные:
+    сервер -> клиент: H - размер поля, P - палитра, F - кадр (номер,
+        номер базы, куски подряд идущих измененных клеток)
+    клиент -> сервер: K - клавиша, A - подтверждение кадра
+
+Запуск:
+    python server.py serve --port 7777        # сервер
+    python server.py connect --port 7777      # клиент в терминале
+    python server.py bench --tick-rate 20     # сколько клиентов тянет процесс
+"""
+import argparse
+import asyncio
+import random
+import struct
+import time
+from collections import deque
+
+from instantgamelib import (FrameBuffer, GameEngine, NullRenderer, Player,
+                            TerminalRenderer, Wall)
+
+MESSAGE = struct.Struct('<cI')  # тип, длина данных
+SIZE = struct.Struct('<HH')     # ширина, высота
+FRAME = struct.Struct('<II')    # номер кадра, номер базы (0 - с пустого поля)
+RUN = struct.Struct('<II')      # начало куска, длина
+ACK = struct.Struct('<I')
+MAX_PAYLOAD = 64                # Больше данных клиенту слать незачем (клавиша, подтверждение)
+MAX_FRAME = 16 * 1024 * 1024    # Предел сообщения сервера для клиента
+
+
+def message(kind, payload=b''):
+    return MESSAGE.pack(kind, len(payload)) + payload
+
+
+def diff_runs(old, new, width):
+    """Куски подряд идущих клеток new, отличающихся от old: [(начало, байты)].
+
+    old = None - весь кадр одним куском.
+    """
+    if old is None:
+        return [(0, bytes(new))]
+    old, new = memoryview(old), memoryview(new)
+    runs = []
+    for row_start in range(0, len(new), width):
+        row_end = row_start + width
+        if old[row_start:row_end] == new[row_start:row_end]:
+            continue
+        i = row_start
+        while i < row_end:
+            if old[i] == new[i]:
+                i += 1
+                continue
+            start = i
+            while i < row_end and old[i] != new[i]:
+                i += 1
+            if runs and runs[-1][0] + len(runs[-1][1]) == start:
+                # Кусок продолжает предыдущий с конца прошлой строки
+                runs[-1] = (runs[-1][0], runs[-1][1] + bytes(new[start:i]))
+            else:
+                runs.append((start, bytes(new[start:i])))
+    return runs
+
+
+def encode_frame(number, base, runs):
+    parts = [FRAME.pack(number, base)]
+    for start, data in runs:
+        parts.append(RUN.pack(start, len(data)))
+        parts.append(data)
+    return message(b'F', b''.join(parts))
+
+
+class RemotePlayer(Player):
+    """Игрок сетевого клиента: ходит по своим клавишам, а не по общей"""
+    def __init__(self, x, y, char='@'):
+        super().__init__(x, y)
+        self.char = char
+        self.keys = deque(maxlen=8)  # Необработанные клавиши клиента
+
+    def update(self):
+        if self.keys:
+            self.step(self.keys.popleft())
+
+
+class Connection:
+    """Состояние одного клиента на сервере"""
+    def __init__(self, writer, player):
+        self.writer = writer
+        self.player = player
+        self.acked = 0         # Последний подтвержденный кадр
+        self.sent = 0          # Последний отправленный кадр
+        self.in_flight = deque()  # Отправленные, но не подтвержденные кадры
+        self.palette_sent = 0  # Сколько символов палитры клиент знает
+        self.frames = 0
+        self.skipped = 0       # Кадров пропущено из-за лимитов
+        self.bytes = 0
+
+
+class GameServer:
+    """Сервер одного мира GameEngine.
+
+    Мир обновляется tick_rate раз в секунду. Клиенту уходит не больше
+    max_fps кадров в секунду (кадр раз в несколько тиков) и не больше
+    max_in_flight неподтвержденных кадров; если его сокет не успевает (в
+    буфере больше high_water байт), кадр пропускается.
+    """
+    def __init__(self, engine, tick_rate=20, max_fps=20, history=64,
+                 max_in_flight=4, high_water=64 * 1024):
+        self.engine = engine
+        engine.renderer = NullRenderer()
+        engine.input_source = lambda: None  # Клавиши у каждого игрока свои
+        self.tick_rate = tick_rate
+        self.send_every = max(1, round(tick_rate / max_fps))  # Тиков между кадрами клиенту
+        self.max_in_flight = max_in_flight
+        self.high_water = high_water
+        self.frame = 0                  # Номер последнего кадра
+        self.history = {}               # Номер кадра -> клетки
+        self.history_size = history
+        self.clients = []
+        self.server = None
+        self.port = None
+        self.running = False
+        # Статистика
+        self.ticks = 0
+        self.tick_time = 0.0
+        self.max_tick_time = 0.0
+        self.late_ticks = 0             # Тиков, начатых позже срока
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        self.diffs = 0                  # Сколько разниц посчитано
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self._handle, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    def spawn(self, number):
+        """Позиция нового игрока: по кругу вокруг центра поля"""
+        engine = self.engine
+        x = 1 + (engine.width // 2 + number * 3) % max(1, engine.width - 2)
+        y = 1 + (engine.height // 2 + number) % max(1, engine.height - 2)
+        return x, y
+
+    async def _handle(self, reader, writer):
+        engine = self.engine
+        x, y = self.spawn(len(self.clients))
+        player = RemotePlayer(x, y)
+        engine.add_object(player)
+        client = Connection(writer, player)
+        self.clients.append(client)
+        writer.write(message(b'H', SIZE.pack(engine.width, engine.height)))
+        try:
+            while True:
+                header = await reader.readexactly(MESSAGE.size)
+                kind, size = MESSAGE.unpack(header)
+                if size > MAX_PAYLOAD:
+                    break  # Не выделяю память под чужую длину: отключаю клиента
+                payload = await reader.readexactly(size) if size else b''
+                if kind == b'K':
+                    player.keys.append(payload.decode('utf-8'))
+                elif kind == b'A':
+                    (frame,) = ACK.unpack(payload)
+                    if frame > client.acked:
+                        client.acked = frame
+                        while client.in_flight and client.in_flight[0] <= frame:
+                            client.in_flight.popleft()
+        except (asyncio.IncompleteReadError, ConnectionError,
+                UnicodeDecodeError, struct.error):
+            pass  # Обрыв или испорченное сообщение: клиент отключается
+        finally:
+            self.clients.remove(client)
+            engine.remove_object(player)
+            writer.close()
+
+    def tick(self):
+        """Один тик: обновление мира, кадр и рассылка"""
+        engine = self.engine
+        engine.update()
+        engine.render()
+        self.frame += 1
+        self.history[self.frame] = bytes(engine.grid.cells)
+        self.history.pop(self.frame - self.history_size, None)
+        self.broadcast()
+
+    def broadcast(self):
+        grid = self.engine.grid
+        palette = None
+        frames = {}  # Номер базы -> готовое сообщение кадра
+        for client in self.clients:
+            transport = client.writer.transport
+            if (self.frame - client.sent < self.send_every
+                    or len(client.in_flight) >= self.max_in_flight
+                    or transport.get_write_buffer_size() > self.high_water):
+                client.skipped += 1
+                continue
+            base = client.acked if client.acked in self.history else 0
+            data = frames.get(base)
+            if data is None:
+                runs = diff_runs(self.history.get(base), self.history[self.frame], grid.width)
+                data = frames[base] = encode_frame(self.frame, base, runs)
+                self.diffs += 1
+            if client.palette_sent != len(grid.palette):
+                if palette is None:
+                    palette = message(b'P', '\0'.join(grid.palette).encode('utf-8'))
+                data = palette + data
+                client.palette_sent = len(grid.palette)
+            # Всё, что накопилось клиенту за тик, уходит одной записью
+            client.writer.write(data)
+            client.sent = self.frame
+            client.in_flight.append(self.frame)
+            client.frames += 1
+            client.bytes += len(data)
+            self.frames_sent += 1
+            self.bytes_sent += len(data)
+
+    async def run(self, duration=None):
+        """Игровой цикл с фиксированным шагом; duration - сколько секунд"""
+        clock = time.perf_counter
+        dt = 1.0 / self.tick_rate
+        self.running = True
+        start = next_tick = clock()
+        while self.running and (duration is None or clock() - start < duration):
+            now = clock()
+            if now - next_tick > dt:
+                self.late_ticks += 1
+                next_tick = now
+            tick_start = clock()
+            self.tick()
+            spent = clock() - tick_start
+            self.ticks += 1
+            self.tick_time += spent
+            self.max_tick_time = max(self.max_tick_time, spent)
+            next_tick += dt
+            await asyncio.sleep(max(0.0, next_tick - clock()))
+        self.running = False
+
+    async def close(self):
+        self.running = False
+        for client in list(self.clients):
+            client.writer.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def report(self):
+        return {
+            'clients': len(self.clients),
+            'ticks': self.ticks,
+            'avg_tick_ms': self.tick_time / self.ticks * 1000 if self.ticks else 0.0,
+            'max_tick_ms': self.max_tick_time * 1000,
+            'budget_ms': 1000 / self.tick_rate,
+            'late_ticks': self.late_ticks,
+            'frames_sent': self.frames_sent,
+            'diffs': self.diffs,
+            'bytes_sent': self.bytes_sent,
+        }
+
+
+class GameClient:
+    """Клиент: держит копию поля и применяет присланные куски клеток"""
+    def __init__(self, renderer=None):
+        self.renderer = renderer  # TerminalRenderer или None (без вывода)
+        self.grid = None
+        self.frame = 0
+        self.frames = 0
+        self.bytes = 0
+        self.reader = self.writer = None
+
+    async def connect(self, host='127.0.0.1', port=7777):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    def send_key(self, key):
+        self.writer.write(message(b'K', key.encode('utf-8')))
+
+    async def receive(self):
+        """Читаю сообщения сервера, пока он не закроет соединение"""
+        reader = self.reader
+        try:
+            while True:
+                kind, size = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+                if size > MAX_FRAME:
+                    break
+                payload = await reader.readexactly(size) if size else b''
+                self.bytes += MESSAGE.size + size
+                if kind == b'H':
+                    width, height = SIZE.unpack(payload)
+                    self.grid = FrameBuffer(width, height)
+                elif kind == b'P':
+                    for char in payload.decode('utf-8').split('\0'):
+                        self.grid.code(char)
+                elif kind == b'F':
+                    self._apply(payload)
+        except (asyncio.IncompleteReadError, ConnectionError,
+                UnicodeDecodeError, struct.error):
+            pass
+
+    def _apply(self, payload):
+        number, base = FRAME.unpack_from(payload, 0)
+        if base != 0 and base != self.frame:
+            return  # Разница не к нашему кадру - дождусь следующей
+        cells = self.grid.cells
+        offset = FRAME.size
+        while offset < len(payload):
+            start, length = RUN.unpack_from(payload, offset)
+            offset += RUN.size
+            cells[start:start + length] = payload[offset:offset + length]
+            offset += length
+        self.frame = number
+        self.frames += 1
+        self.writer.write(message(b'A', ACK.pack(number)))
+        if self.renderer is not None:
+            self.renderer.present(self.grid)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def arena(width, height):
+    """Поле со стенами по краям"""
+    engine = GameEngine(width, height, renderer=NullRenderer())
+    for x in range(width):
+        engine.add_object(Wall(x, 0))
+        engine.add_object(Wall(x, height - 1))
+    for y in range(1, height - 1):
+        engine.add_object(Wall(0, y))
+        engine.add_object(Wall(width - 1, y))
+    return engine
+
+
+async def benchmark(clients, tick_rate=20, seconds=2.0, width=80, height=40,
+                    key_every=2, seed=0):
+    """Сервер и clients ботов через loopback в одном процессе.
+
+    Боты жмут случайную клавишу раз в key_every тиков. Возвращает сводку
+    сервера и сколько кадров в секунду получил средний клиент.
+    """
+    server = GameServer(arena(width, height), tick_rate=tick_rate, max_fps=tick_rate)
+    await server.start()
+    bots = []
+    for _ in range(clients):
+        bot = GameClient()
+        await bot.connect(port=server.port)
+        bots.append(bot)
+    receivers = [asyncio.ensure_future(bot.receive()) for bot in bots]
+    rng = random.Random(seed)
+
+    async def press_keys():
+        while True:
+            for bot in bots:
+                bot.send_key(rng.choice('wasd'))
+            await asyncio.sleep(key_every / tick_rate)
+
+    presser = asyncio.ensure_future(press_keys())
+    await server.run(seconds)
+    presser.cancel()
+    report = server.report()
+    report['client_fps'] = (sum(bot.frames for bot in bots) / len(bots) / seconds
+                            if bots else 0.0)
+    for bot in bots:
+        bot.close()
+    await server.close()
+    await asyncio.gather(*receivers, return_exceptions=True)
+    return report
+
+
+async def max_clients(tick_rate=20, seconds=2.0, limit=4096, **kwargs):
+    """Удваиваю число клиентов, пока тик укладывается в бюджет.
+
+    Возвращаю наибольшее число клиентов, при котором средний тик занял не
+    больше половины бюджета (вторая половина - на прием и отправку), а тиков
+    с опозданием не больше 1%, и сводки всех прогонов.
+    """
+    runs = []
+    best = 0
+    clients = 1
+    while clients <= limit:
+        report = await benchmark(clients, tick_rate, seconds, **kwargs)
+        runs.append(report)
+        if (report['avg_tick_ms'] > report['budget_ms'] / 2
+                or report['late_ticks'] > report['ticks'] // 100):
+            break
+        best = clients
+        clients *= 2
+    return best, runs
+
+
+async def serve(host, port, width, height, tick_rate):
+    server = GameServer(arena(width, height), tick_rate=tick_rate, max_fps=tick_rate)
+    await server.start(host, port)
+    print(f"Сервер слушает {host}:{server.port}")
+    await server.run()
+
+
+async def play(host, port):
+    client = GameClient(TerminalRenderer())
+    await client.connect(host, port)
+    receiver = asyncio.ensure_future(client.receive())
+    loop = asyncio.get_running_loop()
+    try:
+        while not receiver.done():
+            # Строка с клавишами WASD; каждая буква - отдельное нажатие
+            line = await loop.run_in_executor(None, input)
+            if line.strip().lower() == 'q':
+                break
+            for key in line.strip().lower():
+                client.send_key(key)
+    except EOFError:
+        pass
+    client.close()
+    await asyncio.gather(receiver, return_exceptions=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сетевая игра на GameEngine")
+    parser.add_argument('mode', choices=('serve', 'connect', 'bench'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--size', default='40x20', help="размер поля ШxВ")
+    parser.add_argument('--tick-rate', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=2.0, help="длина прогона в bench")
+    args = parser.parse_args(argv)
+    width, height = (int(v) for v in args.size.lower().split('x'))
+
+    if args.mode == 'serve':
+        asyncio.run(serve(args.host, args.port, width, height, args.tick_rate))
+    elif args.mode == 'connect':
+        asyncio.run(play(args.host, args.port))
+    else:
+        best, runs = asyncio.run(max_clients(args.tick_rate, args.seconds,
+                                             width=width, height=height))
+        for report in runs:
+            print(f"  {report['clients']:5d} клиентов: тик {report['avg_tick_ms']:.2f} мс "
+                  f"(макс {report['max_tick_ms']:.2f}, бюджет {report['budget_ms']:.1f}), "
+                  f"опозданий {report['late_ticks']}, "
+                  f"{report['client_fps']:.1f} кадров/с на клиента, "
+                  f"{report['bytes_sent'] // max(1, report['frames_sent'])} байт/кадр")
+        print(f"При {args.tick_rate} тиках/с один процесс обслуживает до {best} клиентов")
+
+
+if __name__ == "__main__":
+    main()
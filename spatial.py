@@ -0,0 +1,112 @@
+class SpatialIndex:
+    """Пространственный хэш: быстрый поиск объектов по координатам.
+
+    Объекты раскладываются по корзинам размером bucket x bucket клеток.
+    Запрос "что стоит в (x, y)" смотрит одну корзину, запрос "что в радиусе r"
+    - только корзины, которые пересекает квадрат вокруг точки.
+    Объект должен иметь атрибуты x и y.
+    """
+    def __init__(self, bucket=1):
+        self.bucket = bucket  # Размер корзины в клетках
+        self.cells = {}       # (bx, by) -> список объектов
+        self.count = 0        # Сколько объектов в индексе
+
+    def _key(self, x, y):
+        if self.bucket == 1:
+            return (x, y)
+        return (x // self.bucket, y // self.bucket)
+
+    def add(self, obj, x=None, y=None):
+        """Добавляю объект в индекс (по его текущей позиции или по x, y)"""
+        if x is None:
+            x, y = obj.x, obj.y
+        self.cells.setdefault(self._key(x, y), []).append(obj)
+        self.count += 1
+
+    def remove(self, obj, x=None, y=None):
+        """Убираю объект из индекса. Возвращает False, если его там не было"""
+        if x is None:
+            x, y = obj.x, obj.y
+        key = self._key(x, y)
+        bucket = self.cells.get(key)
+        if not bucket:
+            return False
+        for i, other in enumerate(bucket):
+            if other is obj:
+                # Порядок в корзине не важен - меняю с последним и удаляю
+                bucket[i] = bucket[-1]
+                bucket.pop()
+                if not bucket:
+                    del self.cells[key]
+                self.count -= 1
+                return True
+        return False
+
+    def move(self, obj, old_x, old_y, new_x, new_y):
+        """Переношу объект в новую корзину, если она поменялась"""
+        if self._key(old_x, old_y) == self._key(new_x, new_y):
+            return
+        if self.remove(obj, old_x, old_y):
+            self.add(obj, new_x, new_y)
+
+    def clear(self):
+        self.cells.clear()
+        self.count = 0
+
+    def at(self, x, y):
+        """Все объекты в клетке (x, y)"""
+        bucket = self.cells.get(self._key(x, y))
+        if not bucket:
+            return []
+        if self.bucket == 1:
+            return list(bucket)
+        return [obj for obj in bucket if obj.x == x and obj.y == y]
+
+    def first_at(self, x, y):
+        """Первый объект в клетке (x, y) или None"""
+        bucket = self.cells.get(self._key(x, y))
+        if not bucket:
+            return None
+        if self.bucket == 1:
+            return bucket[0]
+        for obj in bucket:
+            if obj.x == x and obj.y == y:
+                return obj
+        return None
+
+    def within(self, x, y, radius):
+        """Все объекты на расстоянии не больше radius от (x, y)"""
+        b = self.bucket
+        r2 = radius * radius
+        found = []
+        for by in range((y - radius) // b, (y + radius) // b + 1):
+            for bx in range((x - radius) // b, (x + radius) // b + 1):
+                bucket = self.cells.get((bx, by))
+                if not bucket:
+                    continue
+                for obj in bucket:
+                    dx, dy = obj.x - x, obj.y - y
+                    if dx * dx + dy * dy <= r2:
+                        found.append(obj)
+        return found
+
+    def in_rect(self, left, top, right, bottom):
+        """Все объекты с left <= x < right и top <= y < bottom"""
+        b = self.bucket
+        found = []
+        for by in range(top // b, (bottom - 1) // b + 1):
+            for bx in range(left // b, (right - 1) // b + 1):
+                bucket = self.cells.get((bx, by))
+                if not bucket:
+                    continue
+                for obj in bucket:
+                    if left <= obj.x < right and top <= obj.y < bottom:
+                        found.append(obj)
+        return found
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for bucket in self.cells.values():
+            yield from bucket
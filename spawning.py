@@ -0,0 +1,99 @@
+import random
+import zlib
+
+numpy = None  # Импортируется при первом Spawner(use_numpy=True): это долго
+
+
+def _load_numpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            return None
+        numpy = module
+    return numpy
+
+
+class SpawnRule:
+    """Правило появления: на клетках glyph с вероятностью chance.
+
+    choices - список пар (вес, factory), factory(x, y) создает объект.
+    Если вариантов несколько, для каждой выбранной клетки вариант
+    выбирается по весам. kind - куда попадет объект: "item" или "enemy".
+    """
+    def __init__(self, glyph, chance, kind, choices):
+        self.glyph = glyph
+        self.chance = chance
+        self.kind = kind
+        self.weights = [weight for weight, _ in choices]
+        self.factories = [factory for _, factory in choices]
+
+
+class Spawner:
+    """Раскладка предметов и врагов по таблице правил.
+
+    У каждой локации свой поток случайных чисел, зависящий только от общего
+    зерна и имени локации, поэтому одно и то же зерно всегда дает одну и ту
+    же раскладку. Клетки-кандидаты берутся из индекса символов карты, а
+    броски для всех кандидатов правила делаются одной пачкой. С use_numpy
+    броски делает NumPy: раскладка тоже детерминирована, но отличается от
+    раскладки без NumPy.
+    """
+    def __init__(self, table, seed=0, use_numpy=False):
+        self.table = table  # Имя локации -> список SpawnRule
+        self.seed = seed
+        self.use_numpy = use_numpy and _load_numpy() is not None
+
+    def stream_seed(self, location):
+        """Зерно потока локации (стабильно между запусками)"""
+        return zlib.crc32(f"{self.seed}:{location}".encode('utf-8'))
+
+    def roll(self, location, tilemap):
+        """Список (kind, x, y, factory) для локации"""
+        rules = self.table.get(location, ())
+        if not rules:
+            return []
+        seed = self.stream_seed(location)
+        if self.use_numpy:
+            return self._roll_numpy(rules, tilemap, numpy.random.default_rng(seed))
+        rng = random.Random(seed)
+        spawned = []
+        for rule in rules:
+            candidates = tilemap.positions(rule.glyph)
+            if not candidates:
+                continue
+            rand, chance = rng.random, rule.chance
+            chosen = [pos for pos in candidates if rand() < chance]
+            if len(rule.factories) == 1:
+                factories = rule.factories * len(chosen)
+            else:
+                factories = rng.choices(rule.factories, rule.weights, k=len(chosen))
+            spawned.extend((rule.kind, x, y, factory)
+                           for (x, y), factory in zip(chosen, factories))
+        return spawned
+
+    def _roll_numpy(self, rules, tilemap, rng):
+        spawned = []
+        for rule in rules:
+            candidates = tilemap.positions(rule.glyph)
+            if not candidates:
+                continue
+            mask = rng.random(len(candidates)) < rule.chance
+            chosen = [candidates[i] for i in numpy.flatnonzero(mask)]
+            if len(rule.factories) == 1:
+                picks = [0] * len(chosen)
+            else:
+                weights = numpy.asarray(rule.weights, dtype=float)
+                picks = rng.choice(len(rule.factories), size=len(chosen),
+                                   p=weights / weights.sum())
+            spawned.extend((rule.kind, x, y, rule.factories[i])
+                           for (x, y), i in zip(chosen, picks))
+        return spawned
+
+    def spawn(self, location, tilemap):
+        """Создаю объекты: возвращаю словарь kind -> список объектов"""
+        result = {}
+        for kind, x, y, factory in self.roll(location, tilemap):
+            result.setdefault(kind, []).append(factory(x, y))
+        return result
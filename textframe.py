@@ -0,0 +1,82 @@
+import sys
+
+
+class TextFrame:
+    """Текстовый кадр (шапка, карта, сообщения), выводимый одной записью.
+
+    Строки копятся в переиспользуемом списке и уходят в поток одним write().
+    Строки карты без сущностей кэшируются: если строка карты не менялась,
+    ее текст не собирается заново.
+    """
+    def __init__(self, cache_rows=True):
+        self.lines = []          # Строки текущего кадра
+        self.prefix = ''         # Что вывести перед кадром (очистка экрана)
+        self.cache_rows = cache_rows
+        self.row_cache = {}      # y -> (копия строки карты, готовый текст)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.last_frame_chars = 0
+
+    def begin(self, prefix=''):
+        """Начинаю новый кадр"""
+        self.lines.clear()
+        self.prefix = prefix
+
+    def line(self, text=''):
+        self.lines.append(text)
+
+    def map_row(self, y, row, overlay=None, start=0, stop=None):
+        """Добавляю строку карты; overlay - {x: символ} поверх клеток.
+
+        start, stop - выводится только часть строки (окно камеры); x в
+        overlay - координаты карты.
+        """
+        if overlay:
+            cells = self._cells(row, start, stop)
+            for x, char in overlay.items():
+                if start <= x and (stop is None or x < stop):
+                    cells[x - start] = char
+            self.lines.append(' '.join(cells) + ' ')
+            return
+        if self.cache_rows:
+            # Строки Tilemap умеют отдавать дешевый ключ, списки копирую
+            key_func = getattr(row, 'key', None)
+            key = key_func() if key_func is not None else None
+            window = (start, stop)
+            cached = self.row_cache.get(y)
+            if cached is not None and cached[2] == window and (
+                    cached[0] == key if key is not None else cached[0] == row):
+                self.cache_hits += 1
+                self.lines.append(cached[1])
+                return
+            self.cache_misses += 1
+        cells = self._cells(row, start, stop)
+        text = ' '.join(cells) + ' '
+        if self.cache_rows:
+            self.row_cache[y] = (key if key is not None else list(row), text, window)
+        self.lines.append(text)
+
+    @staticmethod
+    def _cells(row, start, stop):
+        """Символы строки (или ее части) новым списком"""
+        if start == 0 and stop is None:
+            return list(row)
+        tilemap = getattr(row, 'tilemap', None)
+        if tilemap is not None:
+            return tilemap.row_list(row.y, start, stop)
+        return list(row[start:stop])
+
+    def invalidate(self):
+        """Сбрасываю кэш строк (например, при смене карты)"""
+        self.row_cache.clear()
+
+    def flush(self, stream=None):
+        """Вывожу кадр одной записью"""
+        stream = stream or sys.stdout
+        self.lines.append('')
+        out = self.prefix + '\n'.join(self.lines)
+        stream.write(out)
+        stream.flush()
+        self.last_frame_chars = len(out)
+        self.lines.clear()
+        return self.last_frame_chars
@@ -0,0 +1,345 @@
+import itertools
+import mmap
+import struct
+
+MAGIC = b'TMAP'
+VERSION = 1
+HEADER = struct.Struct('<4sHIIHH')  # magic, версия, ширина, высота, чанк, палитра
+PALETTE_SIZE = 1024                   # Место под палитру в файле (utf-8)
+DATA_OFFSET = HEADER.size + PALETTE_SIZE
+
+_serials = itertools.count()  # Уникальные номера карт для ключей строк
+
+
+class TileRow:
+    """Строка карты без копирования: читает и пишет клетки прямо в Tilemap"""
+    __slots__ = ('tilemap', 'y')
+
+    def __init__(self, tilemap, y):
+        self.tilemap = tilemap
+        self.y = y
+
+    def __len__(self):
+        return self.tilemap.width
+
+    def __getitem__(self, x):
+        if x < 0:
+            x += self.tilemap.width
+        if not 0 <= x < self.tilemap.width:
+            raise IndexError(x)
+        return self.tilemap.get(x, self.y)
+
+    def __setitem__(self, x, char):
+        self.tilemap.set(x, self.y, char)
+
+    def __iter__(self):
+        return iter(self.tilemap.row_list(self.y))
+
+    def key(self):
+        """Дешевый ключ строки: меняется при каждой записи в строку"""
+        tilemap = self.tilemap
+        return (tilemap.serial, self.y, tilemap.row_versions.get(self.y, 0))
+
+    def __eq__(self, other):
+        if isinstance(other, TileRow):
+            other = list(other)
+        return list(self) == other
+
+
+class Tilemap:
+    """Карта тайлов: по байту на клетку, символы через палитру.
+
+    Клетки лежат кусками (чанками) chunk x chunk. Чанк создается при первой
+    записи, а пока его нет, все его клетки равны заполнителю - поэтому
+    огромная, но в основном пустая карта почти не занимает памяти. Карту
+    можно сохранить в файл и открыть через mmap: тогда чанки - это окна в
+    файле, и ОС подгружает с диска только те страницы, к которым обращались.
+
+    Для совместимости со старым кодом карта ведет себя как список строк:
+    len(tilemap), tilemap[y][x] и перебор строк работают без копирования.
+    """
+    def __init__(self, width, height, fill='.', chunk=64):
+        self.width = width
+        self.height = height
+        self.chunk = chunk
+        self._mmap = None  # Отображенный файл, если карта открыта с диска
+        self._file = None
+        self.palette = []  # Номер -> символ
+        self.codes = {}    # Символ -> номер
+        self.code(fill)    # Заполнитель всегда имеет номер 0
+        self.chunks = {}   # (cx, cy) -> bytearray или memoryview в файле
+        self.chunks_x = (width + chunk - 1) // chunk
+        self.chunks_y = (height + chunk - 1) // chunk
+        self.serial = next(_serials)
+        self.row_versions = {}  # y -> сколько раз писали в строку
+        self.version = 0        # Сколько раз писали в карту (для кэшей поверх нее)
+        self._positions = {}    # Символ -> клетки с ним (индекс для поиска)
+        self.dirty = set()      # Чанки, в которые писали после загрузки
+
+    @classmethod
+    def from_rows(cls, rows, fill='.', chunk=64):
+        """Карта из списка строк (списков символов или str)"""
+        height = len(rows)
+        width = len(rows[0]) if rows else 0
+        tilemap = cls(width, height, fill, chunk)
+        for y, row in enumerate(rows):
+            for x, char in enumerate(row):
+                if char != fill:
+                    tilemap.set(x, y, char)
+        tilemap.dirty.clear()
+        return tilemap
+
+    def code(self, char):
+        """Номер символа в палитре (добавляю символ при первом обращении)"""
+        code = self.codes.get(char)
+        if code is None:
+            if len(self.palette) >= 256:
+                raise ValueError("В палитре карты не больше 256 символов")
+            code = len(self.palette)
+            self.palette.append(char)
+            self.codes[char] = code
+            if self._mmap is not None:
+                self._write_palette()
+        return code
+
+    def _chunk_for_write(self, cx, cy):
+        data = self.chunks.get((cx, cy))
+        if data is None:
+            data = self._load_chunk(cx, cy, create=True)
+        return data
+
+    def _load_chunk(self, cx, cy, create=False):
+        size = self.chunk * self.chunk
+        if self._mmap is not None:
+            offset = DATA_OFFSET + (cy * self.chunks_x + cx) * size
+            data = memoryview(self._mmap)[offset:offset + size]
+        elif create:
+            data = bytearray(size)
+        else:
+            return None
+        self.chunks[(cx, cy)] = data
+        return data
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get(self, x, y):
+        """Символ в клетке (x, y) без проверки границ"""
+        c = self.chunk
+        data = self.chunks.get((x // c, y // c))
+        if data is None:
+            data = self._load_chunk(x // c, y // c)
+            if data is None:
+                return self.palette[0]
+        return self.palette[data[(y % c) * c + x % c]]
+
+    def set(self, x, y, char):
+        c = self.chunk
+        self.version += 1
+        self.row_versions[y] = self.row_versions.get(y, 0) + 1
+        if self._positions:
+            self._positions.clear()
+        self.dirty.add((x // c, y // c))
+        self._chunk_for_write(x // c, y // c)[(y % c) * c + x % c] = self.code(char)
+
+    def _row_parts(self, y):
+        """Куски строки y по чанкам: (данные чанка или None, начало, длина)"""
+        c = self.chunk
+        cy, start = y // c, (y % c) * c
+        for cx in range(self.chunks_x):
+            count = min(c, self.width - cx * c)
+            data = self.chunks.get((cx, cy))
+            if data is None:
+                data = self._load_chunk(cx, cy)
+            yield data, start, count
+
+    def row_list(self, y, start=0, stop=None):
+        """Символы строки y списком; start, stop - только часть строки"""
+        palette = self.palette
+        if start == 0 and stop is None:
+            out = []
+            for data, offset, count in self._row_parts(y):
+                if data is None:
+                    out.extend(palette[:1] * count)
+                else:
+                    out.extend(map(palette.__getitem__, data[offset:offset + count]))
+            return out
+        # Часть строки: читаю только чанки, которые она задевает
+        c = self.chunk
+        cy, base = y // c, (y % c) * c
+        stop = self.width if stop is None else min(stop, self.width)
+        out = []
+        x = max(0, start)
+        while x < stop:
+            cx = x // c
+            end = min(stop, (cx + 1) * c)
+            data = self.chunks.get((cx, cy))
+            if data is None:
+                data = self._load_chunk(cx, cy)
+            if data is None:
+                out.extend(palette[:1] * (end - x))
+            else:
+                offset = base + x % c
+                out.extend(map(palette.__getitem__, data[offset:offset + end - x]))
+            x = end
+        return out
+
+    def row(self, y):
+        return TileRow(self, y)
+
+    def find(self, char):
+        """Все клетки с символом char (по загруженным чанкам и заполнителю)"""
+        code = self.codes.get(char)
+        if code is None:
+            return []
+        if code == 0:
+            return [(x, y) for y in range(self.height) for x in range(self.width)
+                    if self.get(x, y) == char]
+        c = self.chunk
+        found = []
+        for cy in range(self.chunks_y):
+            for cx in range(self.chunks_x):
+                data = self.chunks.get((cx, cy))
+                if data is None:
+                    data = self._load_chunk(cx, cy)
+                if data is None:
+                    continue
+                raw = data if isinstance(data, bytearray) else data.tobytes()
+                i = raw.find(code)
+                while i != -1:
+                    x, y = cx * c + i % c, cy * c + i // c
+                    if x < self.width and y < self.height:
+                        found.append((x, y))
+                    i = raw.find(code, i + 1)
+        found.sort(key=lambda pos: (pos[1], pos[0]))
+        return found
+
+    def positions(self, char):
+        """Клетки с символом char; результат кэшируется до следующей записи"""
+        found = self._positions.get(char)
+        if found is None:
+            found = self._positions[char] = self.find(char)
+        return found
+
+    def pack_dirty(self):
+        """Измененные после загрузки чанки в байтах (для сохранений)"""
+        return self.pack_chunks(sorted(self.dirty))
+
+    def pack_chunks(self, chunks=None):
+        """Чанки в байтах, по умолчанию все созданные; читает load_chunks()"""
+        if chunks is None:
+            chunks = sorted(self.chunks)
+        palette = '\0'.join(self.palette).encode('utf-8')
+        parts = [struct.pack('<HI', self.chunk, len(palette)), palette,
+                 struct.pack('<I', len(chunks))]
+        for cx, cy in chunks:
+            parts.append(struct.pack('<II', cx, cy))
+            parts.append(bytes(self.chunks[(cx, cy)]))
+        return b''.join(parts)
+
+    def load_chunks(self, data):
+        """Записываю в карту чанки из pack_dirty()"""
+        chunk, palette_size = struct.unpack_from('<HI', data, 0)
+        if chunk != self.chunk:
+            raise ValueError("Размер чанка в сохранении не совпадает с картой")
+        offset = 6
+        palette = data[offset:offset + palette_size].decode('utf-8').split('\0')
+        offset += palette_size
+        # Номера символов в сохранении могут отличаться от номеров карты
+        table = bytes(self.code(char) for char in palette).ljust(256, b'\0')
+        (count,) = struct.unpack_from('<I', data, offset)
+        offset += 4
+        size = chunk * chunk
+        self.version += 1
+        for _ in range(count):
+            cx, cy = struct.unpack_from('<II', data, offset)
+            offset += 8
+            self._chunk_for_write(cx, cy)[:] = data[offset:offset + size].translate(table)
+            offset += size
+            self.dirty.add((cx, cy))
+            for y in range(cy * chunk, min(self.height, (cy + 1) * chunk)):
+                self.row_versions[y] = self.row_versions.get(y, 0) + 1
+        self._positions.clear()
+
+    # Поведение списка строк для старого кода
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.height
+        if not 0 <= y < self.height:
+            raise IndexError(y)
+        return TileRow(self, y)
+
+    def __iter__(self):
+        for y in range(self.height):
+            yield TileRow(self, y)
+
+    # Файл и mmap
+    def _header(self):
+        return HEADER.pack(MAGIC, VERSION, self.width, self.height,
+                           self.chunk, len(self.palette))
+
+    def _palette_bytes(self):
+        data = '\0'.join(self.palette).encode('utf-8')
+        if len(data) > PALETTE_SIZE:
+            raise ValueError("Палитра карты не помещается в заголовок файла")
+        return data.ljust(PALETTE_SIZE, b'\0')
+
+    def _write_palette(self):
+        self._mmap[:DATA_OFFSET] = self._header() + self._palette_bytes()
+
+    def save(self, path):
+        """Сохраняю карту в файл, который потом можно открыть через open()"""
+        size = self.chunk * self.chunk
+        empty = bytes(size)
+        with open(path, 'wb') as f:
+            f.write(self._header())
+            f.write(self._palette_bytes())
+            for cy in range(self.chunks_y):
+                for cx in range(self.chunks_x):
+                    data = self.chunks.get((cx, cy))
+                    f.write(empty if data is None else bytes(data))
+
+    @classmethod
+    def create(cls, path, width, height, fill='.', chunk=64):
+        """Новая карта прямо в файле (разреженном, пока в него не писали)"""
+        tilemap = cls(width, height, fill, chunk)
+        with open(path, 'wb') as f:
+            f.write(tilemap._header())
+            f.write(tilemap._palette_bytes())
+            f.truncate(DATA_OFFSET + tilemap.chunks_x * tilemap.chunks_y * chunk * chunk)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path, writable=True):
+        """Открываю карту из файла через mmap, чанки читаются по требованию"""
+        f = open(path, 'r+b' if writable else 'rb')
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        mapped = mmap.mmap(f.fileno(), 0, access=access)
+        magic, version, width, height, chunk, count = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or version != VERSION:
+            mapped.close()
+            f.close()
+            raise ValueError(f"{path}: это не файл карты версии {VERSION}")
+        raw = mapped[HEADER.size:DATA_OFFSET].rstrip(b'\0').decode('utf-8')
+        tilemap = cls(width, height, raw.split('\0')[0], chunk)
+        for char in raw.split('\0')[1:count]:
+            tilemap.code(char)
+        tilemap._mmap = mapped
+        tilemap._file = f
+        return tilemap
+
+    def flush(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+
+    def close(self):
+        if self._mmap is not None:
+            for data in self.chunks.values():
+                data.release()
+            self.chunks.clear()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
@@ -0,0 +1,136 @@
+from tilemap import Tilemap
+
+# Преобразования координат для восьми октантов вокруг наблюдателя
+OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+           (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+
+class FieldOfView:
+    """Поле зрения: какие клетки видны из точки (recursive shadowcasting).
+
+    Каждый октант просматривается строками от наблюдателя наружу; за
+    непрозрачной клеткой остается тень, и клетки в тени не проверяются
+    вовсе, поэтому работа пропорциональна видимой области, а не карте.
+    Результат - frozenset номеров клеток y * width + x - кэшируется по
+    (x, y, радиус) и сбрасывается только при изменении местности: для Tilemap
+    это замечается по ее version, для других карт вызовите invalidate().
+    """
+    def __init__(self, game_map, opaque='#T', cache_size=256, get=None):
+        # game_map - Tilemap или любой объект с width, height и get(x, y)
+        self.opaque = set(opaque)     # Символы, которые закрывают обзор
+        self.cache_size = cache_size  # Сколько результатов помнить
+        self.cache = {}               # (x, y, радиус) -> видимые клетки
+        self.hits = 0
+        self.misses = 0
+        self._get = get               # Свой способ прочитать клетку
+        self.set_map(game_map)
+
+    def set_map(self, game_map):
+        """Меняю карту (например, при смене локации)"""
+        self.game_map = game_map
+        self.width = game_map.width
+        self.height = game_map.height
+        self.get = self._get or game_map.get
+        self.version = getattr(game_map, 'version', None)
+        self.cache.clear()
+
+    def invalidate(self):
+        """Местность поменялась: все посчитанные поля зрения устарели"""
+        self.cache.clear()
+
+    def visible(self, x, y, radius):
+        """Видимые из (x, y) клетки не дальше radius, включая саму (x, y)"""
+        version = getattr(self.game_map, 'version', None)
+        if version != self.version:
+            self.version = version
+            self.cache.clear()
+        key = (x, y, radius)
+        cells = self.cache.get(key)
+        if cells is not None:
+            self.hits += 1
+            return cells
+        self.misses += 1
+        cells = self._compute(x, y, radius)
+        if len(self.cache) >= self.cache_size:
+            del self.cache[next(iter(self.cache))]  # Самый старый результат
+        self.cache[key] = cells
+        return cells
+
+    def _compute(self, x, y, radius):
+        found = set()
+        if 0 <= x < self.width and 0 <= y < self.height:
+            found.add(y * self.width + x)
+        for xx, xy, yx, yy in OCTANTS:
+            self._cast(x, y, 1, 1.0, 0.0, radius, xx, xy, yx, yy, found)
+        return frozenset(found)
+
+    def _cast(self, cx, cy, row, start, end, radius, xx, xy, yx, yy, found):
+        """Просматриваю октант от строки row между наклонами start и end"""
+        if start < end:
+            return
+        width, height = self.width, self.height
+        get, opaque = self.get, self.opaque
+        r2 = radius * radius
+        new_start = start
+        for j in range(row, radius + 1):
+            blocked = False
+            dy = -j
+            for dx in range(-j, 1):
+                left = (dx - 0.5) / (dy + 0.5)
+                right = (dx + 0.5) / (dy - 0.5)
+                if start < right:
+                    continue
+                if end > left:
+                    break
+                X = cx + dx * xx + dy * xy
+                Y = cy + dx * yx + dy * yy
+                inside = 0 <= X < width and 0 <= Y < height
+                if inside and dx * dx + dy * dy <= r2:
+                    found.add(Y * width + X)
+                wall = not inside or get(X, Y) in opaque
+                if blocked:
+                    if wall:
+                        new_start = right
+                    else:
+                        blocked = False
+                        start = new_start
+                elif wall and j < radius:
+                    # Начало тени: часть октанта до нее смотрю отдельно
+                    blocked = True
+                    self._cast(cx, cy, j + 1, start, left, radius,
+                               xx, xy, yx, yy, found)
+                    new_start = right
+            if blocked:
+                break
+
+
+class MapMemory:
+    """Запомненная карта: клетки, которые игрок уже видел.
+
+    Хранится отдельной Tilemap (невиданные клетки - заполнитель unseen), так
+    что ее строки кэшируются в TextFrame как строки обычной карты. Клетки
+    копируются только когда меняется набор видимых клеток.
+    """
+    def __init__(self, game_map, unseen=' '):
+        self.game_map = game_map
+        self.tiles = Tilemap(game_map.width, game_map.height, unseen, game_map.chunk)
+        self.last = None     # Последний показанный набор видимых клеток
+        self.version = None  # version карты, с которой он скопирован
+
+    def reveal(self, cells):
+        """Запоминаю видимые клетки, возвращаю сколько клеток изменилось"""
+        version = getattr(self.game_map, 'version', None)
+        if cells is self.last and version == self.version:
+            return 0
+        self.last = cells
+        self.version = version
+        width = self.tiles.width
+        get, tiles = self.game_map.get, self.tiles
+        changed = 0
+        for i in cells:
+            x, y = i % width, i // width
+            char = get(x, y)
+            if tiles.get(x, y) != char:
+                tiles.set(x, y, char)
+                changed += 1
+        return changed